@@ -1,39 +1,214 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import joblib
 import numpy as np
-from django.db.models import Sum
-from .sentence_classifier import SimpleCategoryModel
-from sklearn.ensemble import IsolationForest
-from joblib import load
+
+from .. import metrics
+from ..conf import expenses_setting
 from ..models import Expense
 
+# bump when the feature layout changes so persisted models are refit
+FEATURE_VERSION = 3
+# in-process cache of fitted per-user models
+_models = OrderedDict()
+_models_lock = threading.Lock()
+MAX_CACHED_MODELS = 256
+# robust z-score scale factor (makes MAD comparable to a standard deviation)
+MAD_SCALE = 0.6745
+
+
+def _load_user_arrays(user):
+    """One query for the user's expenses, returned as NumPy arrays"""
+    rows = list(Expense.objects.filter(user=user).values_list('id', 'amount', 'date', 'category', 'updated_at'))
+    if not rows:
+        return None
+    ids, amounts, dates, categories, updated = zip(*rows)
+    return {
+        'ids': np.fromiter(ids, dtype=np.int64, count=len(ids)),
+        'amounts': np.fromiter((float(a) for a in amounts), dtype=np.float64, count=len(amounts)),
+        'dow': np.fromiter((d.weekday() for d in dates), dtype=np.float64, count=len(dates)),
+        'month': np.fromiter((d.month for d in dates), dtype=np.float64, count=len(dates)),
+        'categories': np.array([c or '' for c in categories], dtype=object),
+        'updated': np.fromiter((u.timestamp() for u in updated), dtype=np.float64, count=len(updated)),
+    }
+
+
+def _category_medians(log_amounts, categories):
+    """Median log-amount per category; sparse categories use the overall median"""
+    overall = float(np.median(log_amounts))
+    medians = {}
+    for cat in np.unique(categories):
+        mask = categories == cat
+        medians[cat] = float(np.median(log_amounts[mask])) if mask.sum() >= 5 else overall
+    return medians, overall
+
+
+def _features(data, medians, overall):
+    """[log amount, log amount relative to its category, day of week, month]"""
+    log_amounts = np.log1p(np.maximum(data['amounts'], 0.0))
+    cat_median = np.fromiter((medians.get(c, overall) for c in data['categories']),
+                             dtype=np.float64, count=len(log_amounts))
+    return np.column_stack([log_amounts, log_amounts - cat_median, data['dow'], data['month']])
+
+
+def _model_path(user_id):
+    return os.path.join(expenses_setting('ANOMALY_MODEL_DIR'), f"{user_id}.joblib")
+
+
+def _get_cached(user_id):
+    with _models_lock:
+        entry = _models.get(user_id)
+        if entry is not None:
+            _models.move_to_end(user_id)
+            return entry
+    path = _model_path(user_id)
+    if os.path.exists(path):
+        try:
+            entry = joblib.load(path)
+        except Exception as e:
+            print(f"Error loading anomaly model for user {user_id}: {e}")
+            return None
+        _remember(user_id, entry)
+        return entry
+    return None
+
+
+def _remember(user_id, entry):
+    with _models_lock:
+        _models[user_id] = entry
+        _models.move_to_end(user_id)
+        while len(_models) > MAX_CACHED_MODELS:
+            _models.popitem(last=False)
+
+
+def _needs_refit(entry, data):
+    """
+    Refit only when the user's data moved materially since the last fit: the
+    row count, total spend, or number of rows edited after the fit's latest
+    updated_at (recategorised or redated rows keep count and total unchanged)
+    """
+    if entry is None or entry.get('feature_version') != FEATURE_VERSION:
+        return True
+    threshold = expenses_setting('ANOMALY_REFIT_FRACTION')
+    n_fit, total_fit = entry['n'], entry['total']
+    if abs(len(data['ids']) - n_fit) >= max(1, threshold * n_fit):
+        return True
+    if int((data['updated'] > entry['updated_at']).sum()) >= max(1, threshold * n_fit):
+        return True
+    return abs(float(data['amounts'].sum()) - total_fit) > threshold * max(abs(total_fit), 1.0)
+
+
+def _fit(user_id, data):
+    from sklearn.ensemble import IsolationForest  # deferred: slow to import
+
+    log_amounts = np.log1p(np.maximum(data['amounts'], 0.0))
+    medians, overall = _category_medians(log_amounts, data['categories'])
+    X = _features(data, medians, overall)
+    iso = IsolationForest(n_estimators=100, contamination=0.02, random_state=42)
+    iso.fit(X)
+    entry = {
+        'feature_version': FEATURE_VERSION,
+        'model': iso,
+        'medians': medians,
+        'overall': overall,
+        'n': len(X),
+        'total': float(data['amounts'].sum()),
+        'updated_at': float(data['updated'].max()),
+    }
+    path = _model_path(user_id)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        joblib.dump(entry, tmp)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Error saving anomaly model for user {user_id}: {e}")
+    _remember(user_id, entry)
+    return entry
+
+
+def _isolation_forest_flags(user_id, data):
+    """Returns (flags, refit), refit being True when the model was (re)fitted"""
+    entry = _get_cached(user_id)
+    refit = _needs_refit(entry, data)
+    if refit:
+        entry = _fit(user_id, data)
+    X = _features(data, entry['medians'], entry['overall'])
+    return entry['model'].predict(X) == -1, refit  # -1 is anomaly
+
+
+def _robust_z_flags(data):
+    """
+    Per-category robust z-score on log amounts: |x - median| / MAD. Only
+    unusually large expenses are flagged. Sparse categories use global stats.
+    """
+    log_amounts = np.log1p(np.maximum(data['amounts'], 0.0))
+    categories = data['categories']
+    threshold = expenses_setting('ANOMALY_Z_THRESHOLD')
+    flags = np.zeros(len(log_amounts), dtype=bool)
+
+    def score(values):
+        median = np.median(values)
+        mad = np.median(np.abs(values - median))
+        if mad == 0:
+            return np.zeros_like(values)
+        return MAD_SCALE * (values - median) / mad
+
+    z_global = score(log_amounts)
+    for cat in np.unique(categories):
+        mask = categories == cat
+        z = score(log_amounts[mask]) if mask.sum() >= 5 else z_global[mask]
+        flags[mask] = z > threshold
+    return flags
+
+
 def detect_anomalies_for_user(user, months=6):
     """
-    Simple approach: aggregate user's expenses per category over last `months`.
-    Fit IsolationForest on amounts or use z-score per category.
+    Flag unusual expenses for `user`.
+
+    Amounts, dates and categories are fetched with a single values_list query
+    into NumPy arrays. In 'isolation_forest' mode (the default) a per-user
+    IsolationForest over [log amount, amount relative to its category, day of
+    week, month] is persisted and only refit when the user's data changed
+    materially; 'robust_z' mode uses a cheap per-category robust z-score.
     Returns list of anomalous expense dicts.
     """
-    qs = Expense.objects.filter(user=user)  # you can filter by date range
-    if qs.count() < 10:
+    with metrics.timed('anomaly'):
+        return _detect_anomalies(user)
+
+
+def _detect_anomalies(user):
+    start = time.perf_counter()
+    mode = expenses_setting('ANOMALY_MODE')
+    data = _load_user_arrays(user)
+    if data is None or len(data['ids']) < 10:
+        metrics.observe_anomaly_detection(mode, 'insufficient_data', time.perf_counter() - start)
         return []  # not enough data
 
-    # build numeric feature: [amount, month_of_year] optionally category encoding
-    data = []
-    ids = []
-    for e in qs:
-        data.append([float(e.amount)])
-        ids.append(e.id)
-    import numpy as np
-    X = np.array(data)
-    iso = IsolationForest(n_estimators=100, contamination=0.02, random_state=42)
-    iso.fit(X)
-    preds = iso.predict(X)  # -1 is anomaly
+    if mode == 'robust_z':
+        flags, outcome = _robust_z_flags(data), 'scored'
+    else:
+        flags, refit = _isolation_forest_flags(user.pk, data)
+        outcome = 'refit' if refit else 'cached_model'
+    metrics.observe_anomaly_detection(mode, outcome, time.perf_counter() - start)
+
+    flagged_ids = data['ids'][flags].tolist()
+    if not flagged_ids:
+        return []
+    # one query for the flagged rows, kept in the original ordering
+    details = Expense.objects.filter(user=user).only('id', 'amount', 'description', 'date').in_bulk(flagged_ids)
     anomalous = []
-    for i, p in enumerate(preds):
-        if p == -1:
-            e = qs[i]
-            anomalous.append({
-                'id': e.id,
-                'amount': float(e.amount),
-                'description': e.description,
-                'date': e.date.isoformat(),
-            })
-    return anomalous
\ No newline at end of file
+    for expense_id in flagged_ids:
+        e = details.get(expense_id)
+        if e is None:
+            continue  # deleted since it was scored
+        anomalous.append({
+            'id': e.id,
+            'amount': float(e.amount),
+            'description': e.description,
+            'date': e.date.isoformat(),
+        })
+    return anomalous
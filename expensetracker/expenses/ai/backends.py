@@ -0,0 +1,91 @@
+"""
+Inference backends for the zero-shot pipeline.
+
+- 'pytorch':   the stock transformers pipeline (GPU if available)
+- 'quantized': the same model with its Linear layers dynamically quantized to
+               int8; several times smaller and faster on CPU
+- 'onnx':      an ONNX Runtime export produced by `manage.py export_onnx_model`
+               (needs `pip install optimum[onnxruntime]`)
+
+All of them return a callable with the transformers zero-shot pipeline
+interface, so the rest of ai_utils doesn't care which one is in use.
+"""
+import os
+
+BACKENDS = ('pytorch', 'quantized', 'onnx')
+
+
+def _set_torch_threads(num_threads):
+    import torch
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+
+
+def _load_pytorch(model_name, num_threads=None, **kwargs):
+    from transformers import pipeline
+    import torch
+
+    _set_torch_threads(num_threads)
+    # safetensors weights are memory-mapped rather than copied while loading
+    model_kwargs = {'low_cpu_mem_usage': True}
+    try:
+        return pipeline(
+            "zero-shot-classification",
+            model=model_name,
+            device=0 if torch.cuda.is_available() else -1,  # Use GPU if available
+            model_kwargs=model_kwargs,
+        )
+    except Exception as e:
+        print(f"Error loading classifier: {e}")
+        # Fallback to CPU if GPU fails
+        return pipeline("zero-shot-classification", model=model_name, device=-1, model_kwargs=model_kwargs)
+
+
+def _load_quantized(model_name, num_threads=None, **kwargs):
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
+    import torch
+
+    _set_torch_threads(num_threads)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    # safetensors weights are memory-mapped rather than copied while loading
+    model = AutoModelForSequenceClassification.from_pretrained(model_name, low_cpu_mem_usage=True)
+    model.eval()
+    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return pipeline("zero-shot-classification", model=model, tokenizer=tokenizer, device=-1)
+
+
+def _load_onnx(model_name, num_threads=None, onnx_dir=None, **kwargs):
+    try:
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+    except ImportError:
+        raise RuntimeError("the 'onnx' backend needs `pip install optimum[onnxruntime]`")
+    from transformers import AutoTokenizer, pipeline
+
+    if not onnx_dir or not os.path.isdir(onnx_dir):
+        raise RuntimeError(f"no ONNX export at {onnx_dir!r}, run `manage.py export_onnx_model` first")
+
+    options = onnxruntime.SessionOptions()
+    if num_threads:
+        options.intra_op_num_threads = int(num_threads)
+        options.inter_op_num_threads = 1
+    file_name = 'model_quantized.onnx' if os.path.exists(os.path.join(onnx_dir, 'model_quantized.onnx')) else 'model.onnx'
+    model = ORTModelForSequenceClassification.from_pretrained(
+        onnx_dir, file_name=file_name, session_options=options, provider='CPUExecutionProvider',
+    )
+    tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+    return pipeline("zero-shot-classification", model=model, tokenizer=tokenizer)
+
+
+_LOADERS = {
+    'pytorch': _load_pytorch,
+    'quantized': _load_quantized,
+    'onnx': _load_onnx,
+}
+
+
+def load_zero_shot_pipeline(backend, model_name, num_threads=None, onnx_dir=None):
+    """Build the zero-shot classifier for `backend` (one of BACKENDS)"""
+    if backend not in _LOADERS:
+        raise ValueError(f"unknown inference backend {backend!r}, expected one of {BACKENDS}")
+    return _LOADERS[backend](model_name, num_threads=num_threads, onnx_dir=onnx_dir)
@@ -0,0 +1,138 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class SchedulerOverloaded(Exception):
+    """Raised when the request queue stays full for longer than the submit timeout"""
+
+
+class _Item:
+    __slots__ = ('text', 'labels', 'future')
+
+    def __init__(self, text, labels, future):
+        self.text = text
+        self.labels = labels
+        self.future = future
+
+
+class MicroBatchScheduler:
+    """
+    Collects descriptions submitted from concurrent request threads and runs
+    them through `infer_fn` in micro-batches.
+
+    A single worker thread takes the first queued item, then keeps collecting
+    until either `max_batch_size` items are gathered or `max_wait_ms` has
+    passed since that first item arrived. Items are grouped by their candidate
+    label set (a pipeline call only accepts one set) and each group is sent to
+    `infer_fn(texts, labels)` in one call, which must return one result per text.
+
+    The queue is bounded: when it is full, `submit` blocks for up to
+    `submit_timeout` seconds and then raises SchedulerOverloaded, so callers
+    can fall back instead of piling up unbounded work.
+    """
+
+    def __init__(self, infer_fn, max_batch_size=16, max_wait_ms=10,
+                 max_queue_size=256, submit_timeout=2.0):
+        self.infer_fn = infer_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.submit_timeout = submit_timeout
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'rejected': 0, 'batches': 0, 'items': 0, 'max_batch': 0, 'errors': 0}
+        self._thread = threading.Thread(target=self._run, name='predict-category-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, text, labels) -> Future:
+        """Queue one description; the returned future resolves to its pipeline result"""
+        future = Future()
+        try:
+            self._queue.put(_Item(text, tuple(labels), future), timeout=self.submit_timeout)
+        except queue.Full:
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise SchedulerOverloaded("prediction queue is full")
+        with self._lock:
+            self._stats['submitted'] += 1
+        return future
+
+    def predict_many(self, texts, labels, timeout=None):
+        """
+        Submit several descriptions and wait for all of their results. If a
+        submit is rejected or a result times out, the descriptions still
+        queued are cancelled so the worker skips them.
+        """
+        futures = []
+        try:
+            for t in texts:
+                futures.append(self.submit(t, labels))
+            return [f.result(timeout=timeout) for f in futures]
+        except BaseException:
+            for f in futures:
+                f.cancel()
+            raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['mean_batch'] = stats['items'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+    def shutdown(self, timeout=5.0):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        groups = {}
+        for item in batch:
+            groups.setdefault(item.labels, []).append(item)
+
+        for labels, items in groups.items():
+            # skip items whose caller already gave up
+            items = [i for i in items if i.future.set_running_or_notify_cancel()]
+            if not items:
+                continue
+            try:
+                results = self.infer_fn([i.text for i in items], list(labels))
+                if len(results) != len(items):
+                    raise RuntimeError(f"expected {len(items)} results, got {len(results)}")
+            except Exception as e:
+                with self._lock:
+                    self._stats['errors'] += 1
+                for i in items:
+                    i.future.set_exception(e)
+                continue
+            with self._lock:
+                self._stats['batches'] += 1
+                self._stats['items'] += len(items)
+                self._stats['max_batch'] = max(self._stats['max_batch'], len(items))
+            for i, result in zip(items, results):
+                i.future.set_result(result)
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
@@ -0,0 +1,240 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .base import BaseCategoryModel
+
+# Phrasings averaged into each category prototype
+PROTOTYPE_TEMPLATES = [
+    "{}",
+    "an expense for {}",
+    "money spent on {}",
+]
+
+
+class EmbeddingCache:
+    """
+    On-disk text -> embedding cache in a small SQLite file, so repeated
+    descriptions are never re-encoded, across restarts and worker processes.
+    Vectors are stored as float32 blobs keyed by a hash of model name + text.
+    """
+    def __init__(self, path, model_name):
+        self.path = path
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+        return self._conn
+
+    def _key(self, text):
+        return hashlib.sha1(f"{self.model_name}\x1f{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, texts):
+        """Return {text: vector} for the texts that are cached"""
+        keys = {self._key(t): t for t in texts}
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            items = list(keys)
+            # stay well below SQLite's bound-parameter limit
+            for start in range(0, len(items), 500):
+                chunk = items[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[keys[key]] = np.frombuffer(blob, dtype=np.float32)
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, mapping):
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vec) VALUES (?, ?)",
+                [(self._key(t), np.asarray(v, dtype=np.float32).tobytes()) for t, v in mapping.items()],
+            )
+            conn.commit()
+
+
+def _normalize_rows(M):
+    norms = np.linalg.norm(M, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return M / norms
+
+
+class EmbeddingCategoryModel(BaseCategoryModel):
+    """
+    Classifies descriptions by cosine similarity to category prototype vectors.
+
+    A description costs one small-encoder forward pass (batched across texts)
+    instead of one NLI pass per candidate label. Prototypes are the mean
+    embedding of a few phrasings of each category name, computed once per
+    category set; `user_prototypes` blends in the mean embedding of a user's
+    own overrides so categories follow how that user actually labels things.
+    Scores are a softmax over similarities, so they can be compared against
+    the same confidence threshold as the zero-shot model.
+    """
+    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2",
+                 cache_path=None, temperature=0.05, batch_size=64, max_prototype_sets=256):
+        self.model_name = model_name
+        self.temperature = temperature
+        self.batch_size = batch_size
+        self.cache = EmbeddingCache(cache_path, model_name) if cache_path else None
+        self._encoder = None
+        self._encoder_lock = threading.Lock()
+        # tuple(categories) -> matrix; one per taxonomy branch, so bounded (LRU)
+        self.max_prototype_sets = max_prototype_sets
+        self._prototypes = OrderedDict()
+        self._prototypes_lock = threading.Lock()
+        self._trained = None   # (labels, matrix) from train()
+
+    def _load_encoder(self):
+        if self._encoder is None:
+            with self._encoder_lock:
+                if self._encoder is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._encoder = SentenceTransformer(self.model_name, device='cpu')
+        return self._encoder
+
+    def load(self, categories=None):
+        """Load the encoder now (and the prototypes for `categories`) instead of on first use"""
+        self._load_encoder()
+        if categories:
+            self.category_prototypes(categories)
+        return self
+
+    def encode(self, texts) -> np.ndarray:
+        """Unit-normalized embeddings for `texts`, served from the disk cache where possible"""
+        texts = [(t or '').strip().lower() for t in texts]
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        cached = self.cache.get_many(set(texts)) if self.cache is not None else {}
+        missing = [t for t in dict.fromkeys(texts) if t not in cached]
+        if missing:
+            vectors = self._load_encoder().encode(
+                missing, batch_size=self.batch_size, convert_to_numpy=True, normalize_embeddings=True,
+            ).astype(np.float32)
+            fresh = dict(zip(missing, vectors))
+            if self.cache is not None:
+                self.cache.set_many(fresh)
+            cached.update(fresh)
+        return np.vstack([cached[t] for t in texts])
+
+    def category_prototypes(self, categories) -> np.ndarray:
+        key = tuple(categories)
+        with self._prototypes_lock:
+            P = self._prototypes.get(key)
+            if P is not None:
+                self._prototypes.move_to_end(key)
+                return P
+        phrases = [tpl.format(c.lower()) for c in categories for tpl in PROTOTYPE_TEMPLATES]
+        E = self.encode(phrases).reshape(len(categories), len(PROTOTYPE_TEMPLATES), -1)
+        P = _normalize_rows(E.mean(axis=1))
+        with self._prototypes_lock:
+            self._prototypes[key] = P
+            while len(self._prototypes) > self.max_prototype_sets:
+                self._prototypes.popitem(last=False)
+        return P
+
+    def user_prototypes(self, categories, examples, prior_weight=5.0) -> np.ndarray:
+        """
+        Blend the global prototypes with the mean embedding of a user's own
+        examples ({category: [descriptions]}). A category with n examples
+        moves n / (n + prior_weight) of the way towards the user's mean.
+        """
+        P = self.category_prototypes(categories).copy()
+        for idx, category in enumerate(categories):
+            texts = examples.get(category) or []
+            if not texts:
+                continue
+            user_mean = self.encode(texts).mean(axis=0)
+            w = len(texts) / (len(texts) + prior_weight)
+            P[idx] = (1 - w) * P[idx] + w * user_mean
+        return _normalize_rows(P)
+
+    def scores(self, texts, categories, prototypes=None) -> np.ndarray:
+        """Softmax-normalized similarity of every text to every category"""
+        P = prototypes if prototypes is not None else self.category_prototypes(categories)
+        sims = self.encode(texts) @ P.T
+        logits = sims / self.temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def classify(self, texts, categories, prototypes=None):
+        """Return the top (category, score) for every text"""
+        if not texts:
+            return []
+        S = self.scores(texts, categories, prototypes)
+        best = S.argmax(axis=1)
+        return [(categories[j], float(S[i, j])) for i, j in enumerate(best)]
+
+    def predict(self, texts):
+        """Return list of (category, confidence) for each text"""
+        if self._trained is None:
+            return [("Uncertain", 0.0)] * len(texts)
+        labels, P = self._trained
+        return self.classify(texts, labels, P)
+
+    def train(self, X_texts, y_labels, random_state=42):
+        examples = {}
+        for text, label in zip(X_texts, y_labels):
+            examples.setdefault(label, []).append(text)
+        labels = sorted(examples)
+        P = _normalize_rows(np.vstack([self.encode(examples[l]).mean(axis=0) for l in labels]))
+        self._trained = (labels, P)
+        return self
+
+    def save(self, path):
+        if self._trained is None:
+            raise ValueError("model is not trained")
+        labels, P = self._trained
+        np.savez(path, labels=np.array(labels), prototypes=P, model_name=np.array(self.model_name))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        model = cls(model_name=str(data['model_name']))
+        model._trained = ([str(l) for l in data['labels']], data['prototypes'])
+        return model
+
+
+class UserPrototypeStore:
+    """
+    Small LRU of per-user prototype matrices, keyed on a fingerprint of the
+    user's overrides so a new override rebuilds that user's prototypes.
+    Keys are user ids, or (user id, labels) when a user has several label sets.
+    """
+    def __init__(self, max_users=1000):
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, fingerprint):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != fingerprint:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, user_id, fingerprint, prototypes):
+        with self._lock:
+            self._entries[user_id] = (fingerprint, prototypes)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
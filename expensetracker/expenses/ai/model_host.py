@@ -0,0 +1,172 @@
+"""
+Out-of-process model hosting over a Unix domain socket.
+
+One `manage.py run_model_host` process owns the zero-shot model; web
+workers send it whole batches instead of each loading their own copy.
+
+Wire format: every message is a 4-byte big-endian length followed by that
+many bytes of UTF-8 JSON. Requests are
+    {"op": "classify", "texts": [...], "labels": [...]}
+    {"op": "ping"}
+and responses are {"ok": true, ...} or {"ok": false, "error": "..."}, with
+"overloaded": true added when the host's scheduler shed the request.
+Connections are persistent and may carry any number of request/response
+pairs.
+"""
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+from .batching import SchedulerOverloaded
+
+_HEADER = struct.Struct('>I')
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+class ModelHostUnavailable(Exception):
+    """The model host could not be reached or did not answer in time"""
+
+
+class ModelHostError(Exception):
+    """The model host answered but reported an error, e.g. a failed inference"""
+
+
+class ModelHostOverloaded(ModelHostError, SchedulerOverloaded):
+    """The model host's scheduler shed the request; treated like a local overload"""
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def send_message(sock, payload):
+    data = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def recv_message(sock):
+    (length,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if length > MAX_MESSAGE_BYTES:
+        raise ConnectionError(f"message of {length} bytes exceeds the limit")
+    return json.loads(_recv_exact(sock, length).decode('utf-8'))
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                request = recv_message(self.request)
+            except (ConnectionError, OSError, ValueError):
+                return
+            send_message(self.request, self.server.dispatch(request))
+
+
+class ModelHostServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves `infer_fn(texts, labels) -> [result, ...]` on a Unix socket. Each
+    client connection gets a thread; passing a micro-batching infer_fn lets
+    batches from different web workers share one model call.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, infer_fn, model_name=''):
+        self.socket_path = socket_path
+        self.infer_fn = infer_fn
+        self.model_name = model_name
+        self.requests_served = 0
+        self.texts_served = 0
+        self._lock = threading.Lock()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # stale socket from a previous run
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o660)
+
+    def dispatch(self, request):
+        op = request.get('op') if isinstance(request, dict) else None
+        if op == 'ping':
+            return {'ok': True, 'pid': os.getpid(), 'model': self.model_name,
+                    'requests': self.requests_served, 'texts': self.texts_served}
+        if op == 'classify':
+            texts = request.get('texts') or []
+            try:
+                results = self.infer_fn(texts, request.get('labels') or [])
+            except SchedulerOverloaded as e:
+                return {'ok': False, 'error': str(e), 'overloaded': True}
+            except Exception as e:
+                return {'ok': False, 'error': str(e)}
+            with self._lock:
+                self.requests_served += 1
+                self.texts_served += len(texts)
+            return {'ok': True, 'results': results}
+        return {'ok': False, 'error': f"unknown op {op!r}"}
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+class ModelHostClient:
+    """
+    Thread-safe client: one persistent connection per calling thread. After a
+    connection failure or timeout the host is considered down for
+    `retry_after` seconds, during which calls fail immediately so callers can
+    fall back without waiting. Errors the host itself reports raise
+    ModelHostError and leave it marked up.
+    """
+    def __init__(self, socket_path, timeout=30.0, retry_after=5.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._local = threading.local()
+        self._down_until = 0.0
+
+    def _connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def request(self, payload):
+        if time.monotonic() < self._down_until:
+            raise ModelHostUnavailable("model host marked down")
+        try:
+            sock = self._connection()
+            send_message(sock, payload)
+            response = recv_message(sock)
+        except (OSError, ConnectionError, ValueError) as e:
+            self._drop_connection()
+            self._down_until = time.monotonic() + self.retry_after
+            raise ModelHostUnavailable(f"model host at {self.socket_path} unavailable: {e}")
+        if not response.get('ok'):
+            error = ModelHostOverloaded if response.get('overloaded') else ModelHostError
+            raise error(response.get('error') or 'model host error')
+        return response
+
+    def classify(self, texts, labels):
+        return self.request({'op': 'classify', 'texts': list(texts), 'labels': list(labels)})['results']
+
+    def ping(self):
+        return self.request({'op': 'ping'})
@@ -0,0 +1,147 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+_STRIP_CHARS = re.compile(r"[^\w&\s]+")
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_description(text: str) -> str:
+    """
+    Reduce a description to the part that identifies the merchant, so that
+    "UBER *TRIP" and "Uber trip", or "Starbucks #1234" and "STARBUCKS #98",
+    share a cache entry. Digits (store numbers, references) and punctuation
+    are dropped and whitespace is collapsed.
+    """
+    text = (text or '').lower()
+    text = _DIGITS.sub(' ', text)
+    text = _STRIP_CHARS.sub(' ', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+def category_set_version(model_name: str, categories, extra='') -> str:
+    """Short fingerprint of everything a cached prediction depends on"""
+    raw = '\x1f'.join([model_name, str(extra)] + list(categories))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+class PredictionCache:
+    """
+    Two-tier cache of (label, score) predictions.
+
+    Tier 1 is an in-process LRU dict; tier 2 is a Django cache alias (file,
+    database or memcached backend) shared between processes and restarts.
+    Keys combine the normalized description with a version fingerprint of the
+    model and candidate labels, so changing either simply stops old entries
+    from matching. `clear()` drops the local tier and bumps a generation
+    counter stored in the shared tier, which orphans every persisted entry.
+    """
+    GENERATION_KEY = 'prediction-cache:generation'
+    # how often other processes re-read the generation counter
+    GENERATION_REFRESH_SECONDS = 60
+
+    def __init__(self, max_local_entries=10000, cache_alias='default', timeout=None):
+        self.max_local_entries = max_local_entries
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._generation_read_at = 0.0
+        self._stats = {'local_hits': 0, 'persistent_hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0}
+
+    @property
+    def _backend(self):
+        if not self.cache_alias:
+            return None
+        return caches[self.cache_alias]
+
+    def _get_generation(self):
+        now = time.monotonic()
+        if self._generation is None or now - self._generation_read_at > self.GENERATION_REFRESH_SECONDS:
+            backend = self._backend
+            try:
+                self._generation = backend.get(self.GENERATION_KEY, 0) if backend is not None else 0
+            except Exception:
+                self._generation = self._generation or 0
+            self._generation_read_at = now
+        return self._generation
+
+    def make_key(self, normalized: str, version: str) -> str:
+        digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+        return f"prediction:{self._get_generation()}:{version}:{digest}"
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._local[key] = value
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_local_entries:
+                self._local.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def get_many(self, keys) -> dict:
+        """Return {key: (label, score)} for every key found in either tier"""
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                if key in self._local:
+                    self._local.move_to_end(key)
+                    found[key] = self._local[key]
+                    self._stats['local_hits'] += 1
+                else:
+                    missing.append(key)
+
+        backend = self._backend
+        if missing and backend is not None:
+            try:
+                persisted = backend.get_many(missing)
+            except Exception as e:
+                print(f"Prediction cache read failed: {e}")
+                persisted = {}
+            for key, value in persisted.items():
+                value = tuple(value)
+                found[key] = value
+                self._remember(key, value)
+            with self._lock:
+                self._stats['persistent_hits'] += len(persisted)
+                self._stats['misses'] += len(missing) - len(persisted)
+        else:
+            with self._lock:
+                self._stats['misses'] += len(missing)
+        return found
+
+    def set_many(self, mapping: dict):
+        for key, value in mapping.items():
+            self._remember(key, tuple(value))
+        with self._lock:
+            self._stats['sets'] += len(mapping)
+        backend = self._backend
+        if mapping and backend is not None:
+            try:
+                backend.set_many({k: list(v) for k, v in mapping.items()}, timeout=self.timeout)
+            except Exception as e:
+                print(f"Prediction cache write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        backend = self._backend
+        if backend is not None:
+            generation = self._get_generation() + 1
+            backend.set(self.GENERATION_KEY, generation, timeout=None)
+            self._generation = generation
+            self._generation_read_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['local_size'] = len(self._local)
+        lookups = stats['local_hits'] + stats['persistent_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['local_hits'] + stats['persistent_hits']) / lookups if lookups else 0.0
+        return stats
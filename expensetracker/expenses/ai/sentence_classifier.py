@@ -1,50 +1,106 @@
 import os
+import joblib
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+
 from .base import BaseCategoryModel
 
+
+def _default_path():
+    from ..conf import expenses_setting
+    return expenses_setting('FAST_MODEL_PATH')
+
+
+def make_vectorizer():
+    """
+    Stateless hashed character n-gram features. No vocabulary to fit or store,
+    so the same vectorizer works for training, partial_fit and prediction.
+    """
+    return HashingVectorizer(
+        analyzer='char_wb',
+        ngram_range=(2, 4),
+        n_features=2 ** 18,
+        alternate_sign=False,
+        lowercase=True,
+    )
+
+
 class SimpleCategoryModel(BaseCategoryModel):
     """
-    Updated implementation that uses a pre-trained zero-shot model
-    instead of training our own classifier.
+    Fast-path category model: hashed character n-grams + a linear classifier
+    trained with logistic loss, so predict_proba gives a usable confidence.
+
+    It is meant to be distilled from confident zero-shot predictions and user
+    overrides (see the `train_fast_model` command) and answers in microseconds
+    per description; ai_utils only escalates to the zero-shot pipeline when
+    this model is unsure.
     """
-    def __init__(self):
-        # No initialization needed for the zero-shot approach
-        pass
+    def __init__(self, alpha=1e-5):
+        self.alpha = alpha
+        self.vectorizer = make_vectorizer()
+        self.clf = None
+
+    def is_trained(self):
+        return self.clf is not None
+
+    @property
+    def classes(self):
+        return list(self.clf.classes_) if self.clf is not None else []
 
     def predict(self, texts):
-        """
-        With the new approach, we don't use this class for prediction.
-        Predictions are handled directly in ai_utils.py with the zero-shot model.
-        This method is kept for compatibility but will not be used.
-        """
-        # Return uncertain predictions as fallback
-        return [("Uncertain", 0.1)] * len(texts)
-
-    def train(self, X_texts, y_labels, random_state=42):
-        """
-        With the new approach, we don't need to train our own model.
-        This method is kept for compatibility but does nothing.
-        """
-        pass
+        """Return list of (category, confidence) for each text"""
+        if not self.is_trained():
+            return [("Uncertain", 0.0)] * len(texts)
+        if not texts:
+            return []
+        X = self.vectorizer.transform([t or '' for t in texts])
+        proba = self.clf.predict_proba(X)
+        best = proba.argmax(axis=1)
+        classes = self.clf.classes_
+        return [(str(classes[j]), float(proba[i, j])) for i, j in enumerate(best)]
+
+    def predict_proba(self, texts):
+        """Return (classes, probability matrix) for the given texts"""
+        if not self.is_trained():
+            return [], np.zeros((len(texts), 0))
+        X = self.vectorizer.transform([t or '' for t in texts])
+        return self.classes, self.clf.predict_proba(X)
+
+    def train(self, X_texts, y_labels, random_state=42, sample_weight=None):
+        self.clf = SGDClassifier(
+            loss='log_loss',
+            alpha=self.alpha,
+            max_iter=50,
+            tol=1e-4,
+            random_state=random_state,
+        )
+        X = self.vectorizer.transform([t or '' for t in X_texts])
+        self.clf.fit(X, list(y_labels), sample_weight=sample_weight)
+        return self
 
     def save(self, path=None):
-        """
-        With the new approach, we don't need to save our own model.
-        This method is kept for compatibility but does nothing.
-        """
-        pass
+        path = path or _default_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename so a concurrently reloading process never sees half a file
+        tmp = f"{path}.tmp"
+        joblib.dump({'alpha': self.alpha, 'clf': self.clf}, tmp)
+        os.replace(tmp, path)
 
     @classmethod
     def load(cls, path=None):
-        """
-        With the new approach, we don't need to load our own model.
-        This method is kept for compatibility but returns a default instance.
-        """
-        return cls()
+        data = joblib.load(path or _default_path())
+        model = cls(alpha=data.get('alpha', 1e-5))
+        model.clf = data['clf']
+        return model
 
     @classmethod
-    def load_or_default(cls):
-        """
-        With the new approach, we don't need to load our own model.
-        This method is kept for compatibility but returns a default instance.
-        """
-        return cls()
\ No newline at end of file
+    def load_or_default(cls, path=None):
+        """Load the trained model if there is one, otherwise return an untrained instance"""
+        path = path or _default_path()
+        if os.path.exists(path):
+            try:
+                return cls.load(path)
+            except Exception as e:
+                print(f"Error loading fast classifier from {path}: {e}")
+        return cls()
@@ -1,74 +1,263 @@
 import os
-from django.contrib.auth import get_user_model
+import threading
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+import scipy.sparse as sp
+
 from .base import BaseCategoryModel
+from .prediction_cache import normalize_description
+from .sentence_classifier import make_vectorizer
+
+# bump when the stored layout changes; older files are refitted from the feedback table
+FORMAT_VERSION = 1
 
-User = get_user_model()
 
 class UserCategoryModel(BaseCategoryModel):
     """
-    Updated implementation that works with the pre-trained zero-shot model approach.
-    This class is kept for compatibility but doesn't train or use a separate model.
+    One user's category corrections as a small incremental model.
+
+    Normalized descriptions (store numbers and punctuation dropped, as in the
+    prediction cache) are hashed character n-gram vectors (the fast-path
+    features), kept as labelled prototypes. `partial_fit` folds a correction
+    into the closest prototype of the same category, or adds a new one, and
+    drops prototypes of other categories that it contradicts, so the newest
+    correction for a merchant wins. `predict` answers with the closest
+    prototype's category and uses the cosine similarity as the confidence.
+    Descriptions unlike anything the user corrected therefore score low and
+    go to the shared models.
+
+    Memory grows with the number of distinct merchants corrected, up to
+    `max_prototypes` (the least recently updated prototypes go first).
     """
-    def __init__(self, user_id=None):
+    # corrections at least this similar are the same merchant
+    MERGE_SIMILARITY = 0.9
+
+    def __init__(self, user_id=None, max_prototypes=500):
         self.user_id = user_id
-        # No model initialization needed for the zero-shot approach
-        
-    def _get_model_path(self):
-        """
-        With the new approach, we don't save user-specific models.
-        This method is kept for compatibility but will not be used.
-        """
-        return None
-        
+        self.max_prototypes = max_prototypes
+        self.vectorizer = make_vectorizer()
+        self.labels = []
+        self.weights = []      # corrections merged into each prototype
+        self.updated = []      # update counter value when each prototype last changed
+        self._rows = []        # unit-length 1 x n_features CSR rows
+        self._matrix = None    # _rows stacked, rebuilt after changes
+        self._nbytes = None
+        self._updates = 0
+        self.trained_through = 0  # id of the last CategoryFeedback applied
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock'], state['_matrix'], state['_nbytes']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._matrix = None
+        self._nbytes = None
+        self._lock = threading.Lock()
+
     def is_trained(self):
-        """
-        With the new approach, we don't have a trained model.
-        This method is kept for compatibility but returns False.
-        """
-        return False
-        
+        return bool(self._rows)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the prototypes"""
+        if self._nbytes is None:
+            self._nbytes = sum(r.data.nbytes + r.indices.nbytes + r.indptr.nbytes for r in self._rows)
+        return self._nbytes
+
+    def _stacked(self):
+        if self._matrix is None:
+            self._matrix = sp.vstack(self._rows, format='csr')
+        return self._matrix
+
     def predict(self, texts):
+        """Return list of (category, confidence) for each text"""
+        with self._lock:
+            if not self._rows:
+                return [("Uncertain", 0.0)] * len(texts)
+            if not texts:
+                return []
+            X = self.vectorizer.transform([normalize_description(t) for t in texts])
+            similarity = (X @ self._stacked().T).toarray()
+            labels = list(self.labels)
+        best = similarity.argmax(axis=1)
+        return [(labels[j], float(similarity[i, j])) for i, j in enumerate(best)]
+
+    def partial_fit(self, X_texts, y_labels, sample_weight=None):
+        weights = sample_weight if sample_weight is not None else [1.0] * len(X_texts)
+        with self._lock:
+            for text, label, weight in zip(X_texts, y_labels, weights):
+                self._learn_one(text, label, float(weight))
+        return self
+
+    def _learn_one(self, text, label, weight):
+        x = self.vectorizer.transform([normalize_description(text)])
+        if not x.nnz or not label:
+            return
+        self._updates += 1
+        similarity = (self._stacked() @ x.T).toarray().ravel() if self._rows else np.zeros(0)
+        close = np.flatnonzero(similarity >= self.MERGE_SIMILARITY)
+
+        # the newest correction for a merchant wins
+        contradicted = {i for i in close if self.labels[i] != label}
+        same = [i for i in close if self.labels[i] == label]
+        if same:
+            i = max(same, key=lambda j: similarity[j])
+            merged = self._rows[i] * self.weights[i] + x * weight
+            self._rows[i] = merged / np.sqrt(merged.multiply(merged).sum())
+            self.weights[i] += weight
+            self.updated[i] = self._updates
+        else:
+            self._rows.append(x)
+            self.labels.append(label)
+            self.weights.append(weight)
+            self.updated.append(self._updates)
+        drop = set(contradicted)
+        if len(self._rows) - len(drop) > self.max_prototypes:
+            keep_order = sorted((j for j in range(len(self._rows)) if j not in drop), key=lambda j: self.updated[j])
+            drop.update(keep_order[:len(self._rows) - len(drop) - self.max_prototypes])
+        if drop:
+            keep = [j for j in range(len(self._rows)) if j not in drop]
+            self._rows = [self._rows[j] for j in keep]
+            self.labels = [self.labels[j] for j in keep]
+            self.weights = [self.weights[j] for j in keep]
+            self.updated = [self.updated[j] for j in keep]
+        self._matrix = None
+        self._nbytes = None
+
+    def apply_feedback(self, rows) -> bool:
         """
-        With the new approach, we don't use this class for prediction.
-        Predictions are handled directly in ai_utils.py with the zero-shot model.
-        This method is kept for compatibility but will not be used.
+        Fold in (feedback id, description, category) rows not applied yet.
+        Safe to call from several threads with overlapping rows.
         """
-        # Return uncertain predictions as fallback
-        return [("Uncertain", 0.1)] * len(texts)
+        with self._lock:
+            rows = [r for r in rows if r[0] > self.trained_through]
+            for _, description, category in rows:
+                self._learn_one(description, category, 1.0)
+            if rows:
+                self.trained_through = max(r[0] for r in rows)
+        return bool(rows)
 
     def train(self, X_texts, y_labels, random_state=42):
-        """
-        With the new approach, we don't need to train user-specific models.
-        This method is kept for compatibility but does nothing.
-        """
-        pass
+        """Start over from the given corrections"""
+        with self._lock:
+            self._rows, self.labels, self.weights, self.updated = [], [], [], []
+            self._matrix = None
+            self._nbytes = None
+        return self.partial_fit(X_texts, y_labels)
 
-    def partial_fit(self, X_texts, y_labels):
-        """
-        With the new approach, we don't need to incrementally update models.
-        This method is kept for compatibility but does nothing.
-        """
-        pass
-        
-    def save(self, path=None):
-        """
-        With the new approach, we don't need to save user-specific models.
-        This method is kept for compatibility but does nothing.
-        """
-        pass
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename so a concurrently loading process never sees half a file
+        tmp = f"{path}.tmp"
+        with self._lock:
+            joblib.dump({'format': FORMAT_VERSION, 'model': self}, tmp)
+        os.replace(tmp, path)
 
     @classmethod
     def load(cls, path):
-        """
-        With the new approach, we don't load user-specific models.
-        This method is kept for compatibility but returns None.
-        """
-        return None
+        data = joblib.load(path)
+        if data.get('format') != FORMAT_VERSION:
+            return None
+        return data['model']
 
     @classmethod
-    def load_or_default(cls, user_id):
-        """
-        With the new approach, we don't need user-specific models.
-        This method is kept for compatibility but returns a default instance.
-        """
-        return cls(user_id=user_id)
\ No newline at end of file
+    def load_or_default(cls, user_id, path=None, max_prototypes=500):
+        """The user's saved model, or an empty one to be caught up from the feedback table"""
+        if path and os.path.exists(path):
+            try:
+                model = cls.load(path)
+                if model is not None:
+                    model.max_prototypes = max_prototypes
+                    return model
+            except Exception as e:
+                print(f"Error loading category model for user {user_id}: {e}")
+        return cls(user_id=user_id, max_prototypes=max_prototypes)
+
+
+class UserModelStore:
+    """
+    In-process LRU of per-user models, bounded by count and by approximate
+    memory, so thousands of users don't all sit in RAM. Models are loaded
+    from disk on first use and written back when they are evicted after
+    changing. A model that is lost unsaved is rebuilt on its next load
+    from the feedback rows after its `trained_through`.
+    """
+    def __init__(self, path_for, max_models=500, max_bytes=64 * 1024 * 1024, max_prototypes=500):
+        self.path_for = path_for
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.max_prototypes = max_prototypes
+        self._models = OrderedDict()  # user id -> model
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'loads': 0, 'evictions': 0, 'saves': 0}
+
+    def get(self, user_id) -> UserCategoryModel:
+        with self._lock:
+            model = self._models.get(user_id)
+            if model is not None:
+                self._models.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return model
+        model = UserCategoryModel.load_or_default(user_id, self.path_for(user_id), self.max_prototypes)
+        with self._lock:
+            # another thread may have loaded it meanwhile
+            model = self._models.setdefault(user_id, model)
+            self._models.move_to_end(user_id)
+            self._stats['loads'] += 1
+        self._evict()
+        return model
+
+    def mark_dirty(self, user_id):
+        with self._lock:
+            if user_id in self._models:
+                self._dirty.add(user_id)
+        self._evict()
+
+    def _evict(self):
+        evicted = []
+        with self._lock:
+            total = sum(m.nbytes for m in self._models.values())
+            while len(self._models) > 1 and (len(self._models) > self.max_models or total > self.max_bytes):
+                user_id, model = self._models.popitem(last=False)
+                total -= model.nbytes
+                self._stats['evictions'] += 1
+                if user_id in self._dirty:
+                    self._dirty.discard(user_id)
+                    evicted.append((user_id, model))
+        for user_id, model in evicted:
+            self._save(user_id, model)
+
+    def _save(self, user_id, model):
+        try:
+            model.save(self.path_for(user_id))
+            with self._lock:
+                self._stats['saves'] += 1
+        except OSError as e:
+            print(f"Error saving category model for user {user_id}: {e}")
+
+    def flush(self):
+        """Write every changed model to disk"""
+        with self._lock:
+            dirty = [(u, self._models[u]) for u in self._dirty if u in self._models]
+            self._dirty.clear()
+        for user_id, model in dirty:
+            self._save(user_id, model)
+
+    def clear(self):
+        """Drop every model from memory without saving it"""
+        with self._lock:
+            self._models.clear()
+            self._dirty.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['models'] = len(self._models)
+            stats['bytes'] = sum(m.nbytes for m in self._models.values())
+        return stats
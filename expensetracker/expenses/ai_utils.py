@@ -1,18 +1,85 @@
 # expenses/ai_utils.py
+import asyncio
+import contextvars
 import os
-from typing import Tuple, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, Optional, List
 from django.contrib.auth import get_user_model
-from transformers import pipeline
-import torch
+
+# transformers/torch/sklearn are imported where they are first needed, so
+# manage.py commands, migrations and tests don't pay for them at import time
+from .conf import expenses_setting
+from . import metrics
+from .ai.batching import MicroBatchScheduler
+from .ai.prediction_cache import PredictionCache, normalize_description, category_set_version
+from .ai.embedding_classifier import EmbeddingCategoryModel, UserPrototypeStore
+from .ai.label_profiles import CategoryProfile, CategoryProfileStore
+from .ai.model_host import ModelHostClient, ModelHostUnavailable
+from .models import MerchantRule
+from .rules import RuleSet, get_rules
+from .taxonomy import get_taxonomy
 
 User = get_user_model()
 
 # Pre-trained zero-shot classification model
 _classifier = None
+_classifier_lock = threading.Lock()
+# Micro-batching scheduler shared by all request threads (created on first use)
+_scheduler = None
+_scheduler_lock = threading.Lock()
+# Threads that run model calls for the async views (created on first use)
+_inference_executor = None
+_inference_executor_lock = threading.Lock()
+# Client for an out-of-process model host (EXPENSES['MODEL_HOST_SOCKET'])
+_model_host_client = None
+# True inside `run_model_host`, which must run the model itself
+_serving_model_host = False
+# (label, score) cache keyed by normalized description (created on first use)
+_prediction_cache = None
+# Distilled fast-path model, reloaded when its file changes on disk
+_fast_model = None
+_fast_model_mtime = None
+_fast_model_checked_at = 0.0
+_fast_model_lock = threading.Lock()
+# How often (seconds) to look for a retrained fast model on disk
+FAST_MODEL_RELOAD_INTERVAL = 30
+# Sentence-embedding engine and per-user prototypes (AI_ENGINE = 'embedding'),
+# one entry per user and taxonomy level classified
+_embedding_model = None
+_embedding_lock = threading.Lock()
+_user_prototypes = UserPrototypeStore()
+# Per-user category profiles that shortlist zero-shot candidate labels, one
+# per taxonomy level classified (keyed by user and label set)
+_category_profiles = CategoryProfileStore()
+# Per-user correction models fitted from overrides (created on first use)
+_user_model_store = None
+_user_model_store_lock = threading.Lock()
+# Per-process counters for the fast path / zero-shot escalation split
+_stats_lock = threading.Lock()
+_stats = {
+    'predictions': 0,
+    'rules': 0,
+    'user_model': 0,
+    'fast_path': 0,
+    'escalated': 0,
+    'fallback': 0,
+    'fast_path_seconds': 0.0,
+    'escalated_seconds': 0.0,
+    'escalated_calls': 0,
+    'refined': 0,
+    'pruned': 0,
+    'pruning_retries': 0,
+    'candidate_labels': 0,
+    'candidate_labels_full': 0,
+}
 # Minimum confidence threshold for a prediction to be considered certain
 CONFIDENCE_THRESHOLD = 0.7
+# Hugging Face model used for zero-shot classification
+MODEL_NAME = "facebook/bart-large-mnli"
 
-# Default expense categories
+# Default expense categories; the taxonomy's global top level is seeded from these
 DEFAULT_CATEGORIES = [
     "Food & Drink",
     "Groceries",
@@ -26,98 +93,650 @@ DEFAULT_CATEGORIES = [
 ]
 
 def _load_classifier():
-    """Load the pre-trained zero-shot classification model"""
+    """Load the pre-trained zero-shot classification model with the configured backend"""
     global _classifier
     if _classifier is None:
-        # Use a pre-trained model for zero-shot classification
-        # This model can classify text into any categories without retraining
-        try:
-            _classifier = pipeline(
-                "zero-shot-classification",
-                model="facebook/bart-large-mnli",
-                device=0 if torch.cuda.is_available() else -1  # Use GPU if available
-            )
-        except Exception as e:
-            print(f"Error loading classifier: {e}")
-            # Fallback to CPU if GPU fails
-            _classifier = pipeline(
-                "zero-shot-classification",
-                model="facebook/bart-large-mnli",
-                device=-1
-            )
+        with _classifier_lock:
+            if _classifier is None:
+                # Use a pre-trained model for zero-shot classification
+                # This model can classify text into any categories without retraining
+                from .ai.backends import load_zero_shot_pipeline
+                backend = expenses_setting('AI_BACKEND')
+                _classifier = load_zero_shot_pipeline(
+                    backend,
+                    MODEL_NAME,
+                    num_threads=expenses_setting('AI_BACKEND_THREADS').get(backend),
+                    onnx_dir=expenses_setting('ONNX_MODEL_DIR'),
+                )
     return _classifier
 
+def _model_fingerprint() -> str:
+    """Identifies the weights that produced a cached prediction"""
+    return f"{MODEL_NAME}:{expenses_setting('AI_BACKEND')}"
+
 def get_user_categories(user: User) -> list:
     """
-    Get user-specific categories or return default categories.
-    In a more advanced implementation, this could retrieve categories
-    that the user has previously used or defined.
+    Top-level categories of the user's taxonomy (see expenses.taxonomy), the
+    labels predict_categories chooses between first. Falls back to
+    DEFAULT_CATEGORIES when the taxonomy is empty.
     """
-    if user and user.is_authenticated:
-        # For now, we'll use default categories for all users
-        # In a more advanced implementation, we could customize this per user
-        return DEFAULT_CATEGORIES
-    return DEFAULT_CATEGORIES
+    return get_taxonomy(user).top_level() or DEFAULT_CATEGORIES
 
-def predict_category(text: str, user: Optional[User] = None) -> Tuple[str, float]:
+def _run_zero_shot(texts: List[str], categories: list) -> list:
     """
-    Returns (predicted_label, confidence_score) using a pre-trained zero-shot model.
-    If confidence is below threshold, returns ("Uncertain", confidence).
+    Run one batched zero-shot pipeline call over `texts`.
+    Returns one result dict ({'labels': [...], 'scores': [...]}) per text.
     """
-    # Load the classifier
     classifier = _load_classifier()
-    
+    start = time.perf_counter()
+    results = classifier(list(texts), candidate_labels=list(categories), batch_size=len(texts))
+    metrics.observe_inference('zero-shot', len(texts), time.perf_counter() - start)
+    # the pipeline unwraps single-item inputs
+    if isinstance(results, dict):
+        results = [results]
+    return results
+
+def get_scheduler() -> MicroBatchScheduler:
+    """Return the process-wide micro-batching scheduler, starting it if needed"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = MicroBatchScheduler(
+                    _run_zero_shot,
+                    max_batch_size=expenses_setting('AI_BATCH_MAX_SIZE'),
+                    max_wait_ms=expenses_setting('AI_BATCH_MAX_WAIT_MS'),
+                    max_queue_size=expenses_setting('AI_BATCH_QUEUE_SIZE'),
+                    submit_timeout=expenses_setting('AI_BATCH_SUBMIT_TIMEOUT'),
+                )
+    return _scheduler
+
+def serve_as_model_host():
+    """Mark this process as the model host so it never forwards to itself"""
+    global _serving_model_host
+    _serving_model_host = True
+
+def get_model_host_client() -> Optional[ModelHostClient]:
+    """Client for the configured model host, or None when in-process inference is used"""
+    global _model_host_client
+    socket_path = expenses_setting('MODEL_HOST_SOCKET')
+    if not socket_path or _serving_model_host:
+        return None
+    if _model_host_client is None or _model_host_client.socket_path != socket_path:
+        _model_host_client = ModelHostClient(socket_path, timeout=expenses_setting('MODEL_HOST_TIMEOUT'))
+    return _model_host_client
+
+def _classify_in_process(texts: List[str], categories: list) -> list:
+    """Classify `texts` locally, going through the micro-batching scheduler when enabled"""
+    if expenses_setting('AI_BATCHING'):
+        return get_scheduler().predict_many(
+            texts, categories, timeout=expenses_setting('AI_BATCH_RESULT_TIMEOUT')
+        )
+    return _run_zero_shot(texts, categories)
+
+def _classify(texts: List[str], categories: list) -> list:
+    """
+    Classify `texts` on the shared model host when one is configured, falling
+    back to in-process inference if it is unreachable (MODEL_HOST_FALLBACK).
+    Errors the host reports, overload included, propagate to the caller.
+    """
+    client = get_model_host_client()
+    if client is not None:
+        try:
+            start = time.perf_counter()
+            results = client.classify(texts, categories)
+            metrics.observe_inference('model-host', len(texts), time.perf_counter() - start)
+            return results
+        except ModelHostUnavailable as e:
+            if not expenses_setting('MODEL_HOST_FALLBACK'):
+                raise
+            print(f"Model host unavailable, classifying in-process: {e}")
+    return _classify_in_process(texts, categories)
+
+def get_prediction_cache() -> PredictionCache:
+    """Return the process-wide prediction cache"""
+    global _prediction_cache
+    if _prediction_cache is None:
+        _prediction_cache = PredictionCache(
+            max_local_entries=expenses_setting('PREDICTION_CACHE_LOCAL_SIZE'),
+            cache_alias=expenses_setting('PREDICTION_CACHE_ALIAS'),
+            timeout=expenses_setting('PREDICTION_CACHE_TTL'),
+        )
+    return _prediction_cache
+
+def invalidate_prediction_cache():
+    """Drop every cached prediction, e.g. after swapping model weights in place"""
+    get_prediction_cache().clear()
+
+def _top_prediction(result) -> Optional[Tuple[str, float]]:
+    """Extract the raw (label, score) top hit from a pipeline result"""
+    if result and 'labels' in result and 'scores' in result:
+        return result['labels'][0], float(result['scores'][0])
+    return None
+
+def _apply_threshold(prediction: Tuple[str, float]) -> Tuple[str, float]:
+    label, confidence = prediction
+    # If confidence is below threshold, mark as uncertain
+    if confidence < CONFIDENCE_THRESHOLD:
+        return "Uncertain", confidence
+    return label, confidence
+
+def _classify_cached(texts: List[str], categories: list) -> List[Optional[Tuple[str, float]]]:
+    """
+    Return the raw top (label, score) for each text, serving repeat merchants
+    from the prediction cache and classifying each distinct miss only once.
+    Texts the model could not classify come back as None.
+    """
+    predictions = [None] * len(texts)
+    use_cache = expenses_setting('PREDICTION_CACHE')
+    if not use_cache:
+        results = _classify(texts, categories)
+        return [_top_prediction(r) for r in results]
+
+    cache = get_prediction_cache()
+    version = category_set_version(_model_fingerprint(), categories, expenses_setting('PREDICTION_CACHE_VERSION'))
+    keys = []
+    for text in texts:
+        normalized = normalize_description(text)
+        keys.append(cache.make_key(normalized, version) if normalized else None)
+
+    cached = cache.get_many({k for k in keys if k is not None})
+
+    # one model call per distinct uncached key (uncacheable texts always go)
+    to_classify = {}
+    for i, (text, key) in enumerate(zip(texts, keys)):
+        if key in cached:
+            predictions[i] = cached[key]
+        else:
+            to_classify.setdefault(key if key is not None else ('nokey', i), (text, []))[1].append(i)
+
+    if to_classify:
+        groups = list(to_classify.items())
+        results = _classify([text for _, (text, _) in groups], categories)
+        fresh = {}
+        for (key, (_, positions)), result in zip(groups, results):
+            top = _top_prediction(result)
+            for i in positions:
+                predictions[i] = top
+            if top is not None and isinstance(key, str):
+                fresh[key] = top
+        cache.set_many(fresh)
+    return predictions
+
+def get_fast_model():
+    """
+    Return the distilled fast-path model, picking up a retrained file written
+    by `train_fast_model` without a restart. May be untrained (no file yet).
+    """
+    global _fast_model, _fast_model_mtime, _fast_model_checked_at
+    now = time.monotonic()
+    if _fast_model is not None and now - _fast_model_checked_at < FAST_MODEL_RELOAD_INTERVAL:
+        return _fast_model
+    with _fast_model_lock:
+        path = expenses_setting('FAST_MODEL_PATH')
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        if _fast_model is None or mtime != _fast_model_mtime:
+            from .ai.sentence_classifier import SimpleCategoryModel
+            _fast_model = SimpleCategoryModel.load_or_default(path)
+            _fast_model_mtime = mtime
+        _fast_model_checked_at = now
+    return _fast_model
+
+def _record(**increments):
+    with _stats_lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+def get_ai_stats() -> dict:
+    """Per-process counters for the categorization stack"""
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats['predictions']
+    stats['escalation_rate'] = stats['escalated'] / total if total else 0.0
+    stats['fast_path_rate'] = stats['fast_path'] / total if total else 0.0
+    stats['user_model_rate'] = stats['user_model'] / total if total else 0.0
+    stats['rules_rate'] = stats['rules'] / total if total else 0.0
+    stats['fast_path_mean_ms'] = 1000 * stats['fast_path_seconds'] / total if total else 0.0
+    calls = stats['escalated_calls']
+    stats['escalated_mean_ms'] = 1000 * stats['escalated_seconds'] / calls if calls else 0.0
+    full = stats['candidate_labels_full']
+    stats['candidate_label_ratio'] = stats['candidate_labels'] / full if full else 1.0
+    return {
+        'predictions': stats,
+        'prediction_cache': get_prediction_cache().stats() if expenses_setting('PREDICTION_CACHE') else None,
+        'scheduler': _scheduler.stats() if _scheduler is not None else None,
+        'user_models': _user_model_store.stats() if _user_model_store is not None else None,
+    }
+
+def get_user_model_store() -> 'UserModelStore':
+    """Return the process-wide LRU of per-user correction models"""
+    global _user_model_store
+    if _user_model_store is None:
+        with _user_model_store_lock:
+            if _user_model_store is None:
+                from .ai.user_model import UserModelStore  # sklearn/scipy
+                _user_model_store = UserModelStore(
+                    lambda user_id: os.path.join(expenses_setting('USER_MODEL_DIR'), f"{user_id}.joblib"),
+                    max_models=expenses_setting('USER_MODEL_CACHE_SIZE'),
+                    max_bytes=expenses_setting('USER_MODEL_CACHE_MB') * 1024 * 1024,
+                    max_prototypes=expenses_setting('USER_MODEL_MAX_PROTOTYPES'),
+                )
+    return _user_model_store
+
+def get_user_category_model(user: Optional[User]) -> Optional['UserCategoryModel']:
+    """
+    The user's correction model, caught up with any feedback recorded since
+    it was last fitted (by this or another process). None for anonymous users.
+    """
+    if not (user and user.is_authenticated) or not expenses_setting('USER_MODEL'):
+        return None
+
+    from .models import CategoryFeedback
+
+    store = get_user_model_store()
+    model = store.get(user.pk)
+    pending = list(
+        CategoryFeedback.objects.filter(user=user, id__gt=model.trained_through)
+        .order_by('id').values_list('id', 'description', 'category')
+    )
+    if pending and model.apply_feedback(pending):
+        store.mark_dirty(user.pk)
+    return model
+
+def _user_model_path(texts: List[str], user: Optional[User]) -> List[Optional[Tuple[str, float]]]:
+    """
+    Answer from the user's own corrections where a description is close to
+    one they corrected. Returns a prediction per text, or None.
+    """
+    model = get_user_category_model(user)
+    if model is None or not model.is_trained():
+        return [None] * len(texts)
+    threshold = expenses_setting('USER_MODEL_THRESHOLD')
+    return [p if p[1] >= threshold else None for p in model.predict(texts)]
+
+def _fast_path(texts: List[str], categories: list) -> List[Optional[Tuple[str, float]]]:
+    """
+    Answer from the distilled model where it is confident enough. Returns a
+    prediction per text, or None where the text must escalate to zero-shot.
+    """
+    if not expenses_setting('FAST_PATH'):
+        return [None] * len(texts)
+    model = get_fast_model()
+    if not model.is_trained():
+        return [None] * len(texts)
+
+    threshold = expenses_setting('FAST_PATH_THRESHOLD')
+    allowed = set(categories)
+    start = time.perf_counter()
+    predictions = []
+    for label, confidence in model.predict(texts):
+        if label in allowed and confidence >= threshold:
+            predictions.append((label, confidence))
+        else:
+            predictions.append(None)
+    elapsed = time.perf_counter() - start
+    _record(fast_path_seconds=elapsed)
+    metrics.observe_inference('fast-path', len(texts), elapsed)
+    return predictions
+
+def get_embedding_model() -> EmbeddingCategoryModel:
+    """Return the process-wide embedding classifier"""
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_lock:
+            if _embedding_model is None:
+                _embedding_model = EmbeddingCategoryModel(
+                    model_name=expenses_setting('EMBEDDING_MODEL_NAME'),
+                    cache_path=expenses_setting('EMBEDDING_CACHE_PATH'),
+                    temperature=expenses_setting('EMBEDDING_TEMPERATURE'),
+                )
+    return _embedding_model
+
+def _prototypes_for_user(model: EmbeddingCategoryModel, user: Optional[User], categories: list):
+    """Category prototypes adapted to the user's overrides (global ones for anonymous users)"""
+    if not (user and user.is_authenticated):
+        return model.category_prototypes(categories)
+
+    from django.db.models import Count, Max
+    from .models import Expense
+
+    overrides = Expense.objects.filter(user=user, user_override=True, category__in=categories)
+    fingerprint = tuple(overrides.aggregate(n=Count('id'), last=Max('updated_at')).values())
+    # one entry per label set: _refine asks for the top level and then a branch
+    key = (user.pk, tuple(categories))
+    prototypes = _user_prototypes.get(key, fingerprint)
+    if prototypes is None:
+        per_category = expenses_setting('EMBEDDING_USER_EXAMPLES')
+        examples = {}
+        for description, category in overrides.exclude(description='').values_list('description', 'category'):
+            bucket = examples.setdefault(category, [])
+            if len(bucket) < per_category:
+                bucket.append(description)
+        prototypes = model.user_prototypes(categories, examples)
+        _user_prototypes.put(key, fingerprint, prototypes)
+    return prototypes
+
+def _classify_embedding(texts: List[str], categories: list, user: Optional[User]) -> List[Tuple[str, float]]:
+    """One batched encoder pass plus a vectorized cosine similarity against the prototypes"""
+    model = get_embedding_model()
+    prototypes = _prototypes_for_user(model, user, categories)
+    start = time.perf_counter()
+    results = model.classify(texts, categories, prototypes)
+    metrics.observe_inference('embedding', len(texts), time.perf_counter() - start)
+    return results
+
+def get_category_profile(user: Optional[User], categories: list) -> Optional[CategoryProfile]:
+    """
+    The user's category profile over `categories`, rebuilt once their
+    expenses moved by LABEL_PRUNING_REBUILD_FRACTION or it is
+    LABEL_PRUNING_PROFILE_MAX_AGE seconds old. Expenses in subcategories
+    count for the nearest of `categories` above them. None until
+    LABEL_PRUNING_MIN_HISTORY expenses fall under `categories`, or for
+    anonymous users.
+    """
+    if not (user and user.is_authenticated):
+        return None
+
+    from django.db.models import Count, Max, Q
+    from .models import Expense
+
+    taxonomy = get_taxonomy(user)
+    history = Expense.objects.filter(user=user, category__in=set(taxonomy.labels()) | set(categories))
+    key = (user.pk, tuple(categories))
+    cached = _category_profiles.get(key, taxonomy.fingerprint, expenses_setting('LABEL_PRUNING_PROFILE_MAX_AGE'))
+    if cached is None:
+        n = history.count()
+    else:
+        profile, built_rows, built_last_updated = cached
+        n, changed = history.aggregate(
+            n=Count('id'), changed=Count('id', filter=Q(updated_at__gt=built_last_updated))).values()
+    if n < expenses_setting('LABEL_PRUNING_MIN_HISTORY'):
+        return None
+    if cached is None or CategoryProfileStore.moved(
+            built_rows, n, changed, expenses_setting('LABEL_PRUNING_REBUILD_FRACTION')):
+        # stamped before reading, so rows edited during the build count as changed next time
+        last_updated = history.aggregate(last=Max('updated_at'))['last']
+        labels = set(categories)
+        rows = (
+            (description, taxonomy.project(category, labels), override)
+            for description, category, override in
+            history.order_by().values_list('description', 'category', 'user_override').iterator()
+        )
+        profile = CategoryProfile.from_rows(categories, rows)
+        _category_profiles.put(key, taxonomy.fingerprint, profile, n, last_updated)
+    if profile.examples < expenses_setting('LABEL_PRUNING_MIN_HISTORY'):
+        return None
+    return profile
+
+def _candidate_labels(texts: List[str], categories: list, user: Optional[User]) -> List[list]:
+    """Labels to score each text against: the user's shortlist where their profile is sure enough"""
+    profile = get_category_profile(user, categories) if expenses_setting('LABEL_PRUNING') else None
+    if profile is None:
+        return [categories] * len(texts)
+    k = expenses_setting('LABEL_PRUNING_TOP_K')
+    min_mass = expenses_setting('LABEL_PRUNING_MIN_MASS')
+    return [profile.shortlist(text, k, min_mass) or categories for text in texts]
+
+def _classify_pruned(texts: List[str], categories: list, user: Optional[User]) -> List[Optional[Tuple[str, float]]]:
+    """
+    Zero-shot classification against each text's candidate labels, one call
+    per distinct shortlist. The pipeline costs one NLI pass per label, so a
+    shortlist of k out of n labels costs about k/n of a full call. Shortlisted
+    texts that still come back under the confidence threshold are re-scored
+    against every label.
+    """
+    candidates = _candidate_labels(texts, categories, user)
+    groups = {}
+    for i, labels in enumerate(candidates):
+        groups.setdefault(tuple(labels), []).append(i)
+
+    predictions = [None] * len(texts)
+    retry = []
+    for labels, positions in groups.items():
+        results = _classify_cached([texts[i] for i in positions], list(labels))
+        for i, top in zip(positions, results):
+            predictions[i] = top
+            if len(labels) < len(categories) and (top is None or top[1] < CONFIDENCE_THRESHOLD):
+                retry.append(i)
+    if retry:
+        for i, top in zip(retry, _classify_cached([texts[i] for i in retry], categories)):
+            predictions[i] = top
+
+    _record(pruned=sum(len(labels) < len(categories) for labels in candidates),
+            pruning_retries=len(retry),
+            candidate_labels=sum(len(labels) for labels in candidates) + len(retry) * len(categories),
+            candidate_labels_full=len(texts) * len(categories))
+    return predictions
+
+def _classify_escalated(texts: List[str], categories: list, user: Optional[User]):
+    """Classify with the configured heavy engine ('zero-shot', 'embedding' or 'rules')"""
+    engine = expenses_setting('AI_ENGINE')
+    if engine == 'rules':
+        # no model: the keyword rules answer every escalated text (see predict_categories)
+        return [None] * len(texts)
+    if engine == 'embedding':
+        return _classify_embedding(texts, categories, user)
+    return _classify_pruned(texts, categories, user)
+
+def _refine(texts: List[str], top: list, taxonomy, user: Optional[User], skip=()):
+    """
+    Walk confident predictions down the taxonomy in place. Each step scores
+    the chosen node's children plus the node itself, which wins when the
+    description fits none of them, so a step costs (children + 1) labels
+    rather than one label per category in the whole tree. Positions in
+    `skip` already hold the user's own choice and stay as they are.
+    """
+    def descend(i):
+        return top[i] is not None and top[i][1] >= CONFIDENCE_THRESHOLD and taxonomy.children(top[i][0])
+
+    frontier = [i for i in range(len(texts)) if i not in skip and descend(i)]
+    refined = set()
+    while frontier:
+        groups = {}
+        for i in frontier:
+            groups.setdefault(top[i][0], []).append(i)
+        frontier = []
+        for parent, positions in groups.items():
+            labels = taxonomy.children(parent) + [parent]
+            results = _classify_escalated([texts[i] for i in positions], labels, user)
+            for i, child in zip(positions, results):
+                if child is None or child[0] == parent or child[1] < CONFIDENCE_THRESHOLD:
+                    continue
+                # the reported confidence is that of the least certain step
+                top[i] = (child[0], min(top[i][1], child[1]))
+                refined.add(i)
+                if descend(i):
+                    frontier.append(i)
+    _record(refined=len(refined))
+
+def predict_zero_shot(texts: List[str], categories: Optional[list] = None) -> List[Optional[Tuple[str, float]]]:
+    """
+    Raw top (label, score) from the configured heavy engine, bypassing the
+    fast path and the confidence threshold. Used to distill the fast-path model.
+    """
+    return _classify_escalated([t or '' for t in texts], categories or DEFAULT_CATEGORIES, None)
+
+# Keyword fallback for when the model is unavailable or fails: the first
+# category with a keyword in the description (compiled like merchant rules)
+_FALLBACK_RULES = RuleSet([
+    (MerchantRule.MATCH_SUBSTRING, keyword, None, None, category)
+    for category, keywords in [
+        ('Transport', ['uber', 'bus', 'taxi', 'bolt']),
+        ('Food & Drink', ['restaurant', 'lunch', 'dinner', 'coffee', 'starbucks', 'kfc', 'grocer', 'grocery']),
+        ('Utilities', ['electric', 'water', 'bill']),
+        ('Shopping', ['clothes', 'shoe', 'shopping', 'mall', 'store', 'zara', 'h&m']),
+    ]
+    for keyword in keywords
+])
+
+def rule_based_category(text: str) -> Tuple[str, float]:
+    """Keyword fallback used when the model is unavailable or fails"""
+    category = _FALLBACK_RULES.match(text)
+    if category is not None:
+        return category, 0.6
+    return 'Other', 0.4
+
+def _rules_path(texts: List[str], amounts: list, user: Optional[User]) -> List[Optional[Tuple[str, float]]]:
+    """Categories from the user's and the global merchant rules (see expenses.rules), or None"""
+    rules = get_rules(user)
+    if not rules:
+        return [None] * len(texts)
+    predictions = []
+    for text, amount in zip(texts, amounts):
+        category = rules.match(text, amount)
+        predictions.append((category, 1.0) if category is not None else None)
+    return predictions
+
+def predict_categories(texts: List[str], user: Optional[User] = None,
+                       amounts: Optional[list] = None) -> List[Tuple[str, float]]:
+    """
+    Batch version of predict_category: returns one (label, confidence) per text.
+    `amounts` (one per text) lets merchant rules with an amount range apply.
+    All texts share one pipeline call (or one scheduler flush), which is much
+    cheaper per description than classifying them one at a time.
+    Top-level categories are classified first, then subcategories (see _refine).
+    """
+    texts = [t or '' for t in texts]
+    if not texts:
+        return []
+
     # Get categories (user-specific or default)
     categories = get_user_categories(user)
-    
+
+    with metrics.timed('inference'):
+        # Merchant rules first, then the user's own corrections, then the
+        # cheap distilled model; only texts none of them is sure about go
+        # to the zero-shot model
+        top = _rules_path(texts, amounts or [None] * len(texts), user)
+        ruled = {i for i, p in enumerate(top) if p is not None}
+        unruled = [i for i in range(len(texts)) if i not in ruled]
+        for i, prediction in zip(unruled, _user_model_path([texts[i] for i in unruled], user)):
+            top[i] = prediction
+        learned = {i for i in unruled if top[i] is not None}
+        rest = [i for i in unruled if i not in learned]
+        for i, prediction in zip(rest, _fast_path([texts[i] for i in rest], categories)):
+            top[i] = prediction
+        escalate = [i for i, p in enumerate(top) if p is None]
+        if escalate:
+            start = time.perf_counter()
+            try:
+                # Perform zero-shot classification
+                escalated = _classify_escalated([texts[i] for i in escalate], categories, user)
+                for i, prediction in zip(escalate, escalated):
+                    top[i] = prediction
+            except Exception as e:
+                print(f"Error in prediction: {e}")
+                # Fallback rule-based if model prediction fails
+            _record(escalated_seconds=time.perf_counter() - start, escalated_calls=1)
+
+        # Then only among the subcategories of each confident pick
+        try:
+            _refine(texts, top, get_taxonomy(user), user, skip=ruled | learned)
+        except Exception as e:
+            print(f"Error refining prediction: {e}")
+
+    predictions = []
+    fallback = 0
+    for text, prediction in zip(texts, top):
+        if prediction is None:
+            fallback += 1
+            predictions.append(rule_based_category(text))
+        else:
+            predictions.append(_apply_threshold(prediction))
+    _record(predictions=len(texts), rules=len(ruled), user_model=len(learned), fast_path=len(rest) - len(escalate),
+            escalated=len(escalate), fallback=fallback)
+    return predictions
+
+def predict_category(text: str, user: Optional[User] = None, amount=None) -> Tuple[str, float]:
+    """
+    Returns (predicted_label, confidence_score) using a pre-trained zero-shot model.
+    If confidence is below threshold, returns ("Uncertain", confidence).
+    Concurrent callers are transparently micro-batched (see get_scheduler).
+    """
+    return predict_categories([text], user, [amount])[0]
+
+def get_inference_executor() -> ThreadPoolExecutor:
+    """
+    Dedicated threads for model calls made from async views. A slow batch
+    then waits here instead of holding one of the threads that
+    sync_to_async uses for database work.
+    """
+    global _inference_executor
+    if _inference_executor is None:
+        with _inference_executor_lock:
+            if _inference_executor is None:
+                _inference_executor = ThreadPoolExecutor(
+                    max_workers=expenses_setting('AI_INFERENCE_WORKERS'), thread_name_prefix='inference',
+                )
+    return _inference_executor
+
+def _call_and_release(func, *args):
+    from django.db import close_old_connections
     try:
-        # Perform zero-shot classification
-        result = classifier(text, categories)
-        
-        # Get the top prediction
-        if result and 'labels' in result and 'scores' in result:
-            label = result['labels'][0]
-            confidence = result['scores'][0]
-            
-            # If confidence is below threshold, mark as uncertain
-            if confidence < CONFIDENCE_THRESHOLD:
-                return "Uncertain", confidence
-            return label, confidence
-    except Exception as e:
-        print(f"Error in prediction: {e}")
-        # Fallback rule-based if model prediction fails
-        pass
-    
-    # Fallback rule-based
-    txt = text.lower()
-    if any(w in txt for w in ['uber', 'bus', 'taxi', 'bolt']):
-        return 'Transport', 0.6
-    if any(w in txt for w in ['restaurant', 'lunch', 'dinner', 'coffee', 'starbucks', 'kfc', 'grocer', 'grocery']):
-        return 'Food & Drink', 0.6
-    if any(w in txt for w in ['electric', 'water', 'bill']):
-        return 'Utilities', 0.6
-    if any(w in txt for w in ['clothes', 'shoe', 'shopping', 'mall', 'store', 'zara', 'h&m']):
-        return 'Shopping', 0.6
-    return 'Other', 0.4
+        return func(*args)
+    finally:
+        # executor threads never see request_finished, so expire their connections here
+        close_old_connections()
+
+async def run_inference(func, *args):
+    """Await `func(*args)` on the inference executor, keeping the caller's context (metrics)"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_inference_executor(), context.run, _call_and_release, func, *args)
+
+async def apredict_category(text: str, user: Optional[User] = None, amount=None) -> Tuple[str, float]:
+    """predict_category for async views"""
+    return await run_inference(predict_category, text, user, amount)
+
+def warmup(engine: Optional[str] = None) -> dict:
+    """
+    Load the fast-path model and the heavy engine and push a dummy batch
+    through them, so the first real request doesn't pay for it. Bypasses the
+    prediction cache. Returns timings in seconds.
+    """
+    engine = engine or expenses_setting('AI_ENGINE')
+    report = {'engine': engine}
+
+    start = time.perf_counter()
+    get_fast_model()
+    report['fast_model_load_seconds'] = time.perf_counter() - start
+
+    if engine == 'rules':
+        # nothing else to load
+        report.update(load_seconds=0.0, first_batch_seconds=0.0, first_batch_size=0)
+        return report
 
-def update_user_model_with_feedback(user: User, text: str, category: str):
+    dummy = ["Coffee at Starbucks", "Uber ride to the airport", "Monthly rent"]
+    start = time.perf_counter()
+    if engine == 'embedding':
+        model = get_embedding_model().load(DEFAULT_CATEGORIES)
+        report['load_seconds'] = time.perf_counter() - start
+        start = time.perf_counter()
+        model.classify(dummy, DEFAULT_CATEGORIES)
+    else:
+        _load_classifier()
+        report['load_seconds'] = time.perf_counter() - start
+        start = time.perf_counter()
+        _run_zero_shot(dummy, DEFAULT_CATEGORIES)
+    report['first_batch_seconds'] = time.perf_counter() - start
+    report['first_batch_size'] = len(dummy)
+    return report
+
+def update_user_model_with_feedback(user: User, text: str, category: str, expense=None, predicted_category: str = ''):
     """
-    With the zero-shot approach, we don't need to update a trained model.
-    Instead, we could store the user's preferences or feedback for other purposes.
-    For example, we could track which categories a user commonly uses.
+    Record a category correction and fold it into the user's correction
+    model right away (partial_fit; the model is saved to disk lazily)
     """
-    # In this implementation, we don't need to update a model since we're using
-    # a pre-trained zero-shot classifier. However, we could store this feedback
-    # for analytics or to customize the category list for the user in the future.
-    
-    if not user.is_authenticated:
+    if not user.is_authenticated or not category:
         return
-        
-    # For now, we'll just log that this feedback was provided
-    print(f"User {user.id} provided feedback: '{text}' -> '{category}'")
-    
-    # In a more advanced implementation, you might:
-    # 1. Store this feedback in a database for analytics
-    # 2. Customize the category list for this user based on their preferences
-    # 3. Adjust the confidence threshold based on user feedback
-    pass
+
+    from .models import CategoryFeedback
+
+    CategoryFeedback.objects.create(
+        user=user, expense=expense, description=text or '', category=category,
+        predicted_category=predicted_category or '',
+    )
+    get_user_category_model(user)
@@ -1,6 +1,69 @@
+import os
+import sys
+import threading
+
 from django.apps import AppConfig
 
+# manage.py commands that run long-lived processes of a given role
+WORKER_COMMANDS = {'categorize_worker'}
+MODEL_HOST_COMMANDS = {'run_model_host'}
+WEB_COMMANDS = {'runserver'}
+
+
+def get_process_role() -> str:
+    """
+    'web', 'worker', 'model-host' or 'management'. EXPENSES_PROCESS_ROLE wins; otherwise
+    it is guessed from the manage.py subcommand (anything not started through
+    manage.py, e.g. gunicorn or uvicorn, is a web process).
+    """
+    role = os.environ.get('EXPENSES_PROCESS_ROLE')
+    if role:
+        return role
+    argv = sys.argv
+    if not argv or os.path.basename(argv[0]) not in ('manage.py', 'django-admin'):
+        return 'web'
+    command = argv[1] if len(argv) > 1 else ''
+    if command in WORKER_COMMANDS:
+        return 'worker'
+    if command in MODEL_HOST_COMMANDS:
+        return 'model-host'
+    if command in WEB_COMMANDS:
+        # the autoreloader parent never serves requests, only its child does
+        if os.environ.get('RUN_MAIN') != 'true' and '--noreload' not in argv:
+            return 'management'
+        return 'web'
+    return 'management'
+
 
 class ExpensesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'expenses'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from . import schema, signals  # noqa: F401  (register the OpenAPI extensions and rollup maintenance handlers)
+        from .conf import expenses_setting
+        from .metrics import install_query_wrapper
+
+        # per-request query counts for expenses/metrics.py
+        connection_created.connect(install_query_wrapper, dispatch_uid='expenses_metrics_queries')
+
+        role = get_process_role()
+        mode = expenses_setting('AI_WARMUP').get(role, 'lazy')
+        # the model host loads its model in run_model_host, and processes
+        # sending their predictions to it have nothing to warm up
+        if mode == 'lazy' or role == 'model-host' or expenses_setting('MODEL_HOST_SOCKET'):
+            return
+
+        def warm():
+            from .ai_utils import warmup
+            try:
+                report = warmup()
+                print(f"AI models warmed up in {report['load_seconds'] + report['first_batch_seconds']:.1f}s")
+            except Exception as e:
+                print(f"AI warm-up failed, models will load on first use: {e}")
+
+        if mode == 'eager':
+            warm()
+        elif mode == 'background':
+            threading.Thread(target=warm, name='ai-warmup', daemon=True).start()
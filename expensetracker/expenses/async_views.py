@@ -0,0 +1,144 @@
+# expenses/async_views.py
+"""
+Native async variants of the busiest endpoints, mounted next to the DRF ones:
+
+    GET/POST  /api/async/expenses/        list (cursor pagination, ?fields=, ?prediction_state=) and create
+    GET       /api/async/expenses/<id>/   retrieve (?fields=)
+    GET       /api/async/insights/        insights (ETag / 304 like /api/insights/)
+
+Requests, responses and errors are the same as on the DRF views. Served by
+an ASGI server (`uvicorn expensetracker.asgi:application`), they never hold
+a thread while they wait:
+- queries go through Django's async ORM
+- model inference runs on a dedicated executor (EXPENSES['AI_INFERENCE_WORKERS']),
+  so a slow batch can't starve the threads that run database work
+- the insights summaries run concurrently
+
+DRF views are synchronous, so these are plain Django views that reuse the
+serializers, pagination, authentication and renderer.
+"""
+import functools
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import insights_cache
+from .ai_utils import apredict_category
+from .authentication import TimedJWTAuthentication
+from .conf import expenses_setting
+from .fast_serializers import ValuesRowSerializer
+from .insights import acompute_insights
+from .models import Expense
+from .pagination import ExpenseCursorPagination, KEY_FIELDS
+from .renderers import FastJSONRenderer
+from .serializers import ExpenseSerializer, apply_category_prediction
+from .views import insights_preconditions, parse_fields_param
+
+_renderer = FastJSONRenderer()
+_authenticator = TimedJWTAuthentication()
+
+
+def _json_response(data, status_code=status.HTTP_200_OK, headers=None):
+    content = _renderer.render(data) if data is not None else b''
+    return HttpResponse(content, status=status_code, headers=headers, content_type=_renderer.media_type)
+
+
+def _error_response(exc):
+    """Same body and status as DRF's exception handler"""
+    if isinstance(exc, Http404):
+        exc = exceptions.NotFound(*exc.args)
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    headers = {}
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        headers['WWW-Authenticate'] = _authenticator.authenticate_header(None)
+    return _json_response(data, exc.status_code, headers)
+
+
+def async_api_view(*methods):
+    """
+    Wrap an async handler(request, user, **kwargs): DRF request parsing,
+    JWT authentication, method check and DRF-style error responses
+    """
+    def decorator(handler):
+        @csrf_exempt  # JWT only, no session cookies to forge
+        @functools.wraps(handler)
+        async def view(request, **kwargs):
+            try:
+                if request.method not in methods:
+                    raise exceptions.MethodNotAllowed(request.method)
+                request = Request(request, parsers=[p() for p in api_settings.DEFAULT_PARSER_CLASSES])
+                auth = await _authenticator.aauthenticate(request)
+                if auth is None:
+                    raise exceptions.NotAuthenticated()
+                return await handler(request, auth[0], **kwargs)
+            except (exceptions.APIException, Http404) as exc:
+                return _error_response(exc)
+        return view
+    return decorator
+
+
+def _fast_serializer(request):
+    fields = parse_fields_param(request.query_params.get('fields'))
+    serializer = ExpenseSerializer(fields=fields) if fields else ExpenseSerializer()
+    return ValuesRowSerializer(serializer)
+
+
+@async_api_view('GET', 'POST')
+async def expense_list(request, user):
+    if request.method == 'POST':
+        return await _create(request, user)
+
+    fast = _fast_serializer(request)
+    queryset = Expense.objects.filter(user=user)
+    prediction_state = request.query_params.get('prediction_state')
+    if prediction_state:
+        queryset = queryset.filter(prediction_state=prediction_state)
+    paginator = ExpenseCursorPagination()
+    page = await paginator.apaginate_queryset(
+        queryset.values(*set(fast.value_fields) | set(KEY_FIELDS)), request,
+    )
+    return _json_response(paginator.get_paginated_data(fast.serialize(page)))
+
+
+async def _create(request, user):
+    serializer = ExpenseSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    validated = dict(serializer.validated_data)
+
+    prediction = None
+    if not (validated.get('category', '') or '').strip() and not expenses_setting('ASYNC_CATEGORIZATION'):
+        prediction = await apredict_category(validated.get('description', '') or '', user, validated.get('amount'))
+    apply_category_prediction(validated, prediction)
+    expense = await Expense.objects.acreate(user=user, **validated)
+    return _json_response(ExpenseSerializer(expense).data, status.HTTP_201_CREATED)
+
+
+@async_api_view('GET')
+async def expense_detail(request, user, pk):
+    fast = _fast_serializer(request)
+    try:
+        row = await Expense.objects.filter(user=user).values(*fast.value_fields).aget(pk=pk)
+    except Expense.DoesNotExist:
+        raise Http404(f"No {Expense._meta.object_name} matches the given query.")
+    return _json_response(fast.serialize([row])[0])
+
+
+@async_api_view('GET')
+async def insights(request, user):
+    today = date.today()
+    version, updated_at = await sync_to_async(insights_cache.current_version)(user.pk)
+    headers, conditional_status = insights_preconditions(request, user.pk, version, updated_at, today)
+    if conditional_status is not None:
+        return _json_response(None, conditional_status, headers)
+
+    # the cache alias may be file or database backed
+    payload = await sync_to_async(insights_cache.load)(user.pk, version, today)
+    if payload is None:
+        payload = await acompute_insights(user, today)
+        await sync_to_async(insights_cache.store)(user.pk, version, today, payload)
+    return _json_response(payload, headers=headers)
@@ -0,0 +1,29 @@
+# expenses/authentication.py
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import metrics
+
+
+class TimedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that reports its time as the 'auth' phase (see expenses/metrics.py)"""
+
+    def authenticate(self, request):
+        with metrics.timed('auth'):
+            return super().authenticate(request)
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() for async views: the token is checked in the event
+        loop and only the user lookup (with simplejwt's active/revocation
+        checks) goes to a database thread. Returns (user, token) or None.
+        """
+        with metrics.timed('auth'):
+            header = self.get_header(request)
+            if header is None:
+                return None
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+            validated_token = self.get_validated_token(raw_token)
+            return await sync_to_async(self.get_user)(validated_token), validated_token
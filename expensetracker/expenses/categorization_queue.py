@@ -0,0 +1,124 @@
+# expenses/categorization_queue.py
+"""
+Database-backed queue for async categorization.
+
+With EXPENSES['ASYNC_CATEGORIZATION'] on, expenses without a category are
+saved immediately with prediction_state='pending'. Workers started with
+`manage.py categorize_worker` claim pending rows in batches, run them through
+predict_categories (one batched call per user) and write the results back.
+The expenses table itself is the queue, so no broker is needed.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import insights_cache, rollups
+from .ai_utils import predict_categories
+from .conf import expenses_setting
+from .models import Expense
+
+
+def claim_pending(batch_size=None):
+    """
+    Atomically move up to `batch_size` pending rows to 'processing' and return
+    them. The claim timestamp doubles as a token: only rows stamped by this
+    call are returned, so concurrent workers never process the same row.
+    """
+    batch_size = batch_size or expenses_setting('CATEGORIZE_BATCH_SIZE')
+    claimed_at = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Expense.objects.filter(prediction_state=Expense.PREDICTION_PENDING)
+            .order_by('created_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        Expense.objects.filter(id__in=ids, prediction_state=Expense.PREDICTION_PENDING).update(
+            prediction_state=Expense.PREDICTION_PROCESSING,
+            prediction_claimed_at=claimed_at,
+            prediction_attempts=F('prediction_attempts') + 1,
+            updated_at=claimed_at,  # queryset updates skip auto_now; the change feed reads it
+        )
+    return list(
+        Expense.objects.select_related('user')
+        .filter(id__in=ids, prediction_state=Expense.PREDICTION_PROCESSING, prediction_claimed_at=claimed_at)
+    )
+
+
+def requeue_stale(timeout=None):
+    """
+    Return rows whose worker died mid-batch to the pending state; returns how
+    many. Rows claimed CATEGORIZE_MAX_ATTEMPTS times are marked failed
+    instead, so a row that crashes the worker isn't retried forever.
+    """
+    timeout = timeout if timeout is not None else expenses_setting('CATEGORIZE_CLAIM_TIMEOUT')
+    now = timezone.now()
+    stale = Expense.objects.filter(
+        prediction_state=Expense.PREDICTION_PROCESSING, prediction_claimed_at__lt=now - timedelta(seconds=timeout)
+    )
+    stale.filter(prediction_attempts__gte=expenses_setting('CATEGORIZE_MAX_ATTEMPTS')).update(
+        prediction_state=Expense.PREDICTION_FAILED, prediction_claimed_at=None, updated_at=now,
+    )
+    return stale.update(prediction_state=Expense.PREDICTION_PENDING, prediction_claimed_at=None, updated_at=now)
+
+
+def _fail(expenses):
+    max_attempts = expenses_setting('CATEGORIZE_MAX_ATTEMPTS')
+    for expense in expenses:
+        if expense.prediction_attempts >= max_attempts:
+            expense.prediction_state = Expense.PREDICTION_FAILED
+        else:
+            expense.prediction_state = Expense.PREDICTION_PENDING
+        expense.prediction_claimed_at = None
+        expense.save(update_fields=['prediction_state', 'prediction_claimed_at', 'updated_at'])
+
+
+def process_batch(expenses):
+    """Categorize claimed rows, one predict_categories call per user; returns rows completed"""
+    by_user = {}
+    for expense in expenses:
+        by_user.setdefault(expense.user_id, []).append(expense)
+
+    done = 0
+    for rows in by_user.values():
+        try:
+            predictions = predict_categories([e.description for e in rows], rows[0].user, [e.amount for e in rows])
+        except Exception as e:
+            print(f"Error categorizing pending expenses: {e}")
+            _fail(rows)
+            continue
+
+        for expense, (label, conf) in zip(rows, predictions):
+            _complete(expense, label, conf)
+            done += 1
+    return done
+
+
+def _complete(expense, label, conf):
+    """Write a prediction back, filling the category only if it is still empty"""
+    now = timezone.now()
+    with transaction.atomic():
+        # conditional UPDATE: a category the user picked after the claim wins
+        filled = Expense.objects.filter(pk=expense.pk, category='').update(category=label, updated_at=now)
+        if filled:
+            # queryset updates skip the signals, so move the row's rollups here
+            day, amount = Expense.objects.filter(pk=expense.pk).values_list('date', 'amount').get()
+            rollups.apply_delta(expense.user_id, day, '', -amount, -1)
+            rollups.apply_delta(expense.user_id, day, label, amount, 1)
+        Expense.objects.filter(pk=expense.pk).update(
+            predicted_category=label, ai_confidence=conf,
+            prediction_state=Expense.PREDICTION_DONE, prediction_claimed_at=None, updated_at=now,
+        )
+    if filled:
+        insights_cache.bump(expense.user_id)
+
+
+def run_once(batch_size=None):
+    """Claim and process one batch; returns the number of rows completed"""
+    expenses = claim_pending(batch_size)
+    if not expenses:
+        return 0
+    return process_batch(expenses)
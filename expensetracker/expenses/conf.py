@@ -0,0 +1,136 @@
+# expenses/conf.py
+"""
+App-level settings for the expenses app.
+
+All options live in a single ``EXPENSES`` dict in the project settings, e.g.
+
+    EXPENSES = {
+        'AI_BATCHING': True,
+        'AI_BATCH_MAX_SIZE': 16,
+    }
+
+Anything not set there falls back to the defaults below. Values are read on
+every access so ``override_settings`` works in tests.
+"""
+import os
+
+from django.conf import settings
+
+DEFAULTS = {
+    # Model used when the fast path is unsure: 'zero-shot' (BART NLI),
+    # 'embedding' (sentence-transformers prototypes, one pass per description)
+    # or 'rules' (keyword rules only, no model; for CI and benchmarks)
+    'AI_ENGINE': 'zero-shot',
+
+    # Zero-shot inference backend: 'pytorch', 'quantized' (dynamic int8) or
+    # 'onnx' (ONNX Runtime export, see the export_onnx_model command)
+    'AI_BACKEND': 'pytorch',
+    'AI_BACKEND_THREADS': {'pytorch': None, 'quantized': None, 'onnx': None},  # None = library default
+    'ONNX_MODEL_DIR': os.path.join(settings.BASE_DIR, 'models', 'onnx'),
+
+    # Shared model host (see expenses/ai/model_host.py and run_model_host).
+    # When set, web workers send batches to this Unix socket instead of
+    # loading the model themselves.
+    'MODEL_HOST_SOCKET': None,
+    'MODEL_HOST_TIMEOUT': 30.0,
+    'MODEL_HOST_FALLBACK': True,   # load the model in-process if the host is down
+
+    # When to load the AI models, per process role (see apps.get_process_role):
+    # 'eager' blocks startup until loaded, 'background' loads in a thread,
+    # 'lazy' waits for the first prediction
+    'AI_WARMUP': {'web': 'background', 'worker': 'eager', 'management': 'lazy'},
+
+    # Threads for model calls made by the async views (see expenses/async_views.py);
+    # enough to fill one micro-batch
+    'AI_INFERENCE_WORKERS': 16,
+
+    # Micro-batching scheduler for the zero-shot pipeline
+    'AI_BATCHING': True,
+    'AI_BATCH_MAX_SIZE': 16,       # max descriptions per pipeline call
+    'AI_BATCH_MAX_WAIT_MS': 10,    # how long the first queued item may wait for company
+    'AI_BATCH_QUEUE_SIZE': 256,    # bounded queue; submitters block when it is full
+    'AI_BATCH_SUBMIT_TIMEOUT': 2.0,  # seconds to wait for a queue slot before giving up
+    'AI_BATCH_RESULT_TIMEOUT': 60.0,  # seconds to wait for a batch result
+
+    # Prediction cache (see expenses/ai/prediction_cache.py)
+    'PREDICTION_CACHE': True,
+    'PREDICTION_CACHE_LOCAL_SIZE': 10000,   # in-process LRU entries
+    'PREDICTION_CACHE_ALIAS': 'default',    # Django cache used as the persistent tier ('' disables it)
+    'PREDICTION_CACHE_TTL': 30 * 24 * 3600,  # seconds; None keeps entries forever
+    'PREDICTION_CACHE_VERSION': 1,          # bump to invalidate every persisted prediction
+
+    # Distilled fast-path model (see expenses/ai/sentence_classifier.py)
+    'FAST_PATH': True,
+    'FAST_PATH_THRESHOLD': 0.85,   # below this the zero-shot model is consulted
+    'FAST_MODEL_PATH': os.path.join(settings.BASE_DIR, 'models', 'fast_classifier.joblib'),
+
+    # Candidate label pruning for the zero-shot engine (see expenses/ai/label_profiles.py):
+    # each description is scored only against the user's k most plausible labels
+    'LABEL_PRUNING': True,
+    'LABEL_PRUNING_TOP_K': 4,
+    'LABEL_PRUNING_MIN_MASS': 0.9,     # below this share of the profile's probability all labels are scored
+    'LABEL_PRUNING_MIN_HISTORY': 20,   # categorized expenses before a user's profile is trusted
+    'LABEL_PRUNING_REBUILD_FRACTION': 0.05,  # rebuild a profile once this share of its rows changed
+    'LABEL_PRUNING_PROFILE_MAX_AGE': 600,    # ... or once it is this many seconds old
+
+    # Per-user correction models, fitted incrementally from overrides (see expenses/ai/user_model.py)
+    'USER_MODEL': True,
+    'USER_MODEL_THRESHOLD': 0.8,    # similarity to a corrected description needed to answer without a model
+    'USER_MODEL_DIR': os.path.join(settings.BASE_DIR, 'models', 'users'),
+    'USER_MODEL_CACHE_SIZE': 500,   # models kept in memory; the least recently used are saved and dropped
+    'USER_MODEL_CACHE_MB': 64,      # ... and at most about this much memory
+    'USER_MODEL_MAX_PROTOTYPES': 500,  # distinct corrected merchants remembered per user
+
+    # Embedding engine (see expenses/ai/embedding_classifier.py)
+    'EMBEDDING_MODEL_NAME': 'sentence-transformers/all-MiniLM-L6-v2',
+    'EMBEDDING_CACHE_PATH': os.path.join(settings.BASE_DIR, '.cache', 'embeddings.sqlite3'),
+    'EMBEDDING_TEMPERATURE': 0.05,   # softmax temperature over cosine similarities
+    'EMBEDDING_USER_EXAMPLES': 50,   # max overrides per category used for user prototypes
+
+    # Async categorization (see expenses/categorization_queue.py)
+    'ASYNC_CATEGORIZATION': False,  # save uncategorized expenses as pending instead of calling the model
+    'CATEGORIZE_BATCH_SIZE': 64,    # pending rows claimed per worker iteration
+    'CATEGORIZE_MAX_ATTEMPTS': 3,   # failures before a row is marked failed
+    'CATEGORIZE_CLAIM_TIMEOUT': 300,  # seconds before a claimed row is considered abandoned
+
+    # Anomaly detection (see expenses/ai/anomaly.py)
+    'ANOMALY_MODE': 'isolation_forest',   # or 'robust_z'
+    'ANOMALY_MODEL_DIR': os.path.join(settings.BASE_DIR, 'models', 'anomaly'),
+    'ANOMALY_REFIT_FRACTION': 0.1,  # refit once row count, total spend or edited rows move this much
+    'ANOMALY_Z_THRESHOLD': 3.5,     # robust z-score above which an expense is flagged
+
+    # Insights response cache (see expenses/insights_cache.py)
+    'INSIGHTS_CACHE_ALIAS': 'default',  # a file/database cache shares entries between processes
+    'INSIGHTS_CACHE_TTL': 600,          # seconds
+
+    # Expense listing (see expenses/pagination.py)
+    'EXPENSE_PAGE_SIZE': 100,      # default page size for GET /api/expenses/
+    'EXPENSE_MAX_PAGE_SIZE': 1000,  # upper bound for ?page_size=
+    'FAST_READ_SERIALIZER': True,  # list from .values() rows (see expenses/fast_serializers.py)
+
+    # Incremental sync (see expenses/sync.py)
+    'SYNC_PAGE_SIZE': 500,         # max changes (and deletions) per GET /api/expenses/changes/
+    'SYNC_SETTLE_SECONDS': 1,      # rows newer than this wait for the next sync (in-flight commits)
+    'SYNC_TOMBSTONE_RETENTION_DAYS': 90,  # older tokens need a full resync; None keeps tombstones forever
+
+    # Streaming export (see expenses/exporting.py)
+    'EXPORT_CHUNK_SIZE': 2000,     # rows fetched per database round trip
+    'EXPORT_BUFFER_BYTES': 64 * 1024,  # output is yielded in pieces of about this size
+
+    # Performance metrics (see expenses/metrics.py)
+    'METRICS': False,              # per-endpoint latency, query counts and model timings at /api/metrics/
+    'METRICS_TOKEN': None,         # bearer token for Prometheus scrapes; None = admin users only
+    'SERVER_TIMING': False,        # add a Server-Timing header with the phase breakdown to responses
+
+    # Bulk import
+    'IMPORT_CHUNK_SIZE': 500,      # rows per categorization batch / bulk_create
+    'BULK_MAX_ROWS': 5000,         # row limit for one POST /api/expenses/bulk/ request
+}
+
+
+def expenses_setting(name):
+    """Return the configured value for `name`, falling back to DEFAULTS."""
+    user_settings = getattr(settings, 'EXPENSES', None) or {}
+    if name in user_settings:
+        return user_settings[name]
+    return DEFAULTS[name]
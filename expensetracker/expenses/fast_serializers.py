@@ -0,0 +1,131 @@
+# expenses/fast_serializers.py
+"""
+Read-only fast path for serializing expenses straight from `.values()` rows.
+
+`ModelSerializer.to_representation` pays for get_attribute, SkipField
+handling and a generic to_representation per field per row. Given a
+configured serializer instance, `ValuesRowSerializer` compiles one converter
+per readable field up front: the Decimal quantize context, the output
+timezone, the date/datetime formats. Each row then costs one dict lookup and
+one function call per field. Output is identical to the serializer's own
+`.data`. Fields it has no specialized converter for keep using the field's
+own `to_representation`.
+"""
+import decimal
+from datetime import timezone as dt_timezone
+
+from rest_framework import relations, serializers
+from rest_framework.settings import ISO_8601, api_settings
+
+from .renderers import PortableFloatList, _portable_float
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return field.to_representation
+    quantum = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return f'{value.quantize(quantum, rounding=rounding, context=context):f}'
+    return convert
+
+
+def _date_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+
+    def convert(value):
+        if isinstance(value, str):
+            return value
+        return value.isoformat()
+    return convert
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+    # resolved per compile, i.e. per request, since the active timezone can change
+    tz = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if tz is None:
+        return field.to_representation
+    # UTC values rendered in UTC need no conversion, only the 'Z' suffix
+    utc_output = tz is dt_timezone.utc or getattr(tz, 'key', None) == 'UTC'
+
+    def convert(value):
+        if utc_output and value.__class__ is not str and value.tzinfo is dt_timezone.utc:
+            return value.isoformat()[:-6] + 'Z'
+        if isinstance(value, str):
+            return value
+        if value.tzinfo is None or value.utcoffset() is None:
+            value = field.enforce_timezone(value)
+        else:
+            value = value.astimezone(tz)
+        text = value.isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    return convert
+
+
+def _converter(field):
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_converter(field)
+    # DateTimeField subclasses DateField, so check it first
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, serializers.DateField):
+        return _date_converter(field)
+    if isinstance(field, serializers.BooleanField):
+        return bool
+    if isinstance(field, serializers.FloatField):
+        return float
+    if isinstance(field, serializers.CharField):
+        return str
+    if isinstance(field, serializers.IntegerField):
+        return int
+    if isinstance(field, relations.PrimaryKeyRelatedField) and field.pk_field is None:
+        return lambda value: value  # .values() already yields the raw pk
+    return field.to_representation
+
+
+class ValuesRowSerializer:
+    """
+    Serialize `.values()` rows the way `serializer` would serialize the
+    corresponding instances; `serializer` supplies the (possibly sparse)
+    field set and per-field options.
+    """
+    def __init__(self, serializer):
+        self.columns = []
+        self.float_fields = []
+        for field in serializer._readable_fields:
+            if field.source == '*' or '.' in field.source:
+                raise ValueError(f"field {field.field_name!r} is not a plain model column")
+            self.columns.append((field.field_name, field.source, _converter(field)))
+            if isinstance(field, serializers.FloatField):
+                self.float_fields.append(field.field_name)
+
+    @property
+    def value_fields(self):
+        """Arguments for `queryset.values()`"""
+        return [source for _, source, _ in self.columns]
+
+    def to_representation(self, row):
+        return {
+            name: None if row[source] is None else convert(row[source])
+            for name, source, convert in self.columns
+        }
+
+    def serialize(self, rows):
+        data = [self.to_representation(row) for row in rows]
+        # checking the float columns here is far cheaper than the renderer
+        # walking every value of every row
+        if all(item[name] is None or _portable_float(item[name]) for item in data for name in self.float_fields):
+            return PortableFloatList(data)
+        return data
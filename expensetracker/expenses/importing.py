@@ -0,0 +1,114 @@
+# expenses/importing.py
+"""
+Bulk expense import shared by the `POST /api/expenses/bulk/` action and the
+`import_expenses` management command.
+
+Rows are validated one at a time as they stream in, buffered into chunks,
+categorized with a single batched model call per chunk and written with
+`bulk_create`. A bad row is reported and skipped; it never aborts the import.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+
+from .ai_utils import predict_categories
+from .models import Expense
+from .rollups import apply_expenses
+from . import insights_cache
+from .serializers import ExpenseSerializer, apply_category_prediction
+from .conf import expenses_setting
+from .exporting import FORMULA_PREFIXES
+
+
+def _flush(user, pending, result):
+    """Categorize and insert one chunk of validated rows"""
+    if not pending:
+        return
+    uncategorized = [
+        (pos, data) for pos, (_, data) in enumerate(pending)
+        if not (data.get('category', '') or '').strip()
+    ]
+    predictions = {}
+    # in async mode uncategorized rows are left pending for the background worker
+    if uncategorized and not expenses_setting('ASYNC_CATEGORIZATION'):
+        labels = predict_categories(
+            [data.get('description', '') or '' for _, data in uncategorized], user,
+            [data.get('amount') for _, data in uncategorized],
+        )
+        predictions = {pos: label for (pos, _), label in zip(uncategorized, labels)}
+
+    objs = []
+    for pos, (_, data) in enumerate(pending):
+        apply_category_prediction(data, predictions.get(pos))
+        objs.append(Expense(user=user, **data))
+
+    try:
+        with transaction.atomic():
+            Expense.objects.bulk_create(objs)
+            # bulk_create skips the signals that keep rollups and the insights cache current
+            apply_expenses(objs)
+            insights_cache.bump(user.pk)
+    except Exception as e:
+        for row_number, _ in pending:
+            result['errors'].append({'row': row_number, 'errors': {'non_field_errors': [str(e)]}})
+    else:
+        result['created'] += len(objs)
+    pending.clear()
+
+
+def import_expenses(user, rows, chunk_size=None, max_rows=None):
+    """
+    Import an iterable of row dicts for `user`.
+
+    Returns {'total': n, 'created': n, 'errors': [{'row': i, 'errors': {...}}]}
+    where `row` is the 1-based position in the input.
+    """
+    chunk_size = chunk_size or expenses_setting('IMPORT_CHUNK_SIZE')
+    result = {'total': 0, 'created': 0, 'errors': []}
+    pending = []
+
+    if max_rows is not None:
+        rows = islice(rows, max_rows)
+
+    for row_number, row in enumerate(rows, start=1):
+        result['total'] += 1
+        if not isinstance(row, dict):
+            result['errors'].append({'row': row_number, 'errors': {'non_field_errors': ['Expected an object']}})
+            continue
+        serializer = ExpenseSerializer(data=row)
+        if not serializer.is_valid():
+            result['errors'].append({'row': row_number, 'errors': serializer.errors})
+            continue
+        pending.append((row_number, dict(serializer.validated_data)))
+        if len(pending) >= chunk_size:
+            _flush(user, pending, result)
+
+    _flush(user, pending, result)
+    return result
+
+
+def _csv_cell(value):
+    """Undo the apostrophe the exporter puts in front of formula-like text"""
+    if value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
+
+
+def read_csv_rows(fileobj):
+    """Yield row dicts from a CSV file with a header line; blank cells are dropped"""
+    for row in csv.DictReader(fileobj):
+        yield {k.strip(): _csv_cell(v) for k, v in row.items() if k and v not in (None, '')}
+
+
+def read_jsonl_rows(fileobj):
+    """Yield row dicts from a JSON Lines file; unparsable lines are yielded as-is so they get reported"""
+    for line in fileobj:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line
@@ -0,0 +1,128 @@
+# expenses/insights.py
+"""
+Insights computed from the rollup tables in expenses.rollups, so the cost
+depends on the number of day/month buckets, not the number of expenses.
+"""
+import asyncio
+import functools
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.db.models import Sum
+from django.db.models.functions import TruncWeek
+
+from .ai.anomaly import detect_anomalies_for_user
+from .models import DailyCategoryRollup, MonthlyCategoryRollup
+from .taxonomy import get_taxonomy
+
+
+def weekly_summary(user, today):
+    """Last 30 days, per week"""
+    last_30 = today - timedelta(days=30)
+    weekly_qs = (
+        DailyCategoryRollup.objects.filter(user=user, day__gte=last_30)
+        .annotate(week=TruncWeek('day'))
+        .values('week')
+        .annotate(total=Sum('total'))
+        .order_by('week')
+    )
+    return [
+        {'week': w['week'].isoformat(), 'total': float(w['total'] or 0)}
+        for w in weekly_qs
+    ]
+
+
+def monthly_summary(user, today):
+    """Last 6 months, per month"""
+    six_months_ago = today - timedelta(days=180)
+    first_full_month = (six_months_ago.replace(day=1) + timedelta(days=32)).replace(day=1)
+    totals = {}
+    # the window starts mid-month: take that month's tail from the daily buckets
+    partial = (
+        DailyCategoryRollup.objects.filter(user=user, day__gte=six_months_ago, day__lt=first_full_month)
+        .aggregate(total=Sum('total'))['total']
+    )
+    if partial is not None:
+        totals[six_months_ago.replace(day=1)] = partial
+    monthly_qs = (
+        MonthlyCategoryRollup.objects.filter(user=user, month__gte=first_full_month)
+        .values('month')
+        .annotate(total=Sum('total'))
+        .order_by('month')
+    )
+    for m in monthly_qs:
+        totals[m['month']] = m['total']
+    return [
+        {'month': month.isoformat(), 'total': float(total or 0)}
+        for month, total in sorted(totals.items())
+    ]
+
+
+def top_categories(user, limit=5):
+    """
+    All time, per top-level category of the user's taxonomy. Spending in
+    subcategories rolls up into its top-level category and is broken down
+    under 'subcategories'.
+    """
+    taxonomy = get_taxonomy(user)
+    per_category = (
+        MonthlyCategoryRollup.objects.filter(user=user)
+        .values('category')
+        .annotate(total=Sum('total'))
+        .order_by('-total')
+    )
+    groups = {}
+    for c in per_category:
+        name = c['category'] or 'Uncategorized'
+        root = taxonomy.root(name)
+        group = groups.setdefault(root, {'total': 0, 'subcategories': []})
+        group['total'] += c['total'] or 0
+        if name != root:
+            group['subcategories'].append({'category': name, 'total': float(c['total'] or 0)})
+
+    top = sorted(groups.items(), key=lambda item: item[1]['total'], reverse=True)[:limit]
+    result = []
+    for root, group in top:
+        entry = {'category': root, 'total': float(group['total'])}
+        if group['subcategories']:
+            entry['subcategories'] = group['subcategories']
+        result.append(entry)
+    return result
+
+
+def compute_insights(user, today=None):
+    today = today or date.today()
+    return {
+        'weekly': weekly_summary(user, today),
+        'monthly': monthly_summary(user, today),
+        'top_categories': top_categories(user),
+        'anomalies': detect_anomalies_for_user(user),
+    }
+
+
+def _in_worker_thread(func):
+    """Run `func` on a thread of its own, closing that thread's connection once CONN_MAX_AGE is up"""
+    def run(*args):
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(functools.wraps(func)(run), thread_sensitive=False)
+
+
+async def acompute_insights(user, today=None):
+    """
+    compute_insights for async views: the summaries and anomaly detection
+    run concurrently, each on its own thread and connection
+    """
+    today = today or date.today()
+    weekly, monthly, top, anomalies = await asyncio.gather(
+        _in_worker_thread(weekly_summary)(user, today),
+        _in_worker_thread(monthly_summary)(user, today),
+        _in_worker_thread(top_categories)(user),
+        # NumPy/scikit-learn on a cached per-user model: quick, so it stays
+        # off the inference executor where it would queue behind model calls
+        _in_worker_thread(detect_anomalies_for_user)(user),
+    )
+    return {'weekly': weekly, 'monthly': monthly, 'top_categories': top, 'anomalies': anomalies}
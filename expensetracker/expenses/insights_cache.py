@@ -0,0 +1,84 @@
+# expenses/insights_cache.py
+"""
+Per-user cache for the insights payload.
+
+Each user has a version counter (InsightsVersion) that is bumped whenever
+one of their expenses is written. The counter lives in the database so every
+worker process agrees on it; the payload itself goes to the Django cache
+alias named by EXPENSES['INSIGHTS_CACHE_ALIAS'] (local memory by default, a
+file or database cache to share it between processes) under a key that
+includes the version and today's date, so a write or a new day simply
+stops old entries from matching. The same version drives the ETag.
+"""
+import threading
+
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .conf import expenses_setting
+from .models import InsightsVersion
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+
+
+def bump(user_id):
+    """Invalidate the user's cached insights"""
+    now = timezone.now()
+    if InsightsVersion.objects.filter(user_id=user_id).update(version=F('version') + 1, updated_at=now):
+        return
+    try:
+        with transaction.atomic():
+            InsightsVersion.objects.create(user_id=user_id, version=1, updated_at=now)
+    except IntegrityError:
+        InsightsVersion.objects.filter(user_id=user_id).update(version=F('version') + 1, updated_at=now)
+
+
+def current_version(user_id):
+    """(version, last_modified) for the user, creating the counter on first use"""
+    obj, _ = InsightsVersion.objects.get_or_create(user_id=user_id, defaults={'updated_at': timezone.now()})
+    return obj.version, obj.updated_at
+
+
+def etag_for(user_id, version, today):
+    return f'"insights-{user_id}-{version}-{today.isoformat()}"'
+
+
+def _cache():
+    return caches[expenses_setting('INSIGHTS_CACHE_ALIAS')]
+
+
+def _key(user_id, version, today):
+    return f"insights:{user_id}:{version}:{today.isoformat()}"
+
+
+def record(event):
+    with _stats_lock:
+        _stats[event] += 1
+
+
+def load(user_id, version, today):
+    try:
+        payload = _cache().get(_key(user_id, version, today))
+    except Exception as e:
+        print(f"Insights cache read failed: {e}")
+        payload = None
+    record('hits' if payload is not None else 'misses')
+    return payload
+
+
+def store(user_id, version, today, payload):
+    try:
+        _cache().set(_key(user_id, version, today), payload, timeout=expenses_setting('INSIGHTS_CACHE_TTL'))
+    except Exception as e:
+        print(f"Insights cache write failed: {e}")
+
+
+def stats():
+    with _stats_lock:
+        result = dict(_stats)
+    lookups = result['hits'] + result['misses']
+    result['hit_rate'] = result['hits'] / lookups if lookups else 0.0
+    return result
@@ -0,0 +1,139 @@
+"""
+Throwaway databases with synthetic expenses, shared by the benchmark
+commands. Nothing touches the configured databases.
+"""
+import os
+import random
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection as default_connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from expenses.models import Expense
+from expenses.rollups import rebuild_for_user
+
+User = get_user_model()
+CATEGORIES = ["Food & Drink", "Groceries", "Transport", "Entertainment", "Utilities",
+              "Rent", "Healthcare", "Shopping", "Other"]
+# (category, typical amount, merchants) for realistic descriptions and amounts
+SPENDING = [
+    ('Food & Drink', 15, ['Starbucks coffee', 'Lunch at Subway', 'Dinner at Nandos', 'KFC takeaway']),
+    ('Groceries', 60, ['Tesco groceries', 'Carrefour weekly shop', 'Farmers market']),
+    ('Transport', 20, ['Uber ride home', 'Bolt to the office', 'Bus pass top-up', 'Taxi to airport']),
+    ('Entertainment', 30, ['Netflix subscription', 'Cinema tickets', 'Concert tickets']),
+    ('Utilities', 90, ['Electric bill', 'Water bill', 'Internet bill']),
+    ('Rent', 900, ['Monthly rent']),
+    ('Healthcare', 45, ['Pharmacy', 'Dentist visit']),
+    ('Shopping', 70, ['Zara clothes', 'H&M shoes', 'Mall shopping']),
+]
+
+
+@contextmanager
+def throwaway_database(alias, path=None, keep=False, options=None):
+    """Register `alias` as a fresh SQLite database holding the user and expense tables"""
+    path = path or os.path.join(tempfile.mkdtemp(prefix='expenses-bench-'), 'bench.sqlite3')
+    connections.settings[alias] = connections.configure_settings({
+        'default': connections.settings['default'],
+        alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path, 'OPTIONS': options or {}},
+    })[alias]
+    connection = connections[alias]
+    try:
+        with connection.schema_editor() as editor:
+            editor.create_model(User)
+            editor.create_model(Expense)
+        yield connection
+    finally:
+        connection.close()
+        del connections[alias]  # drop this thread's cached wrapper too
+        del connections.settings[alias]
+        if not keep:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+
+@contextmanager
+def migrated_database():
+    """
+    Point the default database at a freshly migrated test database for the
+    duration of the block, the way the test runner does. SQLite uses a
+    temporary file so that threads share it. Also allows the 'testserver'
+    host used by django.test.Client.
+    """
+    tmpdir = tempfile.mkdtemp(prefix='expenses-bench-')
+    test_settings = default_connection.settings_dict['TEST']
+    old_name, old_test_name = default_connection.settings_dict['NAME'], test_settings.get('NAME')
+    if default_connection.vendor == 'sqlite':
+        test_settings['NAME'] = os.path.join(tmpdir, 'suite.sqlite3')
+    setup_test_environment(debug=False)
+    try:
+        default_connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield default_connection
+        finally:
+            connections.close_all()
+            default_connection.creation.destroy_test_db(old_name, verbosity=0)
+    finally:
+        teardown_test_environment()
+        test_settings['NAME'] = old_test_name
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def seed_expenses(connection, rows, users, stdout=None):
+    """Insert `rows` random expenses spread over `users` users with raw executemany"""
+    if stdout:
+        stdout.write(f"Seeding {rows:,} expenses for {users:,} users ...")
+    start = time.perf_counter()
+    rng = random.Random(42)
+    now = datetime.now(dt_timezone.utc).isoformat(sep=' ')
+    today = date.today()
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode=OFF")
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.executemany(
+            f"INSERT INTO {User._meta.db_table} (id, password, is_superuser, username, first_name, last_name, "
+            "email, is_staff, is_active, date_joined) VALUES (?, '', 0, ?, '', '', '', 0, 1, ?)",
+            [(i, f"bench{i}", now) for i in range(1, users + 1)],
+        )
+        columns = ('user_id', 'amount', 'description', 'category', 'date', 'predicted_category',
+                   'ai_confidence', 'user_override', 'prediction_state', 'prediction_attempts',
+                   'created_at', 'updated_at')
+        sql = (f"INSERT INTO {Expense._meta.db_table} ({', '.join(columns)}) "
+               f"VALUES ({', '.join('?' * len(columns))})")
+        batch = []
+        for _ in range(rows):
+            category = rng.choice(CATEGORIES)
+            batch.append((
+                rng.randint(1, users), f"{rng.uniform(1, 500):.2f}", f"synthetic {category}", category,
+                (today - timedelta(days=rng.randint(0, 1500))).isoformat(), category,
+                round(rng.uniform(0.3, 1.0), 4), 0, 'done', 0, now, now,
+            ))
+            if len(batch) == 50_000:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+    if stdout:
+        stdout.write(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+
+def seed_history(user, rows, rng):
+    """Give `user` a year of realistic expenses through the ORM, rollups included"""
+    today = date.today()
+    expenses = []
+    for _ in range(rows):
+        category, typical, merchants = rng.choice(SPENDING)
+        expenses.append(Expense(
+            user=user, amount=Decimal(f"{typical * rng.lognormvariate(0, 0.5):.2f}"),
+            description=rng.choice(merchants), category=category, predicted_category=category,
+            ai_confidence=round(rng.uniform(0.5, 1.0), 4), date=today - timedelta(days=rng.randint(0, 365)),
+        ))
+    # bulk_create skips the rollup signals, so rebuild them afterwards
+    Expense.objects.bulk_create(expenses, batch_size=1000)
+    rebuild_for_user(user.pk)
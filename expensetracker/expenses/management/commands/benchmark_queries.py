@@ -0,0 +1,127 @@
+import json
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Sum
+
+from expenses.models import Expense
+
+from ._benchmark_db import seed_expenses, throwaway_database
+
+ALIAS = 'query_benchmark'
+
+
+def hot_queries(user_id, today):
+    """The access patterns the Expense indexes are meant to serve"""
+    qs = Expense.objects.using(ALIAS).filter(user_id=user_id)
+    return {
+        'list_first_page': lambda: list(qs.order_by('-date', '-created_at')[:100]),
+        'date_range_30d': lambda: qs.filter(date__gte=today - timedelta(days=30)).aggregate(total=Sum('amount')),
+        'date_range_180d': lambda: qs.filter(date__gte=today - timedelta(days=180)).aggregate(total=Sum('amount')),
+        'top_categories': lambda: list(qs.values('category').annotate(total=Sum('amount')).order_by('-total')[:5]),
+        'category_count': lambda: qs.filter(category='Transport').aggregate(n=Count('id')),
+    }
+
+
+def explain_sql(user_id, today):
+    # aggregates drop the default ordering, so explain them without it too
+    qs = Expense.objects.using(ALIAS).filter(user_id=user_id).order_by()
+    return {
+        'list_first_page': qs.order_by('-date', '-created_at')[:100],
+        'date_range_30d': qs.filter(date__gte=today - timedelta(days=30)).values('amount'),
+        'date_range_180d': qs.filter(date__gte=today - timedelta(days=180)).values('amount'),
+        'top_categories': qs.values('category').annotate(total=Sum('amount')).order_by('-total')[:5],
+        'category_count': qs.filter(category='Transport').values('id'),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway SQLite database with synthetic expenses and report "
+        "EXPLAIN plans and timings of the hot queries without and with the "
+        "Expense composite indexes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help="expenses to seed")
+        parser.add_argument('--users', type=int, default=1000, help="users to spread them over")
+        parser.add_argument('--repeat', type=int, default=20, help="timed runs per query (random users)")
+        parser.add_argument('--db', default=None, help="SQLite file to use (default: a temp file)")
+        parser.add_argument('--keep', action='store_true', help="keep the database file afterwards")
+        parser.add_argument('--json', dest='json_path', default=None, help="also write results as JSON")
+        parser.add_argument('--fail-above', type=float, default=None,
+                            help="exit with an error if any indexed query median exceeds this many ms")
+
+    def handle(self, *args, **options):
+        with throwaway_database(ALIAS, options['db'], options['keep']) as connection:
+            results = self._run(connection, options)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, indent=2)
+        if options['fail_above'] is not None:
+            slow = {k: v for k, v in results['with_indexes']['timings_ms'].items()
+                    if v['median'] > options['fail_above']}
+            if slow:
+                raise CommandError(f"queries above {options['fail_above']}ms: {', '.join(sorted(slow))}")
+
+    def _run(self, connection, options):
+        indexes = list(Expense._meta.indexes)
+        # index creation is deferred until the editor exits, so the tables
+        # come back indexed; drop them for the "before" measurements
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.remove_index(Expense, index)
+
+        seed_expenses(connection, options['rows'], options['users'], self.stdout)
+        today = date.today()
+        results = {'rows': options['rows'], 'users': options['users']}
+
+        results['without_indexes'] = self._measure(connection, options, today)
+        start = time.perf_counter()
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.add_index(Expense, index)
+        results['index_build_seconds'] = round(time.perf_counter() - start, 2)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        results['with_indexes'] = self._measure(connection, options, today)
+
+        self._report(results)
+        return results
+
+    def _measure(self, connection, options, today):
+        rng = random.Random(7)
+        users = [rng.randint(1, options['users']) for _ in range(options['repeat'])]
+        timings = {}
+        for user_id in users:
+            for name, run in hot_queries(user_id, today).items():
+                start = time.perf_counter()
+                run()
+                timings.setdefault(name, []).append(1000 * (time.perf_counter() - start))
+        plans = {name: qs.explain() for name, qs in explain_sql(users[0], today).items()}
+        return {
+            'timings_ms': {
+                name: {'median': round(statistics.median(t), 3), 'max': round(max(t), 3)}
+                for name, t in timings.items()
+            },
+            'plans': plans,
+        }
+
+    def _report(self, results):
+        before = results['without_indexes']
+        after = results['with_indexes']
+        self.stdout.write(f"\nIndexes built in {results['index_build_seconds']}s\n")
+        self.stdout.write(f"{'query':<18} {'no index ms':>12} {'indexed ms':>11} {'speedup':>8}")
+        for name, t in before['timings_ms'].items():
+            b, a = t['median'], after['timings_ms'][name]['median']
+            self.stdout.write(f"{name:<18} {b:>12.2f} {a:>11.2f} {b / a if a else float('inf'):>7.1f}x")
+        for label, section in (('without indexes', before), ('with indexes', after)):
+            self.stdout.write(f"\nEXPLAIN {label}:")
+            for name, plan in section['plans'].items():
+                self.stdout.write(f"  {name}:")
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
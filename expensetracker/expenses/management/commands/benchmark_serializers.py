@@ -0,0 +1,88 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from expenses.fast_serializers import ValuesRowSerializer
+from expenses.models import Expense
+from expenses.renderers import FastJSONRenderer, orjson
+from expenses.serializers import ExpenseSerializer
+
+from ._benchmark_db import seed_expenses, throwaway_database
+
+ALIAS = 'serializer_benchmark'
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare ExpenseSerializer against the .values() fast path (and the "
+        "orjson renderer, if installed) on a large expense list, and check "
+        "that the rendered bytes are identical"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000, help="expenses in the list")
+        parser.add_argument('--repeat', type=int, default=5, help="timed runs per variant")
+        parser.add_argument('--json', dest='json_path', default=None, help="also write results as JSON")
+
+    def handle(self, *args, **options):
+        with throwaway_database(ALIAS) as connection:
+            seed_expenses(connection, options['rows'], 1, self.stdout)
+            results = self._run(options)
+
+        self.stdout.write(f"\n{'variant':<28} {'serialize ms':>13} {'render ms':>10} {'total ms':>9} {'speedup':>8}")
+        baseline = results['variants']['drf']['total_ms']
+        for name, r in results['variants'].items():
+            self.stdout.write(f"{name:<28} {r['serialize_ms']:>13.1f} {r['render_ms']:>10.1f} "
+                              f"{r['total_ms']:>9.1f} {baseline / r['total_ms']:>7.1f}x")
+        if results.get('orjson_missing'):
+            self.stdout.write("(orjson is not installed; `pip install orjson` to include the fast renderer)")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, indent=2)
+        if not results['identical']:
+            raise CommandError("fast path output differs from ExpenseSerializer")
+        self.stdout.write(self.style.SUCCESS("All variants produce byte-identical JSON"))
+
+    def _run(self, options):
+        queryset = Expense.objects.using(ALIAS).order_by('-date', '-created_at', '-id')
+        serializer = ExpenseSerializer()
+
+        def drf():
+            return ExpenseSerializer(list(queryset), many=True).data
+
+        def fast():
+            rows = ValuesRowSerializer(serializer)
+            return rows.serialize(queryset.values(*rows.value_fields))
+
+        variants = {
+            'drf': (drf, JSONRenderer()),
+            'values': (fast, JSONRenderer()),
+        }
+        if orjson is not None:
+            variants['values+orjson'] = (fast, FastJSONRenderer())
+
+        results = {'rows': options['rows'], 'variants': {}, 'orjson_missing': orjson is None}
+        outputs = {}
+        for name, (build, renderer) in variants.items():
+            serialize_times, render_times = [], []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                data = build()
+                middle = time.perf_counter()
+                outputs[name] = renderer.render(data)
+                end = time.perf_counter()
+                serialize_times.append(1000 * (middle - start))
+                render_times.append(1000 * (end - middle))
+            serialize_ms, render_ms = statistics.median(serialize_times), statistics.median(render_times)
+            results['variants'][name] = {
+                'serialize_ms': round(serialize_ms, 2),
+                'render_ms': round(render_ms, 2),
+                'total_ms': round(serialize_ms + render_ms, 2),
+                'bytes': len(outputs[name]),
+            }
+        results['identical'] = len(set(outputs.values())) == 1
+        return results
@@ -0,0 +1,338 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import date
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from expenses import ai_utils
+from expenses.ai.anomaly import detect_anomalies_for_user
+from expenses.conf import expenses_setting
+from expenses.fast_serializers import ValuesRowSerializer
+from expenses.models import Expense
+from expenses.renderers import FastJSONRenderer
+from expenses.serializers import ExpenseSerializer
+
+from ._benchmark_db import SPENDING, migrated_database, seed_history
+
+User = get_user_model()
+PASSWORD = 'bench-password-123'
+SECTIONS = ('api', 'predict', 'anomaly', 'serializers')
+
+
+def _summarize(latencies, errors=0):
+    """Latency percentiles in milliseconds"""
+    ms = sorted(1000 * x for x in latencies)
+    result = {'count': len(ms), 'errors': errors}
+    if ms:
+        cuts = statistics.quantiles(ms, n=100, method='inclusive') if len(ms) > 1 else [ms[0]] * 99
+        result.update(mean_ms=round(statistics.fmean(ms), 2), p50_ms=round(cuts[49], 2),
+                      p95_ms=round(cuts[94], 2), p99_ms=round(cuts[98], 2), max_ms=round(ms[-1], 2))
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, timeout=5, cwd=settings.BASE_DIR).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _flatten(results, prefix=''):
+    """{'api': {'list': {'p50_ms': 1.0}}} -> {'api.list.p50_ms': 1.0}; medians, p95s and totals only"""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif (key.endswith('_ms') and key not in ('mean_ms', 'p99_ms', 'max_ms')
+              and isinstance(value, (int, float))):
+            flat[prefix + key] = value
+    return flat
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark suite on a throwaway, migrated database: seeds synthetic users "
+        "and expenses, drives the register/token/create/list/insights/override "
+        "endpoints concurrently with in-process clients, and times "
+        "predict_category, detect_anomalies_for_user and the serializers in "
+        "isolation. Use --engine rules for model-free CI runs and --json to "
+        "compare runs across commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help="virtual API users")
+        parser.add_argument('--concurrency', type=int, default=4, help="client threads")
+        parser.add_argument('--history', type=int, default=500, help="seeded expenses per user")
+        parser.add_argument('--creates', type=int, default=5, help="expenses each user creates through the API")
+        parser.add_argument('--lists', type=int, default=5, help="list requests per user")
+        parser.add_argument('--predictions', type=int, default=200, help="descriptions for the predict benchmark")
+        parser.add_argument('--repeat', type=int, default=5, help="timed runs per isolated benchmark")
+        parser.add_argument('--engine', choices=['configured', 'rules'], default='configured',
+                            help="'rules' swaps the models for the keyword rules (no model downloads)")
+        parser.add_argument('--fast-hasher', action='store_true',
+                            help="MD5 password hashing, so register/token measure the API rather than PBKDF2")
+        parser.add_argument('--only', action='append', choices=SECTIONS,
+                            help="section to run (repeatable; default: all)")
+        parser.add_argument('--json', dest='json_path', default=None, help="write results as JSON")
+        parser.add_argument('--baseline', default=None, help="JSON from an earlier run to compare against")
+
+    def handle(self, *args, **options):
+        sections = options['only'] or list(SECTIONS)
+        self.rng = random.Random(42)
+        self.run_id = uuid.uuid4().hex[:8]  # keeps descriptions out of any persistent prediction cache
+        results = {
+            'meta': {
+                'commit': _git_commit(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'engine': options['engine'],
+                'options': {k: options[k] for k in ('users', 'concurrency', 'history', 'creates', 'lists',
+                                                    'predictions', 'repeat', 'fast_hasher')},
+            },
+        }
+
+        with ExitStack() as stack:
+            expenses = dict(getattr(settings, 'EXPENSES', None) or {})
+            expenses['ANOMALY_MODEL_DIR'] = stack.enter_context(tempfile.TemporaryDirectory())
+            expenses['PREDICTION_CACHE_ALIAS'] = ''  # in-process tier only
+            if options['engine'] == 'rules':
+                expenses['AI_ENGINE'] = 'rules'
+            overrides = {'EXPENSES': expenses}
+            if options['fast_hasher']:
+                overrides['PASSWORD_HASHERS'] = ['django.contrib.auth.hashers.MD5PasswordHasher']
+            stack.enter_context(override_settings(**overrides))
+            stack.enter_context(migrated_database())
+            self.stdout.write(f"Engine: {expenses_setting('AI_ENGINE')}")
+
+            if 'api' in sections:
+                results['api'] = self._api(options)
+            user = self._seed_user('bench-isolated', options['history'])
+            if 'predict' in sections:
+                results['predict'] = self._predict(options)
+            if 'anomaly' in sections:
+                results['anomaly'] = self._anomaly(user, options)
+            if 'serializers' in sections:
+                results['serializers'] = self._serializers(user, options)
+
+        self._report(results)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['json_path']}")
+        if options['baseline']:
+            self._compare(results, options['baseline'])
+
+        errors = sum(r['errors'] for r in results.get('api', {}).get('endpoints', {}).values())
+        if errors:
+            raise CommandError(f"{errors} API requests failed")
+
+    # seeding
+
+    def _seed_user(self, username, history):
+        user = User.objects.create_user(username=username, password=PASSWORD)
+        seed_history(user, history, self.rng)
+        return user
+
+    # API
+
+    def _api(self, options):
+        self.stdout.write(f"API: {options['users']} users, {options['concurrency']} threads ...")
+        latencies, errors, lock = {}, {}, threading.Lock()
+
+        def call(client, name, method, path, data=None, expect=(200, 201)):
+            start = time.perf_counter()
+            response = getattr(client, method)(path, data, format='json')
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.setdefault(name, []).append(elapsed)
+                if response.status_code not in expect:
+                    errors[name] = errors.get(name, 0) + 1
+            return response
+
+        def pool(fn, items):
+            def run(item):
+                try:
+                    return fn(item)
+                finally:
+                    connections.close_all()  # this thread's connections
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                return list(executor.map(run, items))
+
+        def sign_up(i):
+            client = APIClient()
+            username = f"bench-{self.run_id}-{i}"
+            call(client, 'register', 'post', reverse('register'), {'username': username, 'password': PASSWORD})
+            r = call(client, 'token', 'post', reverse('token_obtain_pair'),
+                     {'username': username, 'password': PASSWORD})
+            return username, r.data.get('access')
+
+        def session(item):
+            (username, token), seed = item
+            rng = random.Random(seed)
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            created = []
+            for n in range(options['creates']):
+                category, typical, merchants = rng.choice(SPENDING)
+                r = call(client, 'create', 'post', reverse('expenses-list'), {
+                    'amount': f"{typical * rng.lognormvariate(0, 0.5):.2f}",
+                    'description': f"{rng.choice(merchants)} #{self.run_id}-{seed}-{n}",
+                    'date': date.today().isoformat(),
+                })
+                if r.status_code == 201:
+                    created.append(r.data['id'])
+            for _ in range(options['lists']):
+                r = call(client, 'list', 'get', reverse('expenses-list'))
+                if r.status_code == 200 and r.data.get('next'):
+                    call(client, 'list_next_page', 'get', r.data['next'])
+            call(client, 'insights', 'get', reverse('insights'))
+            call(client, 'insights_cached', 'get', reverse('insights'))
+            if created:
+                call(client, 'override', 'post', reverse('expenses-override', args=[created[0]]),
+                     {'category': 'Shopping'})
+
+        start = time.perf_counter()
+        accounts = pool(sign_up, range(options['users']))
+        signup_seconds = time.perf_counter() - start
+
+        self.stdout.write(f"Seeding {options['history']} expenses per user ...")
+        for user in User.objects.filter(username__in=[u for u, _ in accounts]):
+            seed_history(user, options['history'], self.rng)
+
+        start = time.perf_counter()
+        pool(session, [(account, seed) for seed, account in enumerate(accounts)])
+        session_seconds = time.perf_counter() - start
+
+        endpoints = {name: _summarize(values, errors.get(name, 0)) for name, values in latencies.items()}
+        requests = sum(r['count'] for r in endpoints.values())
+        return {
+            'endpoints': endpoints,
+            'signup_seconds': round(signup_seconds, 3),
+            'session_seconds': round(session_seconds, 3),
+            'requests_per_second': round(requests / (signup_seconds + session_seconds), 1),
+        }
+
+    # isolated benchmarks
+
+    def _predict(self, options):
+        texts = []
+        for n in range(options['predictions']):
+            _, _, merchants = self.rng.choice(SPENDING)
+            texts.append(f"{self.rng.choice(merchants)} {self.run_id}-{n}")
+        self.stdout.write(f"predict_category: {len(texts)} descriptions ...")
+        ai_utils.predict_categories(texts[:1])  # load the models outside the timings
+
+        single = []
+        for text in texts:
+            start = time.perf_counter()
+            ai_utils.predict_category(text)
+            single.append(time.perf_counter() - start)
+
+        fresh = [f"{text} batch" for text in texts]
+        start = time.perf_counter()
+        ai_utils.predict_categories(fresh)
+        batch_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        ai_utils.predict_categories(fresh)  # every description is cached now
+        cached_seconds = time.perf_counter() - start
+        return {
+            'single': _summarize(single),
+            'batch_ms': round(1000 * batch_seconds, 2),
+            'batch_per_second': round(len(fresh) / batch_seconds, 1),
+            'cached_batch_ms': round(1000 * cached_seconds, 2),
+        }
+
+    def _anomaly(self, user, options):
+        self.stdout.write(f"detect_anomalies_for_user: {options['history']} expenses ...")
+        results = {}
+        start = time.perf_counter()
+        detect_anomalies_for_user(user)  # first call fits and persists the model
+        results['isolation_forest_fit_ms'] = round(1000 * (time.perf_counter() - start), 2)
+        for mode in ('isolation_forest', 'robust_z'):
+            with override_settings(EXPENSES={**settings.EXPENSES, 'ANOMALY_MODE': mode}):
+                timings = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    detect_anomalies_for_user(user)
+                    timings.append(time.perf_counter() - start)
+            results[mode] = _summarize(timings)
+        return results
+
+    def _serializers(self, user, options):
+        self.stdout.write("Serializers ...")
+        queryset = Expense.objects.filter(user=user).order_by('-date', '-created_at', '-id')
+        renderer = FastJSONRenderer()
+
+        def drf():
+            return renderer.render(ExpenseSerializer(list(queryset), many=True).data)
+
+        def fast():
+            rows = ValuesRowSerializer(ExpenseSerializer())
+            return renderer.render(rows.serialize(queryset.values(*rows.value_fields)))
+
+        results = {}
+        for name, build in (('drf', drf), ('values', fast)):
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                build()
+                timings.append(time.perf_counter() - start)
+            results[name] = _summarize(timings)
+        results['rows'] = queryset.count()
+        return results
+
+    # output
+
+    def _report(self, results):
+        api = results.get('api')
+        if api:
+            self.stdout.write(f"\n{'endpoint':<18} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+            for name, r in api['endpoints'].items():
+                self.stdout.write(f"{name:<18} {r['count']:>6} {r['errors']:>6} {r['p50_ms']:>8.1f} "
+                                  f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+            self.stdout.write(f"{api['requests_per_second']} requests/s overall")
+        predict = results.get('predict')
+        if predict:
+            self.stdout.write(f"\npredict_category   p50 {predict['single']['p50_ms']:.2f} ms, "
+                              f"batch {predict['batch_per_second']:.0f}/s, "
+                              f"cached batch {predict['cached_batch_ms']:.1f} ms")
+        anomaly = results.get('anomaly')
+        if anomaly:
+            self.stdout.write(f"anomalies          fit {anomaly['isolation_forest_fit_ms']:.1f} ms, "
+                              f"cached model p50 {anomaly['isolation_forest']['p50_ms']:.1f} ms, "
+                              f"robust_z p50 {anomaly['robust_z']['p50_ms']:.1f} ms")
+        serializers = results.get('serializers')
+        if serializers:
+            self.stdout.write(f"serializers        {serializers['rows']} rows: "
+                              f"drf p50 {serializers['drf']['p50_ms']:.1f} ms, "
+                              f"values p50 {serializers['values']['p50_ms']:.1f} ms")
+
+    def _compare(self, results, baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        before, after = _flatten(baseline), _flatten(results)
+        self.stdout.write(f"\nCompared with {baseline_path} (commit {baseline.get('meta', {}).get('commit')}):")
+        for key in sorted(before.keys() & after.keys()):
+            if key.startswith('meta.') or not before[key]:
+                continue
+            change = 100 * (after[key] - before[key]) / before[key]
+            line = f"  {key:<44} {before[key]:>9.2f} -> {after[key]:>9.2f} ms  {change:+6.1f}%"
+            self.stdout.write(self.style.ERROR(line) if change > 10 else line)
@@ -0,0 +1,69 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from expenses.categorization_queue import requeue_stale, run_once
+
+# seconds between sweeps for rows abandoned by a crashed worker
+REQUEUE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = "Categorize expenses saved as pending (EXPENSES['ASYNC_CATEGORIZATION'] mode)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=2,
+                            help="worker threads; their model calls are micro-batched together")
+        parser.add_argument('--batch-size', type=int, default=None, help="rows claimed per iteration")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="seconds to sleep when the queue is empty")
+        parser.add_argument('--once', action='store_true',
+                            help="drain the queue and exit instead of polling forever")
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        totals = {'done': 0}
+        lock = threading.Lock()
+
+        requeued = requeue_stale()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} abandoned rows")
+
+        def work():
+            try:
+                while not stop.is_set():
+                    try:
+                        done = run_once(options['batch_size'])
+                    except Exception as e:
+                        self.stderr.write(f"Worker error: {e}")
+                        done = 0
+                    finally:
+                        close_old_connections()
+                    with lock:
+                        totals['done'] += done
+                    if not done:
+                        if options['once']:
+                            return
+                        stop.wait(options['poll_interval'])
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=work, daemon=True) for _ in range(max(1, options['threads']))]
+        for t in threads:
+            t.start()
+        next_requeue = time.monotonic() + REQUEUE_INTERVAL
+        try:
+            while any(t.is_alive() for t in threads):
+                for t in threads:
+                    t.join(0.5)
+                # periodically rescue rows from crashed workers
+                if time.monotonic() >= next_requeue:
+                    requeue_stale()
+                    next_requeue += REQUEUE_INTERVAL
+        except KeyboardInterrupt:
+            stop.set()
+            for t in threads:
+                t.join()
+        self.stdout.write(self.style.SUCCESS(f"Categorized {totals['done']} expenses"))
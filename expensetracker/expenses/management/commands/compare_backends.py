@@ -0,0 +1,100 @@
+import csv
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.ai.backends import BACKENDS, load_zero_shot_pipeline
+from expenses.ai_utils import DEFAULT_CATEGORIES, MODEL_NAME
+from expenses.conf import expenses_setting
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare accuracy and latency of the zero-shot inference backends on a "
+        "labeled CSV sample with 'description' and 'category' columns"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('sample', help="labeled CSV file")
+        parser.add_argument('--backends', default=','.join(BACKENDS),
+                            help=f"comma-separated subset of {', '.join(BACKENDS)}")
+        parser.add_argument('--batch-size', type=int, default=16)
+        parser.add_argument('--limit', type=int, default=None, help="only use the first N rows")
+        parser.add_argument('--json', dest='json_path', default=None, help="also write the report as JSON")
+
+    def handle(self, *args, **options):
+        with open(options['sample'], newline='', encoding='utf-8') as f:
+            rows = [(r['description'], r['category']) for r in csv.DictReader(f) if r.get('description')]
+        if options['limit']:
+            rows = rows[:options['limit']]
+        if not rows:
+            raise CommandError("the sample has no rows")
+        texts = [t for t, _ in rows]
+        truth = [c for _, c in rows]
+        categories = list(dict.fromkeys(DEFAULT_CATEGORIES + sorted(set(truth))))
+        batch_size = options['batch_size']
+
+        report = []
+        baseline = None
+        for backend in [b.strip() for b in options['backends'].split(',') if b.strip()]:
+            try:
+                start = time.perf_counter()
+                classifier = load_zero_shot_pipeline(
+                    backend, MODEL_NAME,
+                    num_threads=expenses_setting('AI_BACKEND_THREADS').get(backend),
+                    onnx_dir=expenses_setting('ONNX_MODEL_DIR'),
+                )
+                load_seconds = time.perf_counter() - start
+            except Exception as e:
+                self.stderr.write(f"{backend}: could not load ({e})")
+                continue
+
+            predicted = []
+            batch_times = []
+            per_item = []  # each item's share of its batch's time, one sample per item
+            for i in range(0, len(texts), batch_size):
+                batch = texts[i:i + batch_size]
+                start = time.perf_counter()
+                results = classifier(batch, candidate_labels=categories, batch_size=len(batch))
+                elapsed = time.perf_counter() - start
+                batch_times.append(elapsed)
+                # the last batch may be short
+                per_item.extend([elapsed / len(batch)] * len(batch))
+                if isinstance(results, dict):
+                    results = [results]
+                predicted.extend(r['labels'][0] for r in results)
+
+            per_item.sort()
+            batch_sorted = sorted(batch_times)
+            accuracy = sum(p == t for p, t in zip(predicted, truth)) / len(truth)
+            if baseline is None:
+                baseline = predicted
+            entry = {
+                'backend': backend,
+                'load_seconds': round(load_seconds, 3),
+                'accuracy': round(accuracy, 4),
+                'agreement_with_first': round(sum(p == b for p, b in zip(predicted, baseline)) / len(baseline), 4),
+                'mean_ms_per_item': round(1000 * sum(batch_times) / len(texts), 2),
+                'p95_ms_per_item': round(1000 * per_item[int(0.95 * (len(per_item) - 1))], 2),
+                'p95_ms_per_batch': round(1000 * batch_sorted[int(0.95 * (len(batch_sorted) - 1))], 2),
+                'throughput_per_s': round(len(texts) / sum(batch_times), 1),
+            }
+            report.append(entry)
+            del classifier
+
+        if not report:
+            raise CommandError("no backend could be loaded")
+
+        header = (f"{'backend':<10} {'load s':>8} {'accuracy':>9} {'agree':>7} {'ms/item':>8} "
+                  f"{'p95/item':>9} {'p95/batch':>10} {'items/s':>8}")
+        self.stdout.write(header)
+        for e in report:
+            self.stdout.write(
+                f"{e['backend']:<10} {e['load_seconds']:>8.2f} {e['accuracy']:>9.3f} {e['agreement_with_first']:>7.3f} "
+                f"{e['mean_ms_per_item']:>8.1f} {e['p95_ms_per_item']:>9.1f} {e['p95_ms_per_batch']:>10.1f} "
+                f"{e['throughput_per_s']:>8.1f}"
+            )
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'sample': options['sample'], 'rows': len(rows), 'results': report}, f, indent=2)
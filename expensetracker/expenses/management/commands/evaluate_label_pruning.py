@@ -0,0 +1,78 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.ai.label_profiles import CategoryProfile, shortlist_recall
+from expenses.ai_utils import DEFAULT_CATEGORIES
+from expenses.conf import expenses_setting
+from expenses.models import Expense
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay each user's most recent expenses through a category profile "
+        "built from their older ones, and report how often the true category "
+        "survives candidate label pruning and how many labels the zero-shot "
+        "model would score, for several values of k. No model is loaded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, action='append', help="shortlist size (repeatable; default 2-5)")
+        parser.add_argument('--min-mass', type=float, default=None,
+                            help="default: EXPENSES['LABEL_PRUNING_MIN_MASS']")
+        parser.add_argument('--holdout', type=float, default=0.2, help="newest share of each user's expenses replayed")
+        parser.add_argument('--json', dest='json_path', default=None, help="also write the report as JSON")
+
+    def handle(self, *args, **options):
+        min_mass = options['min_mass'] if options['min_mass'] is not None else expenses_setting('LABEL_PRUNING_MIN_MASS')
+        min_history = expenses_setting('LABEL_PRUNING_MIN_HISTORY')
+        top_ks = options['top_k'] or [2, 3, 4, 5]
+
+        rows_by_user = {}
+        history = (
+            Expense.objects.filter(category__in=DEFAULT_CATEGORIES)
+            .order_by('user_id', 'date', 'created_at')
+            .values_list('user_id', 'description', 'category', 'user_override')
+        )
+        for user_id, description, category, override in history.iterator():
+            rows_by_user.setdefault(user_id, []).append((description, category, override))
+
+        totals = {k: {'rows': 0, 'hits': 0, 'pruned': 0, 'labels': 0} for k in top_ks}
+        users = 0
+        for rows in rows_by_user.values():
+            split = int(len(rows) * (1 - options['holdout']))
+            if split < min_history or split == len(rows):
+                continue
+            users += 1
+            profile = CategoryProfile.from_rows(DEFAULT_CATEGORIES, rows[:split])
+            replay = [(description, category) for description, category, _ in rows[split:]]
+            for k in top_ks:
+                hits, pruned, labels = shortlist_recall(profile, replay, k, min_mass)
+                totals[k]['rows'] += len(replay)
+                totals[k]['hits'] += hits
+                totals[k]['pruned'] += pruned
+                totals[k]['labels'] += labels
+        if not users:
+            raise CommandError(f"no user has {min_history} categorized expenses before the holdout")
+
+        n = len(DEFAULT_CATEGORIES)
+        report = []
+        self.stdout.write(f"{users} users, min mass {min_mass}\n")
+        self.stdout.write(f"{'k':>3} {'recall':>8} {'pruned':>8} {'labels/text':>12} {'cost vs full':>13}")
+        for k in top_ks:
+            t = totals[k]
+            entry = {
+                'k': k,
+                'rows': t['rows'],
+                'recall': round(t['hits'] / t['rows'], 4),
+                'pruned_share': round(t['pruned'] / t['rows'], 4),
+                'mean_labels': round(t['labels'] / t['rows'], 2),
+                'cost_vs_full': round(t['labels'] / (t['rows'] * n), 3),
+            }
+            report.append(entry)
+            self.stdout.write(f"{k:>3} {entry['recall']:>8.1%} {entry['pruned_share']:>8.1%} "
+                              f"{entry['mean_labels']:>12.2f} {entry['cost_vs_full']:>13.2f}")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'users': users, 'min_mass': min_mass, 'results': report}, f, indent=2)
@@ -0,0 +1,43 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.ai_utils import MODEL_NAME
+from expenses.conf import expenses_setting
+
+
+class Command(BaseCommand):
+    help = "Export the zero-shot model to ONNX for EXPENSES['AI_BACKEND'] = 'onnx'"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None, help="export directory (default: EXPENSES['ONNX_MODEL_DIR'])")
+        parser.add_argument('--quantize', action='store_true',
+                            help="also write a dynamically int8-quantized model_quantized.onnx (used when present)")
+
+    def handle(self, *args, **options):
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        except ImportError:
+            raise CommandError("ONNX export needs `pip install optimum[onnxruntime]`")
+        from transformers import AutoTokenizer
+
+        output = options['output'] or expenses_setting('ONNX_MODEL_DIR')
+        os.makedirs(output, exist_ok=True)
+
+        start = time.perf_counter()
+        self.stdout.write(f"Exporting {MODEL_NAME} to {output} ...")
+        model = ORTModelForSequenceClassification.from_pretrained(MODEL_NAME, export=True)
+        model.save_pretrained(output)
+        AutoTokenizer.from_pretrained(MODEL_NAME).save_pretrained(output)
+        self.stdout.write(f"Exported in {time.perf_counter() - start:.1f}s")
+
+        if options['quantize']:
+            start = time.perf_counter()
+            quantizer = ORTQuantizer.from_pretrained(output, file_name='model.onnx')
+            config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=output, quantization_config=config)
+            self.stdout.write(f"Quantized in {time.perf_counter() - start:.1f}s")
+
+        self.stdout.write(self.style.SUCCESS(f"ONNX model written to {output}"))
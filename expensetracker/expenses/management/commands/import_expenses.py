@@ -0,0 +1,48 @@
+import os
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.importing import import_expenses, read_csv_rows, read_jsonl_rows
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Import expenses for one user from a CSV or JSON Lines file (use '-' for stdin)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV/JSONL file, or '-' to read stdin")
+        parser.add_argument('--user', required=True, help="username that will own the expenses")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="input format (default: guessed from the file extension)")
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help="rows per categorization batch and bulk insert")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist")
+
+        path = options['path']
+        fmt = options['format']
+        if fmt is None:
+            ext = os.path.splitext(path)[1].lower()
+            fmt = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}.get(ext)
+            if fmt is None:
+                raise CommandError("Cannot guess the format, pass --format csv|jsonl")
+        reader = read_csv_rows if fmt == 'csv' else read_jsonl_rows
+
+        if path == '-':
+            result = import_expenses(user, reader(sys.stdin), chunk_size=options['chunk_size'])
+        else:
+            with open(path, newline='', encoding='utf-8') as f:
+                result = import_expenses(user, reader(f), chunk_size=options['chunk_size'])
+
+        for err in result['errors']:
+            self.stderr.write(f"row {err['row']}: {err['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['created']} of {result['total']} rows ({len(result['errors'])} errors)"
+        ))
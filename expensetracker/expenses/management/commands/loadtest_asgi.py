@@ -0,0 +1,216 @@
+import asyncio
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from expenses.ai.anomaly import detect_anomalies_for_user
+from expenses.ai.model_host import ModelHostServer
+from expenses.models import Expense
+
+from ._benchmark_db import SPENDING, migrated_database, seed_history
+
+User = get_user_model()
+# (name, method, WSGI path, ASGI path); {id} is one of the client's expenses
+ENDPOINTS = [
+    ('list', 'GET', '/api/expenses/', '/api/async/expenses/'),
+    ('create', 'POST', '/api/expenses/', '/api/async/expenses/'),
+    ('insights', 'GET', '/api/insights/', '/api/async/insights/'),
+    ('retrieve', 'GET', '/api/expenses/{id}/', '/api/async/expenses/{id}/'),
+]
+
+
+def _percentiles(seconds):
+    ms = sorted(1000 * s for s in seconds)
+    if not ms:
+        return {}
+    cuts = statistics.quantiles(ms, n=100, method='inclusive') if len(ms) > 1 else [ms[0]] * 99
+    return {'p50_ms': round(cuts[49], 2), 'p95_ms': round(cuts[94], 2), 'p99_ms': round(cuts[98], 2)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the sync (WSGI, thread pool) and native async (ASGI) request "
+        "paths with the same concurrent list/create/insights/retrieve mix, "
+        "calling the WSGI and ASGI applications in-process the way gunicorn "
+        "and uvicorn do, on a throwaway migrated database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=32, help="concurrent clients")
+        parser.add_argument('--requests', type=int, default=20, help="requests per client")
+        parser.add_argument('--wsgi-threads', type=int, default=8,
+                            help="WSGI worker threads (a gthread worker's --threads)")
+        parser.add_argument('--history', type=int, default=300, help="seeded expenses per client")
+        parser.add_argument('--simulate-model-ms', type=float, default=None,
+                            help="serve predictions from a local model host that takes this long per "
+                                 "batch, instead of the configured engine")
+        parser.add_argument('--mode', action='append', choices=['wsgi', 'asgi'],
+                            help="path to test (repeatable; default: both)")
+        parser.add_argument('--json', dest='json_path', default=None, help="also write results as JSON")
+
+    def handle(self, *args, **options):
+        with ExitStack() as stack:
+            expenses = dict(getattr(settings, 'EXPENSES', None) or {})
+            expenses['ANOMALY_MODEL_DIR'] = stack.enter_context(tempfile.TemporaryDirectory())
+            expenses['PREDICTION_CACHE'] = False  # every create pays for a model call, on both paths
+            if options['simulate_model_ms'] is not None:
+                expenses['MODEL_HOST_SOCKET'] = self._start_model_host(stack, options['simulate_model_ms'] / 1000)
+                expenses['FAST_PATH'] = False  # every create goes to the (simulated) model
+            stack.enter_context(override_settings(EXPENSES=expenses))
+            stack.enter_context(migrated_database())
+
+            clients = self._seed(options)
+            results = {}
+            for mode in options['mode'] or ['wsgi', 'asgi']:
+                self.stdout.write(f"{mode}: {options['clients']} clients x {options['requests']} requests ...")
+                results[mode] = asyncio.run(self._run(mode, clients, options))
+
+        self.stdout.write(f"\n{'path':<6} {'req/s':>8} {'errors':>7}  "
+                          + '  '.join(f"{name + ' p50/p95 ms':>24}" for name, *_ in ENDPOINTS))
+        for mode, r in results.items():
+            cells = [f"{r['endpoints'][name]['p50_ms']:>11.1f} /{r['endpoints'][name]['p95_ms']:>10.1f}"
+                     for name, *_ in ENDPOINTS]
+            self.stdout.write(f"{mode:<6} {r['requests_per_second']:>8.1f} {r['errors']:>7}  " + '  '.join(cells))
+        if 'wsgi' in results and 'asgi' in results:
+            gain = results['asgi']['requests_per_second'] / results['wsgi']['requests_per_second']
+            results['asgi_speedup'] = round(gain, 2)
+            self.stdout.write(f"ASGI throughput: {gain:.2f}x the WSGI path")
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def _start_model_host(self, stack, latency):
+        def infer(texts, labels):
+            time.sleep(latency)
+            return [{'labels': list(labels), 'scores': [0.9] + [0.1 / len(labels)] * (len(labels) - 1),
+                     'sequence': text} for text in texts]
+
+        path = os.path.join(stack.enter_context(tempfile.TemporaryDirectory()), 'model.sock')
+        server = ModelHostServer(path, infer, model_name='simulated')
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        stack.callback(server.server_close)
+        stack.callback(server.shutdown)
+        return path
+
+    def _seed(self, options):
+        self.stdout.write(f"Seeding {options['clients']} users with {options['history']} expenses each ...")
+        rng = random.Random(42)
+        clients = []
+        for i in range(options['clients']):
+            user = User.objects.create_user(username=f"loadtest{i}")
+            seed_history(user, options['history'], rng)
+            detect_anomalies_for_user(user)  # fit now, so neither path pays for it
+            ids = list(Expense.objects.filter(user=user).values_list('id', flat=True)[:50])
+            clients.append({'token': str(AccessToken.for_user(user)), 'ids': ids, 'rng': random.Random(i)})
+        return clients
+
+    def _request(self, client, n, asgi):
+        name, method, wsgi_path, asgi_path = ENDPOINTS[n % len(ENDPOINTS)]
+        path = (asgi_path if asgi else wsgi_path).format(id=client['rng'].choice(client['ids']))
+        body = b''
+        if method == 'POST':
+            _, typical, merchants = client['rng'].choice(SPENDING)
+            body = json.dumps({
+                'amount': f"{typical * client['rng'].lognormvariate(0, 0.5):.2f}",
+                'description': client['rng'].choice(merchants),
+                'date': '2025-09-01',
+            }).encode()
+        return name, method, path, body
+
+    async def _run(self, mode, clients, options):
+        latencies = {name: [] for name, *_ in ENDPOINTS}
+        errors = 0
+        if mode == 'wsgi':
+            app, pool = get_wsgi_application(), ThreadPoolExecutor(max_workers=options['wsgi_threads'])
+        else:
+            app, pool = get_asgi_application(), None
+
+        async def client_loop(client):
+            nonlocal errors
+            for n in range(options['requests']):
+                name, method, path, body = self._request(client, n, asgi=mode == 'asgi')
+                start = time.perf_counter()
+                if mode == 'wsgi':
+                    status_code = await asyncio.get_running_loop().run_in_executor(
+                        pool, self._call_wsgi, app, method, path, body, client['token'])
+                else:
+                    status_code = await self._call_asgi(app, method, path, body, client['token'])
+                latencies[name].append(time.perf_counter() - start)
+                if status_code >= 400:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(c) for c in clients))
+        elapsed = time.perf_counter() - start
+        if pool is not None:
+            pool.shutdown()
+        total = sum(len(v) for v in latencies.values())
+        return {
+            'requests': total,
+            'errors': errors,
+            'seconds': round(elapsed, 3),
+            'requests_per_second': round(total / elapsed, 1),
+            'endpoints': {name: _percentiles(values) for name, values in latencies.items()},
+        }
+
+    @staticmethod
+    def _call_wsgi(app, method, path, body, token):
+        environ = {
+            'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+            'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1', 'HTTP_HOST': 'testserver', 'HTTP_AUTHORIZATION': f'Bearer {token}',
+            'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr, 'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http', 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        status = []
+        response = app(environ, lambda s, headers, exc_info=None: status.append(s))
+        try:
+            for _ in response:
+                pass
+        finally:
+            response.close()
+        return int(status[0].split()[0])
+
+    @staticmethod
+    async def _call_asgi(app, method, path, body, token):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'authorization', f'Bearer {token}'.encode()),
+                        (b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+        sent_body = False
+        status = []
+
+        async def receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await asyncio.Future()  # the client stays connected; Django cancels this once it has responded
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await app(scope, receive, send)
+        return status[0]
@@ -0,0 +1,112 @@
+import json
+import random
+import statistics
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.models import Sum
+
+from expensetracker.database import sqlite_options
+from expenses.models import Expense
+
+from ._benchmark_db import seed_expenses, throwaway_database
+
+ALIAS = 'write_loadtest'
+PROFILES = {
+    # Django's stock SQLite setup: rollback journal, full fsync, deferred transactions
+    'baseline': {},
+    # what expensetracker/database.py configures by default
+    'tuned': sqlite_options(),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrent write load test: N threads each run read-then-insert "
+        "transactions (the shape of POST /api/expenses/) against throwaway "
+        "SQLite databases with the stock and the tuned connection settings"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=200, help="transactions per thread")
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--profile', action='append', choices=sorted(PROFILES),
+                            help="profile to run (repeatable; default: all)")
+        parser.add_argument('--json', dest='json_path', default=None, help="also write results as JSON")
+
+    def handle(self, *args, **options):
+        results = {}
+        for name in options['profile'] or list(PROFILES):
+            with throwaway_database(ALIAS, options=PROFILES[name]) as connection:
+                seed_expenses(connection, 1000, options['users'])
+                connection.close()  # re-open with the profile's init commands
+                results[name] = self._run(options)
+            r = results[name]
+            latency = (f"p50 {r['p50_ms']:>7.1f}ms  p95 {r['p95_ms']:>7.1f}ms"
+                       if r['committed'] else "no transaction committed")
+            self.stdout.write(f"{name:<9} {r['writes_per_second']:>8.0f} writes/s  {latency}  "
+                              f"failed {r['errors']} of {r['committed'] + r['errors']}")
+            for kind in r['error_kinds']:
+                self.stdout.write(f"          error: {kind}")
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def _run(self, options):
+        latencies, errors = [], []
+        lock = threading.Lock()
+        start_gate = threading.Barrier(options['threads'])
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local_latencies, local_errors = [], []
+            start_gate.wait()
+            try:
+                for _ in range(options['writes']):
+                    user_id = rng.randint(1, options['users'])
+                    day = date.today() - timedelta(days=rng.randint(0, 30))
+                    started = time.perf_counter()
+                    try:
+                        with transaction.atomic(using=ALIAS):
+                            # read, then write: the pattern that trips SQLite's
+                            # lock upgrade under deferred transactions
+                            Expense.objects.using(ALIAS).filter(user_id=user_id, date=day).aggregate(Sum('amount'))
+                            # bulk_create skips the rollup signals, which write to the default database
+                            Expense.objects.using(ALIAS).bulk_create([Expense(
+                                user_id=user_id, amount=Decimal(rng.randint(100, 10000)) / 100,
+                                description='load test', category='Other', date=day,
+                            )])
+                    except OperationalError as e:
+                        local_errors.append(str(e))
+                        continue
+                    local_latencies.append(1000 * (time.perf_counter() - started))
+            finally:
+                connections[ALIAS].close()
+            with lock:
+                latencies.extend(local_latencies)
+                errors.extend(local_errors)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'threads': options['threads'],
+            'committed': len(latencies),
+            'errors': len(errors),
+            'error_kinds': sorted(set(errors)),
+            'seconds': round(elapsed, 2),
+            'writes_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+            'p50_ms': round(statistics.median(latencies), 2) if latencies else None,
+            'p95_ms': round(latencies[int(0.95 * (len(latencies) - 1))], 2) if latencies else None,
+        }
@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.rollups import rebuild_for_user
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily/monthly insights rollups from the expenses table (backfills, repairs)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', default=[],
+                            help="username to rebuild (repeatable; default: every user)")
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(username__in=options['user'])
+            missing = set(options['user']) - set(users.values_list('username', flat=True))
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+
+        rebuilt = 0
+        for user_id in users.values_list('id', flat=True).iterator():
+            rebuild_for_user(user_id)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {rebuilt} users"))
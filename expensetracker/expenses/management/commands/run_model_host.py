@@ -0,0 +1,44 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses import ai_utils
+from expenses.ai.model_host import ModelHostServer
+from expenses.conf import expenses_setting
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+class Command(BaseCommand):
+    help = "Own the zero-shot model in this process and serve web workers over a Unix socket"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=None,
+                            help="socket path (default: EXPENSES['MODEL_HOST_SOCKET'])")
+        parser.add_argument('--no-warmup', action='store_true',
+                            help="load the model on the first request instead of at startup")
+
+    def handle(self, *args, **options):
+        socket_path = options['socket'] or expenses_setting('MODEL_HOST_SOCKET')
+        if not socket_path:
+            raise CommandError("pass --socket or set EXPENSES['MODEL_HOST_SOCKET']")
+
+        ai_utils.serve_as_model_host()
+        if not options['no_warmup']:
+            report = ai_utils.warmup('zero-shot')
+            self.stdout.write(f"Model loaded in {report['load_seconds']:.1f}s")
+
+        # batches from all connected workers meet in this process's scheduler
+        server = ModelHostServer(socket_path, ai_utils._classify_in_process, model_name=ai_utils.MODEL_NAME)
+        # shutdown() waits for serve_forever() to return, which would deadlock
+        # in a handler running on that same thread; unwind it instead
+        signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+        self.stdout.write(self.style.SUCCESS(f"Model host listening on {socket_path}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,90 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.ai.prediction_cache import normalize_description
+from expenses.ai.sentence_classifier import SimpleCategoryModel
+from expenses.ai_utils import CONFIDENCE_THRESHOLD, predict_zero_shot
+from expenses.conf import expenses_setting
+from expenses.models import Expense
+
+
+class Command(BaseCommand):
+    help = (
+        "Distill the fast-path category model from confident zero-shot "
+        "predictions and user overrides stored on expenses"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None, help="model path (default: EXPENSES['FAST_MODEL_PATH'])")
+        parser.add_argument('--csv', default=None,
+                            help="extra labeled rows: CSV with 'description' and 'category' columns")
+        parser.add_argument('--relabel', type=int, default=0,
+                            help="run up to N unlabeled/low-confidence descriptions through the zero-shot model")
+        parser.add_argument('--override-weight', type=float, default=3.0,
+                            help="sample weight of user overrides relative to model labels")
+        parser.add_argument('--min-confidence', type=float, default=CONFIDENCE_THRESHOLD,
+                            help="only distill zero-shot labels at or above this confidence")
+
+    def handle(self, *args, **options):
+        examples = {}  # normalized description -> (text, label, weight)
+
+        def add(text, label, weight):
+            key = normalize_description(text)
+            if not key or not label or label == 'Uncertain':
+                return
+            # overrides win over model labels for the same merchant
+            if key not in examples or examples[key][2] < weight:
+                examples[key] = (text, label, weight)
+
+        confident = (
+            Expense.objects.filter(user_override=False, ai_confidence__gte=options['min_confidence'])
+            .exclude(predicted_category='')
+            .values_list('description', 'predicted_category')
+        )
+        for text, label in confident.iterator():
+            add(text, label, 1.0)
+
+        if options['relabel']:
+            unlabeled = (
+                Expense.objects.filter(user_override=False)
+                .exclude(ai_confidence__gte=options['min_confidence'])
+                .order_by()
+                .values_list('description', flat=True)
+                .distinct()
+            )
+            texts = [t for t in unlabeled[:options['relabel']] if normalize_description(t) not in examples]
+            if texts:
+                self.stdout.write(f"Relabeling {len(texts)} descriptions with the zero-shot model...")
+                for text, top in zip(texts, predict_zero_shot(texts)):
+                    if top is not None and top[1] >= options['min_confidence']:
+                        add(text, top[0], 1.0)
+
+        if options['csv']:
+            with open(options['csv'], newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    add(row.get('description', ''), (row.get('category') or '').strip(), options['override_weight'])
+
+        overrides = (
+            Expense.objects.filter(user_override=True)
+            .exclude(category='')
+            .values_list('description', 'category')
+        )
+        for text, label in overrides.iterator():
+            add(text, label, options['override_weight'])
+
+        labels = {label for _, label, _ in examples.values()}
+        if len(labels) < 2:
+            raise CommandError(f"Need examples of at least 2 categories, found {len(examples)} examples / {len(labels)} categories")
+
+        texts, y, weights = zip(*examples.values())
+        start = time.perf_counter()
+        model = SimpleCategoryModel().train(list(texts), list(y), sample_weight=list(weights))
+        elapsed = time.perf_counter() - start
+
+        path = options['output'] or expenses_setting('FAST_MODEL_PATH')
+        model.save(path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Trained on {len(texts)} examples / {len(labels)} categories in {elapsed:.2f}s -> {path}"
+        ))
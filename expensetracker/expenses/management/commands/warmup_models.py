@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.ai_utils import warmup
+
+
+class Command(BaseCommand):
+    help = "Load the AI models, run a dummy batch through them and report the timings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engine', choices=['zero-shot', 'embedding'], default=None,
+                            help="engine to warm up (default: EXPENSES['AI_ENGINE'])")
+
+    def handle(self, *args, **options):
+        try:
+            report = warmup(options['engine'])
+        except Exception as e:
+            raise CommandError(f"Warm-up failed: {e}")
+        self.stdout.write(f"engine:            {report['engine']}")
+        self.stdout.write(f"fast model load:   {report['fast_model_load_seconds']:.3f}s")
+        self.stdout.write(f"model load:        {report['load_seconds']:.3f}s")
+        self.stdout.write(f"first batch ({report['first_batch_size']}):   {report['first_batch_seconds']:.3f}s")
+        self.stdout.write(self.style.SUCCESS("Models are warm"))
@@ -0,0 +1,292 @@
+# expenses/metrics.py
+"""
+Per-process performance metrics: request latency per endpoint, database
+queries, model inference and cache hit rates.
+
+Enable with EXPENSES['METRICS'] = True. MetricsMiddleware then times every
+request and counts its queries (through an execute wrapper installed on each
+database connection, which also sees the queries that async views run on
+sync_to_async threads), and the
+hooks in ai_utils, ai/anomaly.py, the JWT authentication class and the JSON
+renderer time their phase of the request. Everything is exposed in the
+Prometheus text format at GET /api/metrics/. With EXPENSES['SERVER_TIMING']
+each response also carries a Server-Timing header that browser devtools
+show per request, e.g.
+
+    Server-Timing: auth;dur=0.4, db;dur=3.1;desc="4 queries", inference;dur=41.7, total;dur=52.0
+
+When METRICS is off the middleware hands the request straight on, every
+hook is one settings lookup and the query wrapper one context variable read.
+
+Metrics live in this process only; with several workers, scrape each one
+(or run a single worker behind the scrape target).
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from .conf import expenses_setting
+
+# Prometheus' default latency buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# for batch sizes and per-request query counts
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+# phase timings of the request being served in this thread/task
+_request = contextvars.ContextVar('expenses_request_metrics', default=None)
+
+
+def metrics_enabled():
+    return expenses_setting('METRICS')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for label_values, value in sorted(values.items()):
+            yield f'{self.name}{_labels(self.label_names, label_values)} {_number(value)}'
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *label_values):
+        series = self._series.get(label_values)
+        return sum(series[:-1]) if series else 0
+
+    def collect(self):
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        for label_values, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, hits in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += hits
+                le = f'le="{_number(float(bound))}"'
+                yield f'{self.name}_bucket{_labels(self.label_names, label_values, [le])} {cumulative}'
+            labels = _labels(self.label_names, label_values)
+            yield f'{self.name}_sum{labels} {_number(series[-1])}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+REQUEST_SECONDS = Histogram(
+    'expenses_http_request_duration_seconds', 'Request latency by endpoint',
+    ('view', 'method'))
+REQUESTS = Counter(
+    'expenses_http_requests_total', 'Requests by endpoint and status code',
+    ('view', 'method', 'status'))
+REQUEST_QUERIES = Histogram(
+    'expenses_http_request_db_queries', 'Database queries per request',
+    ('view',), buckets=SIZE_BUCKETS)
+DB_QUERY_SECONDS = Counter(
+    'expenses_db_query_seconds_total', 'Time spent in database queries during requests',
+    ('view',))
+PHASE_SECONDS = Histogram(
+    'expenses_phase_duration_seconds',
+    'Time per request phase (auth, inference, anomaly, render)', ('phase',))
+INFERENCE_SECONDS = Histogram(
+    'expenses_model_inference_seconds', 'Model calls by engine', ('engine',))
+INFERENCE_BATCH_SIZE = Histogram(
+    'expenses_model_batch_size', 'Descriptions per model call', ('engine',),
+    buckets=SIZE_BUCKETS)
+ANOMALY_SECONDS = Histogram(
+    'expenses_anomaly_detection_seconds', 'detect_anomalies_for_user by mode and outcome',
+    ('mode', 'outcome'))
+
+REGISTRY = (REQUEST_SECONDS, REQUESTS, REQUEST_QUERIES, DB_QUERY_SECONDS, PHASE_SECONDS,
+            INFERENCE_SECONDS, INFERENCE_BATCH_SIZE, ANOMALY_SECONDS)
+
+
+class RequestMetrics:
+    """Accumulates the timings of one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.phases = {}
+        # async views may run queries on several threads at once
+        self._lock = threading.Lock()
+
+    def add_phase(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.query_seconds += elapsed
+                self.queries += 1
+
+    def server_timing(self, total_seconds):
+        with self._lock:
+            phases = list(self.phases.items())
+        entries = [f'{name};dur={1000 * seconds:.1f}' for name, seconds in phases]
+        entries.append(f'db;dur={1000 * self.query_seconds:.1f};desc="{self.queries} queries"')
+        entries.append(f'total;dur={1000 * total_seconds:.1f}')
+        return ', '.join(entries)
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    state = _request.get()
+    if state is None:
+        return execute(sql, params, many, context)
+    return state.record_query(execute, sql, params, many, context)
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """connection_created receiver (see ExpensesConfig.ready)"""
+    if _query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_wrapper)
+
+
+def begin_request():
+    state = RequestMetrics()
+    return state, _request.set(state)
+
+
+def end_request(token):
+    _request.reset(token)
+
+
+@contextmanager
+def timed(phase):
+    """Time a phase of the current request (and of the process, for /metrics)"""
+    record = metrics_enabled()
+    # a request is tracked when METRICS or SERVER_TIMING is on (see the middleware)
+    state = _request.get()
+    if not record and state is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if record:
+            PHASE_SECONDS.observe(elapsed, phase)
+        if state is not None:
+            state.add_phase(phase, elapsed)
+
+
+def observe_inference(engine, batch_size, seconds):
+    if metrics_enabled():
+        INFERENCE_SECONDS.observe(seconds, engine)
+        INFERENCE_BATCH_SIZE.observe(batch_size, engine)
+
+
+def observe_anomaly_detection(mode, outcome, seconds):
+    if metrics_enabled():
+        ANOMALY_SECONDS.observe(seconds, mode, outcome)
+
+
+def _gauge(name, help, value, labels=''):
+    return [f'# HELP {name} {help}', f'# TYPE {name} gauge', f'{name}{labels} {_number(value)}']
+
+
+def _counter(name, help, values):
+    """`values` maps a label string ('' for none) to the counter's value"""
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} counter']
+    lines += [f'{name}{labels} {_number(value)}' for labels, value in values.items()]
+    return lines
+
+
+def _stats_lines():
+    """Counters and gauges read from the existing per-process statistics (see get_ai_stats)"""
+    from . import insights_cache
+    from .ai_utils import get_ai_stats
+
+    stats = get_ai_stats()
+    predictions = stats['predictions']
+    lines = []
+    lines += _counter('expenses_predictions_total', 'Descriptions categorized', {'': predictions['predictions']})
+    lines += _gauge('expenses_prediction_fast_path_ratio',
+                    'Share of predictions answered by the distilled model', predictions['fast_path_rate'])
+    lines += _gauge('expenses_prediction_rules_ratio',
+                    'Share of predictions answered by merchant rules', predictions['rules_rate'])
+    lines += _gauge('expenses_prediction_user_model_ratio',
+                    "Share of predictions answered by the user's own corrections", predictions['user_model_rate'])
+    lines += _counter('expenses_prediction_fallback_total', 'Predictions answered by the keyword rules',
+                      {'': predictions['fallback']})
+    lines += _gauge('expenses_candidate_label_ratio',
+                    'Zero-shot candidate labels scored, as a share of the full label set',
+                    predictions['candidate_label_ratio'])
+    if stats['prediction_cache'] is not None:
+        cache = stats['prediction_cache']
+        lines += _gauge('expenses_prediction_cache_hit_ratio', 'Prediction cache hit rate', cache['hit_rate'])
+        lines += _counter('expenses_prediction_cache_hits_total', 'Prediction cache hits by tier',
+                          {'{tier="local"}': cache['local_hits'], '{tier="persistent"}': cache['persistent_hits']})
+        lines += _counter('expenses_prediction_cache_misses_total', 'Prediction cache misses', {'': cache['misses']})
+        lines += _counter('expenses_prediction_cache_evictions_total', 'Entries evicted from the in-process tier',
+                          {'': cache['evictions']})
+    if stats['user_models'] is not None:
+        lines += _gauge('expenses_user_models_cached', 'Per-user correction models held in memory',
+                        stats['user_models']['models'])
+        lines += _counter('expenses_user_model_evictions_total', 'Per-user correction models evicted from memory',
+                          {'': stats['user_models']['evictions']})
+    if stats['scheduler'] is not None:
+        lines += _gauge('expenses_batch_queue_depth', 'Descriptions waiting for the micro-batcher',
+                        stats['scheduler']['queue_depth'])
+    insights = insights_cache.stats()
+    lines += _gauge('expenses_insights_cache_hit_ratio', 'Insights cache hit rate', insights['hit_rate'])
+    lines += _counter('expenses_insights_cache_hits_total', 'Insights served from the cache', {'': insights['hits']})
+    lines += _counter('expenses_insights_cache_misses_total', 'Insights computed', {'': insights['misses']})
+    return lines
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    lines.extend(_stats_lines())
+    return '\n'.join(lines) + '\n'
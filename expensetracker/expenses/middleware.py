@@ -0,0 +1,68 @@
+# expenses/middleware.py
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+from .conf import expenses_setting
+
+
+def _enabled():
+    return metrics.metrics_enabled() or expenses_setting('SERVER_TIMING')
+
+
+class MetricsMiddleware:
+    """
+    Record latency, status and database queries per endpoint (see
+    expenses/metrics.py) and/or add a Server-Timing header, as enabled by
+    EXPENSES['METRICS'] and EXPENSES['SERVER_TIMING'].
+    Endpoints are labelled by URL name so the label set stays small.
+    Works in both the sync (WSGI) and the async (ASGI) handler chain.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not _enabled():
+            return self.get_response(request)
+
+        state, token = metrics.begin_request()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._record(request, response, state, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not _enabled():
+            return await self.get_response(request)
+
+        state, token = metrics.begin_request()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._record(request, response, state, time.perf_counter() - start)
+
+    def _record(self, request, response, state, elapsed):
+        if metrics.metrics_enabled():
+            match = getattr(request, 'resolver_match', None)
+            view = match.view_name if match is not None else '<unmatched>'
+            metrics.REQUEST_SECONDS.observe(elapsed, view, request.method)
+            metrics.REQUESTS.inc(1, view, request.method, str(response.status_code))
+            metrics.REQUEST_QUERIES.observe(state.queries, view)
+            metrics.DB_QUERY_SECONDS.inc(state.query_seconds, view)
+
+        if expenses_setting('SERVER_TIMING'):
+            # streamed responses are timed up to the first byte only
+            response['Server-Timing'] = state.server_timing(elapsed)
+        return response
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rollups(apps, schema_editor):
+    Expense = apps.get_model('expenses', 'Expense')
+    DailyCategoryRollup = apps.get_model('expenses', 'DailyCategoryRollup')
+    MonthlyCategoryRollup = apps.get_model('expenses', 'MonthlyCategoryRollup')
+
+    daily = (
+        Expense.objects.order_by()
+        .values('user_id', 'date', 'category')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    monthly = {}
+    rows = []
+    for row in daily.iterator():
+        category = row['category'] or ''
+        rows.append(DailyCategoryRollup(user_id=row['user_id'], day=row['date'], category=category,
+                                        total=row['total'], count=row['count']))
+        key = (row['user_id'], row['date'].replace(day=1), category)
+        total, count = monthly.get(key, (0, 0))
+        monthly[key] = (total + row['total'], count + row['count'])
+    DailyCategoryRollup.objects.bulk_create(rows, batch_size=1000)
+    MonthlyCategoryRollup.objects.bulk_create(
+        [MonthlyCategoryRollup(user_id=u, month=m, category=c, total=t, count=n)
+         for (u, m, c), (t, n) in monthly.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0002_expense_prediction_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategoryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(blank=True, max_length=100)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'day', 'category'), name='unique_daily_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyCategoryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('category', models.CharField(blank=True, max_length=100)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'month', 'category'), name='unique_monthly_rollup')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# the flat list ai_utils used before the taxonomy, now its global top level
+TOP_LEVEL = [
+    "Food & Drink", "Groceries", "Transport", "Entertainment", "Utilities",
+    "Rent", "Healthcare", "Shopping", "Other",
+]
+
+
+def seed_top_level(apps, schema_editor):
+    Category = apps.get_model('expenses', 'Category')
+    Category.objects.bulk_create([Category(name=name) for name in TOP_LEVEL])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0006_expense_change_feed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='expenses.category')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='categories', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'name'), name='unique_user_category'), models.UniqueConstraint(condition=models.Q(('user', None)), fields=('name',), name='unique_global_category')],
+            },
+        ),
+        migrations.RunPython(seed_top_level, migrations.RunPython.noop),
+    ]
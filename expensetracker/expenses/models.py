@@ -2,6 +2,18 @@ from django.db import models
 from django.conf import settings
 
 class Expense(models.Model):
+    # prediction_state values; PENDING rows wait for the background categorizer
+    PREDICTION_PENDING = 'pending'
+    PREDICTION_PROCESSING = 'processing'
+    PREDICTION_DONE = 'done'
+    PREDICTION_FAILED = 'failed'
+    PREDICTION_STATES = [
+        (PREDICTION_PENDING, 'Pending'),
+        (PREDICTION_PROCESSING, 'Processing'),
+        (PREDICTION_DONE, 'Done'),
+        (PREDICTION_FAILED, 'Failed'),
+    ]
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='expenses')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField(blank=True)
@@ -10,11 +22,170 @@ class Expense(models.Model):
     predicted_category = models.CharField(max_length=100, blank=True)  # AI prediction
     ai_confidence = models.FloatField(null=True, blank=True)
     user_override = models.BooleanField(default=False)  # did user manually override AI?
+    prediction_state = models.CharField(max_length=10, choices=PREDICTION_STATES, default=PREDICTION_DONE, db_index=True)
+    prediction_attempts = models.PositiveSmallIntegerField(default=0)
+    prediction_claimed_at = models.DateTimeField(null=True, blank=True)  # set while a worker holds the row
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            # every hot query filters by user first: listing (default ordering),
+            # date ranges, and per-category aggregates
+            models.Index(fields=['user', '-date', '-created_at'], name='expense_user_date_idx'),
+            models.Index(fields=['user', 'category'], name='expense_user_category_idx'),
+            # change feed for incremental sync (see expenses.sync)
+            models.Index(fields=['user', 'updated_at'], name='expense_user_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.amount} on {self.date} ({self.category or self.predicted_category})"
+
+
+class DailyCategoryRollup(models.Model):
+    """Per-user, per-category spend for one day; maintained by expenses.rollups"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField()
+    category = models.CharField(max_length=100, blank=True)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'category'], name='unique_daily_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.day} {self.category}: {self.total} ({self.count})"
+
+
+class MonthlyCategoryRollup(models.Model):
+    """Per-user, per-category spend for one month (`month` is its first day)"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='monthly_rollups')
+    month = models.DateField()
+    category = models.CharField(max_length=100, blank=True)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month', 'category'], name='unique_monthly_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.month:%Y-%m} {self.category}: {self.total} ({self.count})"
+
+
+class InsightsVersion(models.Model):
+    """
+    Per-user counter bumped on every expense write; cached insights and their
+    ETags are keyed on it (see expenses.insights_cache).
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                related_name='insights_version')
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user} - v{self.version}"
+
+
+class ExpenseTombstone(models.Model):
+    """
+    Record of a deleted expense, so incremental sync clients learn about
+    deletions; written by expenses.signals, pruned by prune_tombstones
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='expense_tombstones')
+    expense_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='tombstone_user_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - expense {self.expense_id} deleted {self.deleted_at}"
+
+
+class Category(models.Model):
+    """
+    Node of the category taxonomy (see expenses.taxonomy). Global nodes
+    (user=None) are shared by everyone; users add their own subcategories
+    under any node they can see. Expenses store the node's name.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+                             related_name='categories')
+    name = models.CharField(max_length=100)
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_user_category'),
+            models.UniqueConstraint(fields=['name'], condition=models.Q(user=None), name='unique_global_category'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.user or 'global'})"
+
+
+class CategoryFeedback(models.Model):
+    """
+    A user's correction of a predicted category. The per-user correction
+    models (see expenses.ai.user_model) are fitted incrementally from these
+    rows and remember the last one they applied.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='category_feedback')
+    expense = models.ForeignKey(Expense, on_delete=models.SET_NULL, null=True, blank=True, related_name='feedback')
+    description = models.TextField(blank=True)
+    predicted_category = models.CharField(max_length=100, blank=True)
+    category = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # models catch up with "this user's feedback after id N"
+            models.Index(fields=['user', 'id'], name='feedback_user_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.description!r}: {self.predicted_category or '?'} -> {self.category}"
+
+
+class MerchantRule(models.Model):
+    """
+    "Descriptions like this (and amounts in this range) are this category",
+    checked before any model (see expenses.rules). Global rules (user=None)
+    apply to everyone; a user's own rules win over them.
+    """
+    MATCH_SUBSTRING = 'substring'
+    MATCH_PREFIX = 'prefix'
+    MATCH_REGEX = 'regex'
+    MATCH_TYPES = [
+        (MATCH_SUBSTRING, 'Contains'),
+        (MATCH_PREFIX, 'Starts with'),
+        (MATCH_REGEX, 'Regular expression'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+                             related_name='merchant_rules')
+    match_type = models.CharField(max_length=10, choices=MATCH_TYPES, default=MATCH_SUBSTRING)
+    pattern = models.CharField(max_length=200, blank=True)  # matched case-insensitively; blank = any description
+    min_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    category = models.CharField(max_length=100)
+    priority = models.IntegerField(default=0)  # higher wins when several rules match
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-priority', 'id']
+        indexes = [
+            models.Index(fields=['user', '-priority'], name='merchant_rule_user_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user} - {self.amount} on {self.date} ({self.category or self.predicted_category})"
\ No newline at end of file
+        return f"{self.match_type} {self.pattern!r} -> {self.category} ({self.user or 'global'})"
@@ -0,0 +1,170 @@
+"""
+Keyset (cursor) pagination for expense listings.
+
+DRF's CursorPagination positions on the first ordering field only and skips
+ties with an OFFSET, which gets slow on deep pages when many expenses share a
+date. Here the cursor carries the full (date, created_at, id) key of the
+boundary row. Each page is one indexed range scan with
+`WHERE (date, created_at, id) < cursor ORDER BY ... LIMIT n + 1`, however far
+into the history it is.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .conf import expenses_setting
+
+# newest first; id breaks ties between rows created in the same instant
+ORDERING = ('-date', '-created_at', '-id')
+KEY_FIELDS = ('date', 'created_at', 'id')
+
+
+def encode_cursor(key, reverse=False):
+    payload = [key[0].isoformat(), key[1].isoformat(), key[2], int(reverse)]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ((date, created_at, id), reverse) or raise ValueError"""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        day, created_at, pk, reverse = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key = (parse_date(day), parse_datetime(created_at), int(pk))
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError(f"invalid cursor {cursor!r}")
+    if key[0] is None or key[1] is None:
+        raise ValueError(f"invalid cursor {cursor!r}")
+    return key, bool(reverse)
+
+
+def _before(key):
+    """Rows that sort after `key` in newest-first order"""
+    day, created_at, pk = key
+    return (Q(date__lt=day)
+            | Q(date=day, created_at__lt=created_at)
+            | Q(date=day, created_at=created_at, id__lt=pk))
+
+
+def _after(key):
+    """Rows that sort before `key` in newest-first order"""
+    day, created_at, pk = key
+    return (Q(date__gt=day)
+            | Q(date=day, created_at__gt=created_at)
+            | Q(date=day, created_at=created_at, id__gt=pk))
+
+
+class ExpenseCursorPagination(BasePagination):
+    """
+    `?cursor=` is an opaque token taken from the `next`/`previous` links;
+    `?page_size=` overrides the default up to EXPENSE_MAX_PAGE_SIZE.
+    Responses look like DRF's cursor pagination: {next, previous, results}.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        default = expenses_setting('EXPENSE_PAGE_SIZE')
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, default))
+        except (TypeError, ValueError):
+            size = default
+        return max(1, min(size, expenses_setting('EXPENSE_MAX_PAGE_SIZE')))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset, page_size, key, reverse = self._page_query(queryset, request)
+        return self._set_page(list(queryset), page_size, key, reverse)
+
+    async def apaginate_queryset(self, queryset, request):
+        """paginate_queryset for async views, fetching the page with the async ORM"""
+        queryset, page_size, key, reverse = self._page_query(queryset, request)
+        return self._set_page([row async for row in queryset], page_size, key, reverse)
+
+    def _page_query(self, queryset, request):
+        """(queryset sliced to one page plus a look-ahead row, page size, cursor key, reverse)"""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+
+        token = request.query_params.get(self.cursor_query_param)
+        key, reverse = None, False
+        if token:
+            try:
+                key, reverse = decode_cursor(token)
+            except ValueError:
+                raise NotFound('Invalid cursor')
+
+        if reverse:
+            queryset = queryset.filter(_after(key)).order_by(*(f.lstrip('-') for f in ORDERING))
+        else:
+            if key is not None:
+                queryset = queryset.filter(_before(key))
+            queryset = queryset.order_by(*ORDERING)
+        return queryset[:page_size + 1], page_size, key, reverse
+
+    def _set_page(self, rows, page_size, key, reverse):
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+            # walking backwards: more rows beyond the first one, and the
+            # cursor's own row follows this page
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = key is not None, has_more
+        self.page = rows
+        return rows
+
+    def _key(self, obj):
+        # pages hold model instances, or dicts on the .values() fast path
+        if isinstance(obj, dict):
+            return tuple(obj[f] for f in KEY_FIELDS)
+        return tuple(getattr(obj, f) for f in KEY_FIELDS)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, encode_cursor(self._key(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   encode_cursor(self._key(self.page[0]), reverse=True))
+
+    def get_paginated_data(self, data):
+        return OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ])
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.cursor_query_param, 'required': False, 'in': 'query',
+             'description': 'Pagination cursor from a next/previous link', 'schema': {'type': 'string'}},
+            {'name': self.page_size_query_param, 'required': False, 'in': 'query',
+             'description': 'Number of results per page', 'schema': {'type': 'integer'}},
+        ]
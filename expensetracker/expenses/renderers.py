@@ -0,0 +1,102 @@
+# expenses/renderers.py
+"""
+JSON renderer that encodes with orjson when it is installed
+(`pip install orjson`), and with DRF's JSONRenderer otherwise.
+
+The output is byte-for-byte what JSONRenderer produces. Anything orjson
+would write differently falls back to the stdlib encoder for that response:
+- floats that Python writes in exponent form (below 1e-4 or from 1e16 up)
+- NaN and infinity
+- non-string dict keys
+- indented output
+"""
+import json
+import math
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from . import metrics
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def _portable_float(value):
+    """True if orjson and json.dumps write `value` identically"""
+    if not math.isfinite(value):
+        return False
+    magnitude = abs(value)
+    return magnitude == 0.0 or 1e-4 <= magnitude < 1e16
+
+
+class PortableFloatList(list):
+    """
+    A list whose floats are already known to be portable; the renderer
+    skips walking into it (see ValuesRowSerializer.serialize)
+    """
+
+
+def _has_unportable_float(data):
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, PortableFloatList):
+            continue
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif type(value) is float and not _portable_float(value):
+            return True
+    return False
+
+
+class _StdlibFallback(Exception):
+    pass
+
+
+class FastJSONRenderer(JSONRenderer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._encoder = self.encoder_class()
+
+    def _default(self, obj):
+        # anything orjson can't encode natively goes through DRF's encoder
+        value = self._encoder.default(obj)
+        if _has_unportable_float(value):
+            raise _StdlibFallback()
+        return value
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with metrics.timed('render'):
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type, renderer_context):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if _has_unportable_float(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self._default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except (TypeError, _StdlibFallback):
+            # orjson raises TypeError for non-str keys, >64-bit ints and
+            # unknown types; the stdlib path handles them or raises as usual
+            return super().render(data, accepted_media_type, renderer_context)
+        # same strict-JavaScript escaping as JSONRenderer
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class PrometheusTextRenderer(BaseRenderer):
+    """Prometheus text exposition format; errors are written as JSON"""
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, str):
+            return data.encode(self.charset)
+        return json.dumps(data).encode(self.charset)
@@ -0,0 +1,93 @@
+# expenses/rollups.py
+"""
+Incrementally maintained per-user, per-category daily and monthly totals.
+
+Every expense create/update/delete adjusts the affected buckets through the
+signal handlers in expenses.signals (the override action is a normal save,
+so it is covered too). `bulk_create` skips signals, so bulk writers call
+`apply_expenses` themselves. `rebuild_for_user` recomputes everything from
+the expenses table and backs the `rebuild_rollups` command.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import DailyCategoryRollup, Expense, MonthlyCategoryRollup
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def _bump(model, user_id, bucket_field, bucket, category, amount, count):
+    lookup = {'user_id': user_id, bucket_field: bucket, 'category': category}
+    qs = model.objects.filter(**lookup)
+    if qs.update(total=F('total') + amount, count=F('count') + count):
+        if count < 0:
+            # drop emptied buckets so they don't show up as zero rows
+            qs.filter(count__lte=0).delete()
+        return
+    if count <= 0:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(total=amount, count=count, **lookup)
+    except IntegrityError:
+        # another request created the bucket first
+        qs.update(total=F('total') + amount, count=F('count') + count)
+
+
+def apply_delta(user_id, day, category, amount, count):
+    """Add `amount`/`count` (negative to remove) to the day's and month's buckets"""
+    category = category or ''
+    amount = Decimal(amount)
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    _bump(DailyCategoryRollup, user_id, 'day', day, category, amount, count)
+    _bump(MonthlyCategoryRollup, user_id, 'month', month_start(day), category, amount, count)
+
+
+def apply_expenses(expenses, sign=1):
+    """Fold many expenses into the rollups with one update per touched bucket"""
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for e in expenses:
+        day = date.fromisoformat(e.date) if isinstance(e.date, str) else e.date
+        delta = deltas[(e.user_id, day, e.category or '')]
+        delta[0] += Decimal(e.amount) * sign
+        delta[1] += sign
+    for (user_id, day, category), (amount, count) in deltas.items():
+        apply_delta(user_id, day, category, amount, count)
+
+
+@transaction.atomic
+def rebuild_for_user(user_id):
+    """Recompute a user's rollups from scratch with two GROUP BY queries"""
+    DailyCategoryRollup.objects.filter(user_id=user_id).delete()
+    MonthlyCategoryRollup.objects.filter(user_id=user_id).delete()
+
+    daily = (
+        Expense.objects.filter(user_id=user_id)
+        .order_by()
+        .values('date', 'category')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    daily_rows = []
+    monthly = defaultdict(lambda: [Decimal('0'), 0])
+    for row in daily:
+        daily_rows.append(DailyCategoryRollup(
+            user_id=user_id, day=row['date'], category=row['category'] or '',
+            total=row['total'], count=row['count'],
+        ))
+        bucket = monthly[(month_start(row['date']), row['category'] or '')]
+        bucket[0] += row['total']
+        bucket[1] += row['count']
+    DailyCategoryRollup.objects.bulk_create(daily_rows, batch_size=1000)
+    MonthlyCategoryRollup.objects.bulk_create(
+        [MonthlyCategoryRollup(user_id=user_id, month=m, category=c, total=t, count=n)
+         for (m, c), (t, n) in monthly.items()],
+        batch_size=1000,
+    )
+    return len(daily_rows)
@@ -0,0 +1,110 @@
+# expenses/rules.py
+"""
+Merchant rules: deterministic "description (and amount) -> category"
+mappings stored as MerchantRule rows, checked before any model so known
+merchants never cost an inference call.
+
+A user's rules and the global ones are compiled into a single regular
+expression of optional lookaheads, one per rule. One regex call then
+reports every rule whose pattern matches the description, and the best
+ranked of those whose amount range fits wins: the user's own rules first,
+then higher priority, then the older rule.
+
+Substring and prefix patterns are escaped literals. Regular expressions can
+backtrack without bound (Python's re has no timeout), so only staff can
+write them: global rules and staff users' own rules. Descriptions are
+matched on their first MAX_DESCRIPTION_LENGTH characters.
+"""
+import re
+
+from django.db.models import F, Q
+
+from .models import MerchantRule
+from .user_cache import PerUserCache
+
+MAX_DESCRIPTION_LENGTH = 500
+
+
+def pattern_fragment(match_type, pattern) -> str:
+    """The rule's pattern as a regular expression fragment"""
+    if match_type == MerchantRule.MATCH_REGEX:
+        return f"(?:{pattern})"
+    return re.escape(pattern.strip())
+
+
+def check_pattern(match_type, pattern):
+    """Raise ValueError if the pattern can't be part of a combined expression"""
+    try:
+        compiled = re.compile(pattern_fragment(match_type, pattern))
+    except re.error as e:
+        raise ValueError(f"Invalid regular expression: {e}")
+    if compiled.groups:
+        # capturing groups and backreferences would shift the rule groups
+        raise ValueError("Use non-capturing groups (?:...) in rule patterns.")
+
+
+class RuleSet:
+    """Rules compiled for matching, given in rank order"""
+    def __init__(self, rules):
+        """`rules` are (match_type, pattern, min_amount, max_amount, category) tuples"""
+        self.rules = []    # (category, min_amount, max_amount, group index or None)
+        parts = []
+        for match_type, pattern, low, high, category in rules:
+            group = None
+            if pattern:
+                group = len(parts)
+                # prefixes are anchored at the start of the description, the rest may match anywhere
+                scan = r'\s*' if match_type == MerchantRule.MATCH_PREFIX else '.*?'
+                parts.append(f"(?:(?={scan}({pattern_fragment(match_type, pattern)})))?")
+            self.rules.append((category, low, high, group))
+        self._regex = re.compile(r'\A' + ''.join(parts), re.IGNORECASE | re.DOTALL) if parts else None
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, description, amount=None):
+        """Category of the best ranked matching rule, or None. Rules with an amount range need `amount`."""
+        if not self.rules:
+            return None
+        description = (description or '')[:MAX_DESCRIPTION_LENGTH]
+        groups = self._regex.match(description).groups() if self._regex is not None else ()
+        for category, low, high, group in self.rules:
+            if group is not None and groups[group] is None:
+                continue
+            if low is not None or high is not None:
+                if amount is None or (low is not None and amount < low) or (high is not None and amount > high):
+                    continue
+            return category
+        return None
+
+
+_FIELDS = ('match_type', 'pattern', 'min_amount', 'max_amount', 'category')
+
+
+def _load(user_id):
+    # regex rules of users who aren't (or no longer are) staff are never compiled
+    usable = MerchantRule.objects.exclude(match_type=MerchantRule.MATCH_REGEX, user__is_staff=False)
+    if user_id is not None and usable.filter(user_id=user_id).exists():
+        rows = (
+            usable.filter(Q(user=None) | Q(user_id=user_id))
+            .order_by(F('user_id').asc(nulls_last=True), '-priority', 'id')
+        )
+        return RuleSet(rows.values_list(*_FIELDS))
+    if user_id is not None:
+        return _cache.get(None)  # no rules of their own: share the compiled global set
+    return RuleSet(MerchantRule.objects.filter(user=None).order_by('-priority', 'id').values_list(*_FIELDS))
+
+
+# A process may apply rules another process changed for up to 30 s late;
+# changes made in this process apply immediately (see expenses.signals)
+_cache = PerUserCache(_load, max_age=30)
+
+
+def get_rules(user) -> RuleSet:
+    """The user's rules followed by the global ones"""
+    return _cache.get(user.pk if user is not None and user.is_authenticated else None)
+
+
+def invalidate(user_id=None):
+    """Forget `user_id`'s compiled rules, or every user's when a global rule changed"""
+    _cache.invalidate(user_id)
@@ -0,0 +1,8 @@
+# expenses/schema.py
+"""drf-spectacular extensions, registered on import (see ExpensesConfig.ready)"""
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+
+
+class TimedJWTScheme(SimpleJWTScheme):
+    """Document TimedJWTAuthentication as the same 'jwtAuth' bearer scheme"""
+    target_class = 'expenses.authentication.TimedJWTAuthentication'
@@ -1,13 +1,49 @@
+from django.db.models import Q
 from rest_framework import serializers
-from .models import Expense
-from .ai_utils import predict_category
+from .models import Category, Expense, MerchantRule
+from .ai_utils import predict_category, update_user_model_with_feedback
+from .conf import expenses_setting
+from .rules import check_pattern
+
+
+def apply_category_prediction(validated_data, prediction=None):
+    """
+    Fill in the AI fields of `validated_data`. `prediction` is the
+    (label, confidence) pair for rows without a user-supplied category;
+    None leaves such rows pending for the background categorizer.
+    """
+    supplied_category = (validated_data.get('category', '') or '').strip()
+    if supplied_category:
+        validated_data['user_override'] = True
+    elif prediction is None:
+        validated_data['prediction_state'] = Expense.PREDICTION_PENDING
+        validated_data['user_override'] = False
+    else:
+        label, conf = prediction
+        validated_data['predicted_category'] = label
+        validated_data['ai_confidence'] = conf
+        # If AI is uncertain, we still set the predicted category but mark it as uncertain
+        # The frontend can decide how to handle this (e.g., prompt user)
+        validated_data['category'] = label  # default to predicted category
+        validated_data['user_override'] = False
+    return validated_data
+
 
 class ExpenseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Expense
         fields = ['id', 'user', 'amount', 'description', 'category', 'date',
-                  'predicted_category', 'ai_confidence', 'user_override', 'created_at', 'updated_at']
-        read_only_fields = ['user', 'predicted_category', 'ai_confidence', 'user_override', 'created_at', 'updated_at']
+                  'predicted_category', 'ai_confidence', 'user_override', 'prediction_state',
+                  'created_at', 'updated_at']
+        read_only_fields = ['user', 'predicted_category', 'ai_confidence', 'user_override', 'prediction_state',
+                            'created_at', 'updated_at']
+
+    def __init__(self, *args, fields=None, **kwargs):
+        # `fields` restricts the output to a subset (sparse fieldsets, ?fields=)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
     def create(self, validated_data):
         request = self.context.get('request')
@@ -20,23 +56,122 @@ class ExpenseSerializer(serializers.ModelSerializer):
         description = validated_data.get('description', '') or ''
         supplied_category = validated_data.get('category', '').strip()
 
-        # Only call AI if no category provided
-        if not supplied_category:
-            label, conf = predict_category(description, user)
-            validated_data['predicted_category'] = label
-            validated_data['ai_confidence'] = conf
-            # If AI is uncertain, we still set the predicted category but mark it as uncertain
-            # The frontend can decide how to handle this (e.g., prompt user)
-            validated_data['category'] = label  # default to predicted category
-            validated_data['user_override'] = False
-        else:
-            validated_data['user_override'] = True
+        # Only call AI if no category provided; in async mode the row is saved
+        # as pending and the categorize_worker command fills it in later
+        prediction = None
+        if not supplied_category and not expenses_setting('ASYNC_CATEGORIZATION'):
+            prediction = predict_category(description, user, validated_data.get('amount'))
+        apply_category_prediction(validated_data, prediction)
 
         return super().create(validated_data)
 
     def update(self, instance, validated_data):
         # If user updates category manually, mark user_override True.
         new_category = validated_data.get('category', None)
+        corrected = new_category is not None and new_category != instance.category
         if new_category is not None and new_category != instance.predicted_category:
             validated_data['user_override'] = True
-        return super().update(instance, validated_data)
\ No newline at end of file
+        instance = super().update(instance, validated_data)
+        if corrected and instance.user_override:
+            try:
+                update_user_model_with_feedback(instance.user, instance.description, new_category,
+                                                expense=instance, predicted_category=instance.predicted_category)
+            except Exception as e:
+                print(f"Error updating user model: {e}")
+        return instance
+
+
+class CategorySerializer(serializers.ModelSerializer):
+    """
+    A node of the user's taxonomy. Global nodes are read-only; users add
+    subcategories under any node they can see.
+    """
+    is_global = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'parent', 'is_global']
+
+    def get_is_global(self, obj) -> bool:
+        return obj.user_id is None
+
+    def _visible(self):
+        user = self.context['request'].user
+        if not user.is_authenticated:  # schema generation
+            return Category.objects.filter(user=None)
+        return Category.objects.filter(Q(user=None) | Q(user=user))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if 'request' in self.context:
+            fields['parent'].queryset = self._visible()
+        return fields
+
+    def validate_name(self, value):
+        value = value.strip()
+        if not value:
+            raise serializers.ValidationError("This field may not be blank.")
+        clashes = self._visible().filter(name=value)
+        if self.instance is not None:
+            clashes = clashes.exclude(pk=self.instance.pk)
+        if clashes.exists():
+            raise serializers.ValidationError("A category with this name already exists.")
+        return value
+
+    def validate_parent(self, value):
+        # a node can't move below itself
+        node = value
+        while self.instance is not None and node is not None:
+            if node.pk == self.instance.pk:
+                raise serializers.ValidationError("A category can't be its own ancestor.")
+            node = node.parent
+        return value
+
+
+class MerchantRuleSerializer(serializers.ModelSerializer):
+    """
+    A "description (and amount) -> category" rule, applied before any model.
+    Global rules are read-only.
+    """
+    is_global = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MerchantRule
+        fields = ['id', 'match_type', 'pattern', 'min_amount', 'max_amount', 'category', 'priority',
+                  'is_global', 'created_at', 'updated_at']
+        read_only_fields = ['created_at', 'updated_at']
+
+    def get_is_global(self, obj) -> bool:
+        return obj.user_id is None
+
+    def validate_category(self, value):
+        value = value.strip()
+        if not value:
+            raise serializers.ValidationError("This field may not be blank.")
+        return value
+
+    def validate(self, attrs):
+        def current(field):
+            return attrs.get(field, getattr(self.instance, field, None))
+
+        match_type = current('match_type') or MerchantRule.MATCH_SUBSTRING
+        request = self.context.get('request')
+        if match_type == MerchantRule.MATCH_REGEX and not (request and request.user.is_staff):
+            # Python's re has no timeout: one backtracking pattern could stall every prediction
+            raise serializers.ValidationError({'match_type': "Only staff can create regular expression rules."})
+        pattern = current('pattern') or ''
+        if match_type != MerchantRule.MATCH_REGEX:
+            pattern = pattern.strip()
+            if 'pattern' in attrs:
+                attrs['pattern'] = pattern
+        low, high = current('min_amount'), current('max_amount')
+        if not pattern and low is None and high is None:
+            raise serializers.ValidationError("Give a pattern, an amount range or both.")
+        if pattern:
+            try:
+                check_pattern(match_type, pattern)
+            except ValueError as e:
+                raise serializers.ValidationError({'pattern': str(e)})
+        if low is not None and high is not None and low > high:
+            raise serializers.ValidationError({'max_amount': "Must not be below min_amount."})
+        return attrs
@@ -0,0 +1,86 @@
+# expenses/signals.py
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from . import insights_cache, rollups, rules, sync, taxonomy
+from .models import Category, Expense, MerchantRule
+
+# fields the rollups depend on
+_ROLLUP_FIELDS = ('user_id', 'date', 'category', 'amount')
+
+
+def _snapshot(instance):
+    values = instance.__dict__
+    # deferred fields would cost a query each; snapshot lazily in pre_save instead
+    if any(f not in values for f in _ROLLUP_FIELDS):
+        return None
+    return tuple(values[f] for f in _ROLLUP_FIELDS)
+
+
+@receiver(post_init, sender=Expense)
+def remember_rollup_values(sender, instance, **kwargs):
+    instance._rollup_snapshot = _snapshot(instance) if instance.pk else None
+
+
+@receiver(pre_save, sender=Expense)
+def load_missing_snapshot(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk or instance._state.adding or instance._rollup_snapshot is not None:
+        return
+    old = Expense.objects.filter(pk=instance.pk).values_list(*_ROLLUP_FIELDS).first()
+    instance._rollup_snapshot = tuple(old) if old else None
+
+
+@receiver(post_save, sender=Expense)
+def update_rollups_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new = _snapshot(instance)
+    old = None if created else instance._rollup_snapshot
+    if old != new:
+        if old is not None:
+            rollups.apply_delta(old[0], old[1], old[2], -old[3], -1)
+        rollups.apply_delta(new[0], new[1], new[2], new[3], 1)
+    instance._rollup_snapshot = new
+    insights_cache.bump(instance.user_id)
+
+
+def _cascaded_from_account(origin, model=Expense):
+    """True when the row goes because its owner is being deleted"""
+    return origin is not None and not isinstance(origin, model) and getattr(origin, 'model', None) is not model
+
+
+@receiver(post_delete, sender=Expense)
+def update_rollups_on_delete(sender, instance, origin=None, **kwargs):
+    # the account's rollups and counters are deleted with it; recreating
+    # them here would leave rows pointing at a missing user
+    if _cascaded_from_account(origin):
+        return
+    snapshot = instance._rollup_snapshot or _snapshot(instance)
+    if snapshot is not None:
+        rollups.apply_delta(snapshot[0], snapshot[1], snapshot[2], -snapshot[3], -1)
+    insights_cache.bump(instance.user_id)
+
+
+@receiver(post_delete, sender=Expense)
+def record_tombstone(sender, instance, origin=None, **kwargs):
+    if not _cascaded_from_account(origin):
+        sync.record_deletion(instance)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_taxonomy(sender, instance, raw=False, origin=None, **kwargs):
+    if raw:
+        return
+    taxonomy.invalidate(instance.user_id)
+    if instance.user_id is not None and not _cascaded_from_account(origin, Category):
+        # top categories roll up through the user's taxonomy
+        insights_cache.bump(instance.user_id)
+
+
+@receiver(post_save, sender=MerchantRule)
+@receiver(post_delete, sender=MerchantRule)
+def invalidate_rules(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rules.invalidate(instance.user_id)
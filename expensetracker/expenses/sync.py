@@ -0,0 +1,132 @@
+"""
+Incremental sync: what changed for a user since a client's last sync.
+
+Two keyset-ordered feeds are read per call, with one indexed range scan
+each:
+- expenses by (updated_at, id), served by the (user, updated_at) index
+- tombstones by (deleted_at, id), served by the (user, deleted_at) index
+
+The opaque token carries the position reached in both feeds. Only rows
+older than SYNC_SETTLE_SECONDS are returned. A transaction that stamped
+updated_at slightly earlier but committed later than a read would otherwise
+be skipped for good.
+"""
+import base64
+import json
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .conf import expenses_setting
+from .models import Expense, ExpenseTombstone
+
+
+class InvalidSyncToken(ValueError):
+    """The token could not be decoded"""
+
+
+class SyncTokenExpired(Exception):
+    """The token predates the tombstone retention window; a full resync is needed"""
+
+
+def encode_token(position):
+    """`position` is {'u': [iso, id], 'd': [iso, id]}"""
+    raw = json.dumps(position, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_token(token):
+    padded = token + '=' * (-len(token) % 4)
+    try:
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        result = {}
+        for feed in ('u', 'd'):
+            stamp, pk = position[feed]
+            parsed = parse_datetime(stamp)
+            if parsed is None:
+                raise ValueError(stamp)
+            result[feed] = (parsed, int(pk))
+    except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+        raise InvalidSyncToken(f"invalid sync token {token!r}")
+    return result
+
+
+def _after(field, position):
+    stamp, pk = position
+    return Q(**{f'{field}__gt': stamp}) | Q(**{field: stamp, 'id__gt': pk})
+
+
+def _read_feed(qs, field, position, cutoff, limit):
+    """Up to `limit` rows after `position` and before `cutoff`, plus whether more remain"""
+    if position is not None:
+        qs = qs.filter(_after(field, position))
+    rows = list(qs.filter(**{f'{field}__lt': cutoff}).order_by(field, 'id')[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def changes_since(user, token=None, limit=None, queryset=None, now=None):
+    """
+    Return {'changes': [Expense], 'deleted': [id], 'next_token': str, 'has_more': bool}.
+
+    Without a token every current expense is returned, so a first sync is a
+    full download. Keep calling with `next_token` while `has_more` is true,
+    then store it for the next sync. `queryset` can narrow the columns
+    loaded (e.g. with .only()); it must include `updated_at`.
+    """
+    limit = limit or expenses_setting('SYNC_PAGE_SIZE')
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=expenses_setting('SYNC_SETTLE_SECONDS'))
+    retention = expenses_setting('SYNC_TOMBSTONE_RETENTION_DAYS')
+
+    if token:
+        position = decode_token(token)
+        if retention is not None and position['d'][0] < now - timedelta(days=retention):
+            raise SyncTokenExpired("sync token is older than the tombstone retention window")
+        expense_pos, tombstone_pos = position['u'], position['d']
+    else:
+        # deletions before a full download are irrelevant to the client
+        expense_pos, tombstone_pos = None, (cutoff, 0)
+
+    expenses_qs = queryset if queryset is not None else Expense.objects.all()
+    changes, more_changes = _read_feed(expenses_qs.filter(user=user), 'updated_at', expense_pos, cutoff, limit)
+    tombstones, more_deleted = _read_feed(
+        ExpenseTombstone.objects.filter(user=user).only('id', 'expense_id', 'deleted_at'),
+        'deleted_at', tombstone_pos, cutoff, limit,
+    )
+
+    if changes:
+        expense_pos = (changes[-1].updated_at, changes[-1].id)
+    elif not more_changes:
+        # caught up: start the next sync at the cutoff so it scans nothing old
+        expense_pos = max(expense_pos, (cutoff, 0)) if expense_pos else (cutoff, 0)
+    if tombstones:
+        tombstone_pos = (tombstones[-1].deleted_at, tombstones[-1].id)
+    elif not more_deleted:
+        tombstone_pos = max(tombstone_pos, (cutoff, 0))
+
+    next_token = encode_token({
+        'u': [expense_pos[0].isoformat(), expense_pos[1]],
+        'd': [tombstone_pos[0].isoformat(), tombstone_pos[1]],
+    })
+    return {
+        'changes': changes,
+        'deleted': [t.expense_id for t in tombstones],
+        'next_token': next_token,
+        'has_more': more_changes or more_deleted,
+    }
+
+
+def record_deletion(expense):
+    ExpenseTombstone.objects.create(user_id=expense.user_id, expense_id=expense.pk, deleted_at=timezone.now())
+
+
+def prune_tombstones(now=None):
+    """Delete tombstones older than the retention window; returns how many"""
+    retention = expenses_setting('SYNC_TOMBSTONE_RETENTION_DAYS')
+    if retention is None:
+        return 0
+    cutoff = (now or timezone.now()) - timedelta(days=retention)
+    deleted, _ = ExpenseTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,81 @@
+# expenses/taxonomy.py
+"""
+Category taxonomy: the global top-level categories plus each user's own
+subcategories (Category rows), e.g.
+
+    Food & Drink
+        Coffee
+        Restaurants
+        Delivery
+
+Expenses store a node's name, so any level can be used. predict_categories
+classifies among the top level first and then only among the chosen node's
+children, and insights roll subcategories up into their top-level category.
+"""
+from django.db.models import Q
+
+from .models import Category
+from .user_cache import PerUserCache
+
+
+class Taxonomy:
+    """Read-only tree of category names"""
+    def __init__(self, nodes):
+        """`nodes` are (name, parent name or None) pairs"""
+        self._parent = {}
+        self._children = {}  # parent name (None for the top level) -> child names
+        for name, parent in nodes:
+            self._parent[name] = parent
+            self._children.setdefault(parent, []).append(name)
+        # equal for equal trees, so caches built on a taxonomy survive reloads
+        self.fingerprint = hash(tuple(self._parent.items()))
+
+    def top_level(self) -> list:
+        return list(self._children.get(None, []))
+
+    def children(self, name) -> list:
+        return list(self._children.get(name, []))
+
+    def labels(self) -> list:
+        """Every name in the taxonomy"""
+        return list(self._parent)
+
+    def path(self, name) -> list:
+        """Names from the top level down to `name`; names outside the taxonomy are their own path"""
+        path = [name]
+        parent = self._parent.get(name)
+        while parent is not None and parent not in path:
+            path.append(parent)
+            parent = self._parent.get(parent)
+        return path[::-1]
+
+    def root(self, name):
+        """The top-level category `name` rolls up into"""
+        return self.path(name)[0]
+
+    def project(self, name, labels):
+        """The nearest of `labels` at or above `name`, or None"""
+        for node in reversed(self.path(name)):
+            if node in labels:
+                return node
+        return None
+
+
+def _load(user_id):
+    rows = Category.objects.filter(Q(user=None) | Q(user_id=user_id)) if user_id else Category.objects.filter(user=None)
+    return Taxonomy(rows.order_by('id').values_list('name', 'parent__name'))
+
+
+# A process may serve a taxonomy another process changed for up to 30 s;
+# changes made in this process apply immediately (see expenses.signals)
+_cache = PerUserCache(_load, max_age=30)
+
+
+def get_taxonomy(user) -> Taxonomy:
+    """The global taxonomy extended with `user`'s own subcategories"""
+    return _cache.get(user.pk if user is not None and user.is_authenticated else None)
+
+
+def invalidate(user_id=None):
+    """Forget `user_id`'s cached taxonomy, or every user's when a global node changed"""
+    _cache.invalidate(user_id)
@@ -40,3 +40,660 @@ class AITest(TestCase):
         cat, conf = out[0]
         self.assertIsInstance(cat, str)
         self.assertGreaterEqual(conf, 0.0)
+
+    def test_trained_model_learns_categories(self):
+        model = SimpleCategoryModel()
+        texts = ["uber trip", "uber ride home", "bolt taxi", "starbucks coffee",
+                 "coffee and cake", "starbucks latte"]
+        labels = ["Transport", "Transport", "Transport", "Food & Drink", "Food & Drink", "Food & Drink"]
+        model.train(texts * 5, labels * 5)
+        self.assertTrue(model.is_trained())
+        (cat1, conf1), (cat2, _) = model.predict(["UBER *TRIP", "Starbucks #1234"])
+        self.assertEqual(cat1, "Transport")
+        self.assertEqual(cat2, "Food & Drink")
+        self.assertGreater(conf1, 0.5)
+
+    def test_save_and_load_roundtrip(self):
+        import os
+        import tempfile
+        model = SimpleCategoryModel().train(["bus", "rent payment"] * 3, ["Transport", "Rent"] * 3)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "fast.joblib")
+            model.save(path)
+            loaded = SimpleCategoryModel.load_or_default(path)
+        self.assertEqual(loaded.predict(["bus"]), model.predict(["bus"]))
+
+
+class MicroBatchSchedulerTest(TestCase):
+    def test_concurrent_submissions_share_a_batch(self):
+        import threading
+        from expenses.ai.batching import MicroBatchScheduler
+
+        calls = []
+
+        def infer(texts, labels):
+            calls.append(list(texts))
+            return [{'labels': labels, 'scores': [1.0] + [0.0] * (len(labels) - 1)} for _ in texts]
+
+        scheduler = MicroBatchScheduler(infer, max_batch_size=8, max_wait_ms=200)
+        try:
+            results = [None] * 5
+            def worker(i):
+                results[i] = scheduler.submit(f"item {i}", ["A", "B"]).result(timeout=5)
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(5)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            scheduler.shutdown()
+
+        self.assertTrue(all(r['labels'][0] == "A" for r in results))
+        self.assertEqual(sum(len(c) for c in calls), 5)
+        self.assertLess(len(calls), 5)
+
+    def test_full_queue_applies_backpressure(self):
+        import threading
+        from expenses.ai.batching import MicroBatchScheduler, SchedulerOverloaded
+
+        release = threading.Event()
+
+        def infer(texts, labels):
+            release.wait(5)
+            return [{'labels': labels, 'scores': [1.0]} for _ in texts]
+
+        scheduler = MicroBatchScheduler(infer, max_batch_size=1, max_wait_ms=0,
+                                        max_queue_size=1, submit_timeout=0.05)
+        try:
+            scheduler.submit("first", ["A"])   # picked up by the worker, blocks in infer
+            import time
+            time.sleep(0.2)
+            scheduler.submit("second", ["A"])  # fills the queue
+            with self.assertRaises(SchedulerOverloaded):
+                scheduler.submit("third", ["A"])
+            self.assertEqual(scheduler.stats()['rejected'], 1)
+        finally:
+            release.set()
+            scheduler.shutdown()
+
+    def test_rejected_batch_leaves_nothing_queued(self):
+        import threading
+        import time
+        from expenses.ai.batching import MicroBatchScheduler, SchedulerOverloaded
+
+        release = threading.Event()
+        served = []
+
+        def infer(texts, labels):
+            release.wait(5)
+            served.extend(texts)
+            return [{'labels': labels, 'scores': [1.0]} for _ in texts]
+
+        scheduler = MicroBatchScheduler(infer, max_batch_size=1, max_wait_ms=0,
+                                        max_queue_size=1, submit_timeout=0.05)
+        try:
+            scheduler.submit("first", ["A"])
+            time.sleep(0.2)
+            # "second" is queued, "third" is rejected: "second" must not run for nobody
+            with self.assertRaises(SchedulerOverloaded):
+                scheduler.predict_many(["second", "third"], ["A"])
+            release.set()
+            time.sleep(0.3)
+            self.assertEqual(served, ["first"])
+        finally:
+            release.set()
+            scheduler.shutdown()
+
+
+class PredictionCacheTest(TestCase):
+    def test_normalize_description_groups_merchant_variants(self):
+        from expenses.ai.prediction_cache import normalize_description
+        self.assertEqual(normalize_description("UBER *TRIP"), normalize_description("Uber trip"))
+        self.assertEqual(normalize_description("Starbucks #1234"), "starbucks")
+
+    def test_lru_tier_evicts_and_counts(self):
+        from expenses.ai.prediction_cache import PredictionCache
+        cache = PredictionCache(max_local_entries=2, cache_alias='')
+        cache.set_many({'a': ('Transport', 0.9), 'b': ('Rent', 0.8)})
+        cache.get_many(['a'])               # 'a' becomes most recent
+        cache.set_many({'c': ('Other', 0.5)})  # evicts 'b'
+        found = cache.get_many(['a', 'b', 'c'])
+        self.assertEqual(set(found), {'a', 'c'})
+        stats = cache.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['local_hits'], 3)
+
+    def test_version_changes_with_categories(self):
+        from expenses.ai.prediction_cache import category_set_version
+        v1 = category_set_version("model", ["A", "B"])
+        self.assertEqual(v1, category_set_version("model", ["A", "B"]))
+        self.assertNotEqual(v1, category_set_version("model", ["A", "B", "C"]))
+        self.assertNotEqual(v1, category_set_version("other-model", ["A", "B"]))
+
+    def test_clear_orphans_persisted_entries(self):
+        from expenses.ai.prediction_cache import PredictionCache
+        cache = PredictionCache(cache_alias='default')
+        key = cache.make_key("uber trip", "v1")
+        cache.set_many({key: ('Transport', 0.9)})
+        cache.clear()
+        self.assertEqual(cache.get_many([cache.make_key("uber trip", "v1")]), {})
+
+
+class EmbeddingClassifierTest(TestCase):
+    class _KeywordEncoder:
+        """Tiny deterministic encoder: one dimension per keyword"""
+        vocab = ["taxi", "uber", "transport", "coffee", "food", "drink"]
+
+        def encode(self, texts, **kwargs):
+            return np.array([[1.0 if w in t else 0.0 for w in self.vocab] + [0.01] for t in texts],
+                            dtype=np.float32)
+
+    def _model(self, cache_path=None):
+        from expenses.ai.embedding_classifier import EmbeddingCategoryModel
+        model = EmbeddingCategoryModel(cache_path=cache_path)
+        model._encoder = self._KeywordEncoder()
+        return model
+
+    def test_classifies_by_prototype_similarity(self):
+        model = self._model()
+        preds = model.classify(["taxi to transport hub", "coffee & food"], ["Transport", "Food & Drink"])
+        self.assertEqual([p[0] for p in preds], ["Transport", "Food & Drink"])
+
+    def test_user_examples_pull_prototypes(self):
+        model = self._model()
+        categories = ["Transport", "Food & Drink"]
+        # "uber" alone is not similar to either category name...
+        P = model.user_prototypes(categories, {"Transport": ["uber"] * 5})
+        # ...until the user's overrides teach it
+        self.assertEqual(model.classify(["uber"], categories, P)[0][0], "Transport")
+
+    def test_prototype_sets_are_bounded(self):
+        model = self._model()
+        model.max_prototype_sets = 2
+        for categories in (["Transport"], ["Food & Drink"], ["Transport", "Food & Drink"]):
+            model.category_prototypes(categories)
+        self.assertEqual(list(model._prototypes), [("Food & Drink",), ("Transport", "Food & Drink")])
+
+    def test_disk_cache_avoids_reencoding(self):
+        import os
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "emb.sqlite3")
+            model = self._model(cache_path=path)
+            first = model.encode(["taxi"])
+            fresh = self._model(cache_path=path)
+            fresh._encoder = None  # would fail if it had to encode again
+            np.testing.assert_allclose(fresh.encode(["taxi"]), first)
+            self.assertEqual(fresh.cache.hits, 1)
+
+
+class ProcessRoleTest(TestCase):
+    def _role(self, argv, **env):
+        import os
+        import sys
+        from unittest import mock
+        from expenses.apps import get_process_role
+        env = {'RUN_MAIN': '', 'EXPENSES_PROCESS_ROLE': '', **env}
+        with mock.patch.object(sys, 'argv', argv), mock.patch.dict(os.environ, env):
+            return get_process_role()
+
+    def test_roles_from_command_line(self):
+        self.assertEqual(self._role(['manage.py', 'migrate']), 'management')
+        self.assertEqual(self._role(['manage.py', 'categorize_worker']), 'worker')
+        self.assertEqual(self._role(['manage.py', 'run_model_host']), 'model-host')
+        self.assertEqual(self._role(['manage.py', 'runserver'], RUN_MAIN='true'), 'web')
+        self.assertEqual(self._role(['manage.py', 'runserver']), 'management')  # autoreloader parent
+        self.assertEqual(self._role(['/usr/bin/gunicorn', 'expensetracker.wsgi']), 'web')
+
+    def test_environment_overrides_guess(self):
+        self.assertEqual(self._role(['manage.py', 'migrate'], EXPENSES_PROCESS_ROLE='worker'), 'worker')
+
+
+class LazyImportTest(TestCase):
+    def test_ai_utils_import_loads_no_ml_libraries(self):
+        import os
+        import subprocess
+        import sys
+        from django.conf import settings
+
+        code = (
+            "import django, sys; django.setup(); import expenses.ai_utils; "
+            "print(sorted(m for m in ('sklearn', 'scipy', 'torch', 'transformers') if m in sys.modules))"
+        )
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'expensetracker.settings', 'EXPENSES_PROCESS_ROLE': 'management'}
+        out = subprocess.run([sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env,
+                             capture_output=True, text=True, check=True).stdout
+        self.assertEqual(out.strip().splitlines()[-1], '[]')
+
+
+class RulesEngineTest(TestCase):
+    def test_rules_engine_answers_without_a_model(self):
+        from django.test import override_settings
+        from expenses import ai_utils
+
+        with override_settings(EXPENSES={'AI_ENGINE': 'rules', 'FAST_PATH': False, 'PREDICTION_CACHE': False}):
+            before = ai_utils.get_ai_stats()['predictions']['fallback']
+            self.assertEqual(ai_utils.predict_categories(["Uber to work", "Electric bill", "Something"]),
+                             [('Transport', 0.6), ('Utilities', 0.6), ('Other', 0.4)])
+            self.assertEqual(ai_utils.get_ai_stats()['predictions']['fallback'] - before, 3)
+            self.assertEqual(ai_utils.warmup()['load_seconds'], 0.0)
+        self.assertIsNone(ai_utils._classifier)
+
+    def test_merchant_rules_compile_into_one_expression(self):
+        from decimal import Decimal
+        from expenses.rules import RuleSet, check_pattern
+
+        rules = RuleSet([
+            ('prefix', 'uber eats', None, None, 'Delivery'),
+            ('substring', 'uber', None, None, 'Transport'),
+            ('regex', r'rent\b', Decimal('500'), None, 'Rent'),
+            ('substring', '', None, Decimal('5'), 'Small'),
+        ])
+        self.assertEqual(rules.match('  UBER EATS order'), 'Delivery')
+        self.assertEqual(rules.match('Trip: Uber eats'), 'Transport')  # a prefix must start the description
+        self.assertEqual(rules.match('Monthly rent', Decimal('900')), 'Rent')
+        self.assertIsNone(rules.match('Monthly rent', Decimal('200')))
+        self.assertIsNone(rules.match('Rental car'))
+        self.assertEqual(rules.match('Anything', Decimal('3')), 'Small')
+        self.assertIsNone(rules.match('Anything'))  # amount ranges need an amount
+        self.assertRaises(ValueError, check_pattern, 'regex', '(a|b')
+        self.assertRaises(ValueError, check_pattern, 'regex', r'(a)\1')
+        check_pattern('substring', '(a')
+
+
+class ModelHostTest(TestCase):
+    def test_client_roundtrip_and_unavailable_host(self):
+        import os
+        import tempfile
+        import threading
+        from expenses.ai.model_host import ModelHostClient, ModelHostServer, ModelHostUnavailable
+
+        def infer(texts, labels):
+            return [{'labels': list(labels), 'scores': [0.9] + [0.1] * (len(labels) - 1), 'sequence': t}
+                    for t in texts]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "host.sock")
+            server = ModelHostServer(path, infer, model_name="test-model")
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            try:
+                client = ModelHostClient(path, timeout=5)
+                results = client.classify(["bus", "rent"], ["Transport", "Rent"])
+                self.assertEqual([r['sequence'] for r in results], ["bus", "rent"])
+                self.assertEqual(client.ping()['texts'], 2)
+            finally:
+                server.shutdown()
+                server.server_close()
+
+            with self.assertRaises(ModelHostUnavailable):
+                ModelHostClient(path, timeout=1).classify(["bus"], ["Transport"])
+
+    def test_predictions_are_routed_through_configured_host(self):
+        import os
+        import tempfile
+        import threading
+        from django.test import override_settings
+        from expenses import ai_utils
+        from expenses.ai.model_host import ModelHostServer
+
+        def infer(texts, labels):
+            return [{'labels': ['Rent'] + [l for l in labels if l != 'Rent'],
+                     'scores': [0.99] + [0.0] * (len(labels) - 1), 'sequence': t} for t in texts]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "host.sock")
+            server = ModelHostServer(path, infer)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                with override_settings(EXPENSES={'MODEL_HOST_SOCKET': path, 'PREDICTION_CACHE': False,
+                                                 'AI_ENGINE': 'zero-shot'}):
+                    self.assertEqual(ai_utils.predict_zero_shot(["monthly flat payment"]), [('Rent', 0.99)])
+                self.assertEqual(server.texts_served, 1)
+            finally:
+                server.shutdown()
+                server.server_close()
+
+    def test_host_reported_errors_do_not_fall_back_in_process(self):
+        import os
+        import tempfile
+        import threading
+        from django.test import override_settings
+        from expenses import ai_utils
+        from expenses.ai.batching import SchedulerOverloaded
+        from expenses.ai.model_host import ModelHostClient, ModelHostError, ModelHostServer
+
+        def infer(texts, labels):
+            if texts == ["busy"]:
+                raise SchedulerOverloaded("queue full")
+            raise RuntimeError("inference failed")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "host.sock")
+            server = ModelHostServer(path, infer)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                client = ModelHostClient(path, timeout=5)
+                with self.assertRaises(SchedulerOverloaded):
+                    client.classify(["busy"], ["Transport"])
+                with self.assertRaisesRegex(ModelHostError, "inference failed"):
+                    client.classify(["bus"], ["Transport"])
+                # the host answered, so it is not marked down
+                self.assertTrue(client.ping()['ok'])
+
+                with override_settings(EXPENSES={'MODEL_HOST_SOCKET': path, 'MODEL_HOST_FALLBACK': True}):
+                    with self.assertRaises(ModelHostError):
+                        ai_utils._classify(["bus"], ["Transport"])
+            finally:
+                server.shutdown()
+                server.server_close()
+
+    def test_sigterm_stops_the_host_command(self):
+        import os
+        import signal
+        import subprocess
+        import sys
+        import tempfile
+        import time
+        from django.conf import settings
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "host.sock")
+            proc = subprocess.Popen(
+                [sys.executable, "manage.py", "run_model_host", "--socket", path, "--no-warmup"],
+                cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                deadline = time.monotonic() + 30
+                while not os.path.exists(path):
+                    self.assertIsNone(proc.poll(), "model host exited before listening")
+                    self.assertLess(time.monotonic(), deadline, "model host never started listening")
+                    time.sleep(0.05)
+                proc.send_signal(signal.SIGTERM)
+                self.assertEqual(proc.wait(timeout=10), 0)
+                self.assertFalse(os.path.exists(path))
+            finally:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+
+
+class LabelPruningTest(TestCase):
+    def _history(self):
+        return ([("Uber ride home", "Transport", False)] * 12 + [("Starbucks coffee", "Food & Drink", False)] * 10
+                + [("Monthly rent", "Rent", True)] * 3)
+
+    def test_profile_shortlists_plausible_labels(self):
+        from expenses.ai.label_profiles import CategoryProfile
+        from expenses.ai_utils import DEFAULT_CATEGORIES
+
+        profile = CategoryProfile.from_rows(DEFAULT_CATEGORIES, self._history())
+        shortlist = profile.shortlist("UBER *ride 8812", 3, 0.9)
+        self.assertEqual(len(shortlist), 3)
+        self.assertIn("Transport", shortlist)
+        # keeps the caller's label order, so cache keys stay stable
+        self.assertEqual(shortlist, [c for c in DEFAULT_CATEGORIES if c in shortlist])
+        self.assertIsNone(profile.shortlist("UBER *ride", 3, 0.9999))
+        self.assertIsNone(CategoryProfile.from_rows(DEFAULT_CATEGORIES, []).shortlist("uber", 3, 0.9))
+
+    def test_profile_is_rebuilt_only_after_enough_changes(self):
+        from datetime import date
+        from unittest import mock
+        from django.contrib.auth import get_user_model
+        from django.test import override_settings
+        from django.utils import timezone
+        from expenses import ai_utils
+        from expenses.ai.label_profiles import CategoryProfile
+        from expenses.models import Expense
+
+        user = get_user_model().objects.create_user(username="profiled", password="pw")
+        Expense.objects.bulk_create([
+            Expense(user=user, amount=10, description=d, category=c, user_override=o, date=date(2025, 1, 1))
+            for d, c, o in self._history() * 2
+        ])
+        with override_settings(EXPENSES={'LABEL_PRUNING_REBUILD_FRACTION': 0.1}), \
+                mock.patch.object(CategoryProfile, 'from_rows', wraps=CategoryProfile.from_rows) as build:
+            profile = ai_utils.get_category_profile(user, ai_utils.DEFAULT_CATEGORIES)
+            # one new expense out of 50 reuses the profile
+            Expense.objects.create(user=user, amount=4, description="Uber pool", category="Transport",
+                                   date=date(2025, 1, 2))
+            self.assertIs(ai_utils.get_category_profile(user, ai_utils.DEFAULT_CATEGORIES), profile)
+            self.assertEqual(build.call_count, 1)
+
+            # recategorising enough rows rebuilds it
+            edited = list(Expense.objects.filter(user=user, category="Transport").values_list('id', flat=True)[:4])
+            Expense.objects.filter(id__in=edited).update(category="Shopping", updated_at=timezone.now())
+            self.assertIsNot(ai_utils.get_category_profile(user, ai_utils.DEFAULT_CATEGORIES), profile)
+            self.assertEqual(build.call_count, 2)
+
+            with override_settings(EXPENSES={'LABEL_PRUNING_PROFILE_MAX_AGE': 0}):
+                ai_utils.get_category_profile(user, ai_utils.DEFAULT_CATEGORIES)
+            self.assertEqual(build.call_count, 3)
+
+    def test_only_shortlisted_labels_reach_the_model(self):
+        import os
+        import tempfile
+        import threading
+        from datetime import date
+        from django.contrib.auth import get_user_model
+        from django.test import override_settings
+        from expenses import ai_utils
+        from expenses.ai.model_host import ModelHostServer
+        from expenses.models import Expense
+
+        user = get_user_model().objects.create_user(username="pruner", password="pw")
+        Expense.objects.bulk_create([
+            Expense(user=user, amount=10, description=d, category=c, user_override=o, date=date(2025, 1, 1))
+            for d, c, o in self._history()
+        ])
+        seen = []
+
+        def infer(texts, labels):
+            seen.append(list(labels))
+            top = "Transport" if "Transport" in labels else labels[0]
+            return [{'labels': [top] + [l for l in labels if l != top],
+                     'scores': [0.95] + [0.05 / (len(labels) - 1)] * (len(labels) - 1), 'sequence': t}
+                    for t in texts]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "host.sock")
+            server = ModelHostServer(path, infer)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                settings = {'MODEL_HOST_SOCKET': path, 'PREDICTION_CACHE': False, 'FAST_PATH': False,
+                            'AI_ENGINE': 'zero-shot', 'LABEL_PRUNING_TOP_K': 3}
+                with override_settings(EXPENSES=settings):
+                    before = ai_utils.get_ai_stats()['predictions']
+                    self.assertEqual(ai_utils.predict_category("Uber ride to work", user), ("Transport", 0.95))
+                    after = ai_utils.get_ai_stats()['predictions']
+                    self.assertEqual(len(seen[-1]), 3)
+                    self.assertEqual(after['candidate_labels'] - before['candidate_labels'], 3)
+                    self.assertEqual(after['candidate_labels_full'] - before['candidate_labels_full'],
+                                     len(ai_utils.DEFAULT_CATEGORIES))
+
+                    # without enough history every label is scored
+                    with override_settings(EXPENSES=dict(settings, LABEL_PRUNING_MIN_HISTORY=100)):
+                        ai_utils.predict_category("Uber ride to work", user)
+                    self.assertEqual(seen[-1], ai_utils.DEFAULT_CATEGORIES)
+            finally:
+                server.shutdown()
+                server.server_close()
+
+
+class TaxonomyTest(TestCase):
+    def test_taxonomy_paths(self):
+        from expenses.taxonomy import Taxonomy
+
+        taxonomy = Taxonomy([("Food & Drink", None), ("Coffee", "Food & Drink"), ("Espresso", "Coffee"),
+                             ("Rent", None)])
+        self.assertEqual(taxonomy.top_level(), ["Food & Drink", "Rent"])
+        self.assertEqual(taxonomy.path("Espresso"), ["Food & Drink", "Coffee", "Espresso"])
+        self.assertEqual(taxonomy.root("Espresso"), "Food & Drink")
+        self.assertEqual(taxonomy.root("Something else"), "Something else")
+        self.assertEqual(taxonomy.project("Espresso", {"Coffee", "Rent"}), "Coffee")
+        self.assertIsNone(taxonomy.project("Rent", {"Coffee"}))
+
+    def test_two_stage_prediction_scores_only_the_chosen_branch(self):
+        import os
+        import tempfile
+        import threading
+        from django.contrib.auth import get_user_model
+        from django.test import override_settings
+        from expenses import ai_utils
+        from expenses.ai.model_host import ModelHostServer
+        from expenses.models import Category
+
+        user = get_user_model().objects.create_user(username="coarse-to-fine", password="pw")
+        food = Category.objects.get(user=None, name="Food & Drink")
+        for name in ["Coffee", "Restaurants", "Delivery"]:
+            Category.objects.create(user=user, name=name, parent=food)
+        Category.objects.create(user=user, name="Bills", parent=Category.objects.get(user=None, name="Utilities"))
+        seen = []
+
+        def infer(texts, labels):
+            seen.append(list(labels))
+            top = next(l for l in ["Coffee", "Food & Drink"] if l in labels)
+            return [{'labels': [top] + [l for l in labels if l != top],
+                     'scores': [0.9] + [0.1 / (len(labels) - 1)] * (len(labels) - 1), 'sequence': t}
+                    for t in texts]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "host.sock")
+            server = ModelHostServer(path, infer)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                with override_settings(EXPENSES={'MODEL_HOST_SOCKET': path, 'PREDICTION_CACHE': False,
+                                                 'FAST_PATH': False, 'AI_ENGINE': 'zero-shot'}):
+                    self.assertEqual(ai_utils.predict_category("Flat white", user), ("Coffee", 0.9))
+                    # anonymous users only see the global (flat) taxonomy
+                    self.assertEqual(ai_utils.predict_category("Flat white"), ("Food & Drink", 0.9))
+            finally:
+                server.shutdown()
+                server.server_close()
+        self.assertEqual(seen[0], ai_utils.DEFAULT_CATEGORIES)
+        self.assertEqual(seen[1], ["Coffee", "Restaurants", "Delivery", "Food & Drink"])
+        self.assertEqual(len(seen), 3)
+
+
+class UserCategoryModelTest(TestCase):
+    def test_partial_fit_learns_corrections_incrementally(self):
+        from expenses.ai.user_model import UserCategoryModel
+
+        model = UserCategoryModel(user_id=1)
+        model.partial_fit(["STARBUCKS #1204", "Uber trip 8812"], ["Coffee", "Transport"])
+        self.assertEqual(model.predict(["Starbucks #88"])[0][0], "Coffee")
+        self.assertGreater(model.predict(["Starbucks #88"])[0][1], 0.8)
+        self.assertLess(model.predict(["Electricity bill"])[0][1], 0.5)
+
+        # repeats merge into one prototype; a contradicting correction replaces it
+        model.partial_fit(["Starbucks #3"], ["Coffee"])
+        self.assertEqual(len(model.labels), 2)
+        model.partial_fit(["STARBUCKS #1204"], ["Food & Drink"])
+        self.assertEqual(sorted(model.labels), ["Food & Drink", "Transport"])
+
+        self.assertTrue(model.apply_feedback([(5, "Bolt ride", "Transport")]))
+        self.assertFalse(model.apply_feedback([(5, "Bolt ride", "Transport")]))
+        self.assertEqual(model.trained_through, 5)
+
+    def test_store_evicts_least_recently_used_and_reloads_from_disk(self):
+        import os
+        import tempfile
+        from expenses.ai.user_model import UserModelStore
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = UserModelStore(lambda user_id: os.path.join(tmp, f"{user_id}.joblib"), max_models=2)
+            store.get(1).partial_fit(["Netflix"], ["Entertainment"])
+            store.mark_dirty(1)
+            store.get(2)
+            store.get(3)  # evicts user 1, which changed, so it is saved
+            self.assertEqual(store.stats()['models'], 2)
+            self.assertEqual(os.listdir(tmp), ["1.joblib"])
+            self.assertEqual(store.get(1).predict(["NETFLIX.COM"])[0][0], "Entertainment")
+            self.assertEqual(store.stats()['evictions'], 2)
+
+
+class AnomalyDetectionTest(TestCase):
+    def setUp(self):
+        import datetime
+        import tempfile
+        from decimal import Decimal
+        from django.contrib.auth import get_user_model
+        from expenses.models import Expense
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.user = get_user_model().objects.create_user(username='anomaly', password='x')
+        start = datetime.date(2025, 1, 1)
+        rows = [Expense(user=self.user, amount=Decimal('10.00') + i % 5, description=f'coffee {i}',
+                        category='Food & Drink', date=start + datetime.timedelta(days=i))
+                for i in range(40)]
+        rows.append(Expense(user=self.user, amount=Decimal('950.00'), description='designer bag',
+                            category='Food & Drink', date=start + datetime.timedelta(days=41)))
+        Expense.objects.bulk_create(rows)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _detect(self, **options):
+        from django.test import override_settings
+        from expenses.ai import anomaly
+        anomaly._models.clear()
+        with override_settings(EXPENSES={'ANOMALY_MODEL_DIR': self.tmp.name, **options}):
+            return anomaly.detect_anomalies_for_user(self.user)
+
+    def test_robust_z_flags_outlier(self):
+        found = self._detect(ANOMALY_MODE='robust_z')
+        self.assertEqual([a['description'] for a in found], ['designer bag'])
+
+    def test_expense_deleted_after_scoring_is_skipped(self):
+        from unittest import mock
+        from django.db.models import QuerySet
+
+        # the flagged row goes between scoring and the detail query
+        with mock.patch.object(QuerySet, 'in_bulk', return_value={}):
+            self.assertEqual(self._detect(ANOMALY_MODE='robust_z'), [])
+
+    def test_isolation_forest_is_persisted_and_reused(self):
+        import os
+        from unittest import mock
+        from expenses.ai import anomaly
+
+        found = self._detect()
+        self.assertIn('designer bag', [a['description'] for a in found])
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, f"{self.user.pk}.joblib")))
+
+        # unchanged data: the persisted model is loaded, not refit
+        with mock.patch.object(anomaly, '_fit', side_effect=AssertionError("refit")):
+            self._detect()
+
+        # recategorising rows leaves count and total alone but still refits
+        from django.utils import timezone
+        from expenses.models import Expense
+        edited = Expense.objects.filter(user=self.user).order_by('id').values_list('id', flat=True)[:5]
+        Expense.objects.filter(id__in=list(edited)).update(category='Shopping', updated_at=timezone.now())
+        with mock.patch.object(anomaly, '_fit', wraps=anomaly._fit) as fit:
+            self._detect()
+        fit.assert_called_once()
+
+    def test_details_are_scoped_to_the_user(self):
+        from unittest import mock
+        import numpy as np
+        from django.contrib.auth import get_user_model
+        from expenses.ai import anomaly
+        from expenses.models import Expense
+
+        other = get_user_model().objects.create_user(username='other', password='x')
+        theirs = Expense.objects.create(user=other, amount=5, description='not yours', category='Rent',
+                                        date='2025-01-01')
+        load = anomaly._load_user_arrays
+
+        def load_with_foreign_id(user):
+            data = load(user)
+            data['ids'][-1] = theirs.pk  # a flagged id that belongs to someone else
+            return data
+
+        with mock.patch.object(anomaly, '_load_user_arrays', load_with_foreign_id), \
+                mock.patch.object(anomaly, '_robust_z_flags', lambda data: np.ones(len(data['ids']), dtype=bool)):
+            found = self._detect(ANOMALY_MODE='robust_z')
+        self.assertEqual(len(found), 40)
+        self.assertNotIn('not yours', [a['description'] for a in found])
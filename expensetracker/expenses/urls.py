@@ -1,15 +1,24 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
-from .views import ExpenseViewSet, InsightsAPIView
+from .views import CategoryViewSet, ExpenseViewSet, InsightsAPIView, AIStatsAPIView, MetricsAPIView, MerchantRuleViewSet
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from . import views
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'expenses', ExpenseViewSet, basename='expenses')
+router.register(r'categories', CategoryViewSet, basename='categories')
+router.register(r'rules', MerchantRuleViewSet, basename='rules')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('insights/', InsightsAPIView.as_view(), name='insights'),
+    path('ai/stats/', AIStatsAPIView.as_view(), name='ai-stats'),
+    path('metrics/', MetricsAPIView.as_view(), name='metrics'),
+    # Native async variants for ASGI deployments (see expenses/async_views.py)
+    path('async/expenses/', async_views.expense_list, name='async-expenses-list'),
+    path('async/expenses/<int:pk>/', async_views.expense_detail, name='async-expenses-detail'),
+    path('async/insights/', async_views.insights, name='async-insights'),
     # Auth
     path('auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
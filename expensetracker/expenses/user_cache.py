@@ -0,0 +1,40 @@
+# expenses/user_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class PerUserCache:
+    """
+    Process-local LRU of objects built per user from the database (the
+    taxonomy, compiled merchant rules). Changes made in this process call
+    `invalidate`; changes made by other processes show up once an entry is
+    older than `max_age` seconds.
+    """
+    def __init__(self, load, max_age=30, max_users=10000):
+        self.load = load  # user id (None for anonymous users) -> object
+        self.max_age = max_age
+        self.max_users = max_users
+        self._entries = OrderedDict()  # user id -> (loaded_at, object)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry is not None and now - entry[0] < self.max_age:
+            return entry[1]
+        value = self.load(user_id)
+        with self._lock:
+            self._entries[user_id] = (now, value)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, user_id=None):
+        """Forget `user_id`'s entry, or every entry when shared (user_id None) data changed"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
@@ -2,20 +2,35 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from .models import Expense
-from .serializers import ExpenseSerializer
-from django.db.models import Sum
+from .models import Category, Expense, MerchantRule
+from .serializers import CategorySerializer, ExpenseSerializer, MerchantRuleSerializer
+from .fast_serializers import ValuesRowSerializer
+from .pagination import ExpenseCursorPagination, KEY_FIELDS
 from django.utils import timezone
-from datetime import timedelta, date
 from rest_framework.views import APIView
-from django.db.models.functions import TruncMonth, TruncWeek
-from .ai_utils import predict_category
-from .ai.anomaly import detect_anomalies_for_user
+from .ai_utils import predict_category, get_ai_stats
+from .insights import compute_insights
+from . import insights_cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from datetime import date, datetime
+from .importing import import_expenses
+from .sync import changes_since, InvalidSyncToken, SyncTokenExpired
+from .exporting import CONTENT_TYPES, FORMATS, export_queryset, stream_export
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from rest_framework.negotiation import DefaultContentNegotiation
+from .conf import expenses_setting
+from . import metrics
+from .renderers import PrometheusTextRenderer
+import hmac
 
 from django.contrib.auth import get_user_model
 from rest_framework.permissions import AllowAny
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound, ValidationError
 from django.db import IntegrityError
+from django.db.models import Q
 
 # drf-spectacular imports for API docs
 from drf_spectacular.utils import extend_schema, OpenApiResponse
@@ -24,6 +39,12 @@ from drf_spectacular.openapi import OpenApiParameter
 User = get_user_model()
 
 
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """`?format=` picks the export file type, so it must not select a DRF renderer"""
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
 class RegisterSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(write_only=True)
@@ -61,12 +82,103 @@ def register_view(request):
         )
 
 
+def parse_fields_param(raw):
+    """
+    The ?fields=a,b,c sparse fieldset, or None for all fields. Unknown names
+    are a 400 rather than being silently dropped.
+    """
+    if not raw:
+        return None
+    requested = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = sorted(set(requested) - set(ExpenseSerializer.Meta.fields))
+    if unknown:
+        raise ValidationError({'fields': f"unknown field(s): {', '.join(unknown)}"})
+    return requested
+
+
+def insights_preconditions(request, user_id, version, updated_at, today):
+    """
+    ETag/Last-Modified headers for the insights payload, and the status of
+    the conditional response to send instead (304/412), or None
+    """
+    # the summaries are relative to today, so they also change at midnight
+    last_modified = max(updated_at, timezone.make_aware(datetime.combine(today, datetime.min.time())))
+    etag = insights_cache.etag_for(user_id, version, today)
+    headers = {'ETag': etag, 'Last-Modified': http_date(last_modified.timestamp())}
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(last_modified.timestamp()))
+    if conditional is None:
+        return headers, None
+    if conditional.status_code == status.HTTP_304_NOT_MODIFIED:
+        insights_cache.record('not_modified')
+    return headers, conditional.status_code
+
+
 class ExpenseViewSet(viewsets.ModelViewSet):
     serializer_class = ExpenseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ExpenseCursorPagination
+
+    def sparse_fields(self):
+        """Field names requested with ?fields=a,b,c on reads, or None for all"""
+        if self.request is None or self.request.method not in permissions.SAFE_METHODS:
+            return None
+        return parse_fields_param(self.request.query_params.get('fields'))
 
     def get_queryset(self):
-        return Expense.objects.filter(user=self.request.user)
+        if getattr(self, 'swagger_fake_view', False):  # schema generation has no user
+            return Expense.objects.none()
+        qs = Expense.objects.filter(user=self.request.user)
+        # ?prediction_state=pending lets async-mode clients poll for results
+        prediction_state = self.request.query_params.get('prediction_state')
+        if prediction_state:
+            qs = qs.filter(prediction_state=prediction_state)
+        fields = self.sparse_fields()
+        if fields:
+            # the pagination key is always loaded so cursors can be built
+            qs = qs.only(*set(fields) | set(KEY_FIELDS))
+        return qs
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.sparse_fields()
+        if fields:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='fields', type=str, required=False,
+                             description="Comma-separated subset of fields to return, e.g. `id,amount,category`"),
+            OpenApiParameter(name='prediction_state', type=str, required=False,
+                             description="Only expenses in this state: `pending`, `done` or `failed`"),
+        ],
+        description=(
+            "List your expenses newest first, paginated by an opaque cursor. "
+            "Follow `next` until it is null; pages stay equally fast however "
+            "deep into the history they are."
+        ),
+    )
+    def list(self, request, *args, **kwargs):
+        if not expenses_setting('FAST_READ_SERIALIZER'):
+            return super().list(request, *args, **kwargs)
+        # same output as ExpenseSerializer, built from .values() rows
+        fast = ValuesRowSerializer(self.get_serializer())
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values(*set(fast.value_fields) | set(KEY_FIELDS))
+        page = self.paginate_queryset(rows)
+        with metrics.timed('serialize'):
+            data = fast.serialize(rows if page is None else page)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='fields', type=str, required=False,
+                             description="Comma-separated subset of fields to return"),
+        ],
+    )
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         # serializer.create handles AI logic already
@@ -78,12 +190,128 @@ class ExpenseViewSet(viewsets.ModelViewSet):
         description=(
             "Create expense. If `category` is omitted, AI will predict it and "
             "`predicted_category`/`ai_confidence` will be set. "
-            "User override is possible via PATCH or the override action."
+            "User override is possible via PATCH or the override action. "
+            "In async mode the expense is returned immediately with "
+            "`prediction_state` = `pending`; poll it or list with "
+            "`?prediction_state=pending` until it becomes `done`."
         ),
     )
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
+    @extend_schema(
+        request=ExpenseSerializer(many=True),
+        responses={
+            201: OpenApiResponse(description="Summary: total/created/errors"),
+            400: OpenApiResponse(description="No rows could be imported"),
+        },
+        description=(
+            "Create many expenses at once. Send a list of expense objects (or "
+            "`{\"rows\": [...]}`). Rows without a category are categorized in "
+            "batches. Invalid rows are reported in `errors` with their 1-based "
+            "`row` number and do not stop the rest of the import."
+        ),
+    )
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        POST /api/expenses/bulk/ [{...}, {...}]
+        """
+        rows = request.data
+        if isinstance(rows, dict):
+            rows = rows.get('rows')
+        if not isinstance(rows, list):
+            return Response({'detail': 'expected a list of expenses'}, status=status.HTTP_400_BAD_REQUEST)
+        max_rows = expenses_setting('BULK_MAX_ROWS')
+        if len(rows) > max_rows:
+            return Response({'detail': f'at most {max_rows} rows per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = import_expenses(request.user, rows)
+        code = status.HTTP_201_CREATED if result['created'] or not result['total'] else status.HTTP_400_BAD_REQUEST
+        return Response(result, status=code)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='since', type=str, required=False,
+                             description="`next_token` from the previous call; omit for a full download"),
+            OpenApiParameter(name='fields', type=str, required=False,
+                             description="Comma-separated subset of fields to return for changed expenses"),
+        ],
+        responses={
+            200: OpenApiResponse(description="{changes: [...], deleted: [id, ...], next_token, has_more}"),
+            400: OpenApiResponse(description="Invalid token"),
+            410: OpenApiResponse(description="Token too old; discard local data and sync from scratch"),
+        },
+        description=(
+            "Expenses created or modified, and ids of expenses deleted, since "
+            "`since`. Call again with `next_token` while `has_more` is true, "
+            "then keep the last `next_token` for the next sync."
+        ),
+    )
+    @action(detail=False, methods=['get'], url_path='changes', pagination_class=None)
+    def changes(self, request):
+        """
+        GET /api/expenses/changes/?since=<token>
+        """
+        qs = Expense.objects.all()
+        fields = self.sparse_fields()
+        if fields:
+            qs = qs.only(*set(fields) | {'id', 'updated_at'})
+        try:
+            result = changes_since(request.user, request.query_params.get('since'), queryset=qs)
+        except InvalidSyncToken:
+            return Response({'detail': 'invalid sync token'}, status=status.HTTP_400_BAD_REQUEST)
+        except SyncTokenExpired:
+            return Response({'detail': 'sync token expired, full resync required'}, status=status.HTTP_410_GONE)
+        result['changes'] = self.get_serializer(result['changes'], many=True).data
+        return Response(result)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='format', type=str, required=False, enum=FORMATS,
+                             description="File type, `csv` (default) or `jsonl`"),
+            OpenApiParameter(name='from', type=str, required=False, description="First date (YYYY-MM-DD)"),
+            OpenApiParameter(name='to', type=str, required=False, description="Last date (YYYY-MM-DD)"),
+            OpenApiParameter(name='gzip', type=bool, required=False, description="Compress the download"),
+        ],
+        responses={
+            200: OpenApiResponse(description="CSV or JSON Lines file, oldest expense first"),
+            400: OpenApiResponse(description="Invalid format or date"),
+        },
+        description="Download your expenses as a file. The export is streamed, so any history size works.",
+    )
+    @action(detail=False, methods=['get'], url_path='export', pagination_class=None,
+            content_negotiation_class=ExportContentNegotiation)
+    def export(self, request):
+        """
+        GET /api/expenses/export/?format=csv|jsonl&from=2025-01-01&to=2025-12-31&gzip=1
+        """
+        params = request.query_params
+        fmt = params.get('format') or 'csv'
+        if fmt not in FORMATS:
+            return Response({'detail': f"format must be one of {', '.join(FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        bounds = {}
+        for name in ('from', 'to'):
+            if params.get(name):
+                try:
+                    bounds[name] = parse_date(params[name])
+                except ValueError:
+                    bounds[name] = None
+                if bounds[name] is None:
+                    return Response({'detail': f"'{name}' must be a date (YYYY-MM-DD)"},
+                                    status=status.HTTP_400_BAD_REQUEST)
+        gzip = params.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+        qs = export_queryset(request.user, bounds.get('from'), bounds.get('to'))
+        response = StreamingHttpResponse(
+            stream_export(qs, fmt, gzip=gzip),
+            content_type='application/gzip' if gzip else CONTENT_TYPES[fmt],
+        )
+        filename = f"expenses-{timezone.localdate().isoformat()}.{fmt}{'.gz' if gzip else ''}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
     @action(detail=True, methods=['post'])
     def override(self, request, pk=None):
         """
@@ -101,7 +329,8 @@ class ExpenseViewSet(viewsets.ModelViewSet):
         # Update user's AI model with this feedback
         try:
             from .ai_utils import update_user_model_with_feedback
-            update_user_model_with_feedback(request.user, expense.description, category)
+            update_user_model_with_feedback(request.user, expense.description, category,
+                                            expense=expense, predicted_category=expense.predicted_category)
         except Exception as e:
             # Log the error but don't fail the request
             print(f"Error updating user model: {e}")
@@ -109,6 +338,53 @@ class ExpenseViewSet(viewsets.ModelViewSet):
         return Response(ExpenseSerializer(expense).data)
 
 
+class IsOwnerOrReadOnly(permissions.BasePermission):
+    """Global categories and rules can be read by everyone but changed by no one"""
+    def has_object_permission(self, request, view, obj):
+        return request.method in permissions.SAFE_METHODS or obj.user_id == request.user.pk
+
+
+@extend_schema(description=(
+    "The category taxonomy: global top-level categories plus your own "
+    "subcategories. New expenses are classified top-level first, then among "
+    "the chosen category's subcategories; insights roll subcategories up. "
+    "Renaming a category does not change the expenses already filed under it."
+))
+class CategoryViewSet(viewsets.ModelViewSet):
+    serializer_class = CategorySerializer
+    permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
+    pagination_class = None
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):  # schema generation has no user
+            return Category.objects.none()
+        return Category.objects.filter(Q(user=None) | Q(user=self.request.user)).select_related('parent')
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+@extend_schema(description=(
+    "Merchant rules: descriptions matching a pattern (contains, starts with "
+    "or, for staff, a regular expression; case-insensitive) and/or amounts in a range get "
+    "the rule's category without calling any model. Your own rules win over "
+    "the global ones, then higher priority wins. Rules apply to expenses "
+    "categorized after the change, not to existing ones."
+))
+class MerchantRuleViewSet(viewsets.ModelViewSet):
+    serializer_class = MerchantRuleSerializer
+    permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
+    pagination_class = None
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):  # schema generation has no user
+            return MerchantRule.objects.none()
+        return MerchantRule.objects.filter(Q(user=None) | Q(user=self.request.user))
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
 class InsightsAPIView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -119,58 +395,84 @@ class InsightsAPIView(APIView):
                 description="Insights: weekly/monthly/top_categories/anomalies"
             )
         },
-        description="Returns summaries and anomaly detection for the authenticated user."
+        description=(
+            "Returns summaries and anomaly detection for the authenticated user. "
+            "Responses carry ETag and Last-Modified headers; send them back as "
+            "If-None-Match / If-Modified-Since to get 304 Not Modified while "
+            "your expenses are unchanged."
+        )
     )
     def get(self, request):
         user = request.user
         today = date.today()
+        version, updated_at = insights_cache.current_version(user.pk)
+        headers, conditional_status = insights_preconditions(request, user.pk, version, updated_at, today)
+        if conditional_status is not None:
+            # 304 Not Modified (or 412 for a failed If-Match precondition)
+            return Response(status=conditional_status, headers=headers)
 
-        # Last 30 days weekly summary
-        last_30 = today - timedelta(days=30)
-        q = Expense.objects.filter(user=user, date__gte=last_30)
-        weekly_qs = (
-            q.annotate(week=TruncWeek('date'))
-             .values('week')
-             .annotate(total=Sum('amount'))
-             .order_by('week')
-        )
-        weekly = [
-            {'week': w['week'].isoformat(), 'total': float(w['total'] or 0)}
-            for w in weekly_qs
-        ]
-
-        # monthly summary (last 6 months)
-        six_months_ago = today - timedelta(days=180)
-        q2 = Expense.objects.filter(user=user, date__gte=six_months_ago)
-        monthly_qs = (
-            q2.annotate(month=TruncMonth('date'))
-              .values('month')
-              .annotate(total=Sum('amount'))
-              .order_by('month')
-        )
-        monthly = [
-            {'month': m['month'].isoformat(), 'total': float(m['total'] or 0)}
-            for m in monthly_qs
-        ]
-
-        # top categories (all time)
-        top_cat_qs = (
-            Expense.objects.filter(user=user)
-            .values('category')
-            .annotate(total=Sum('amount'))
-            .order_by('-total')[:5]
-        )
-        top_categories = [
-            {'category': c['category'] or 'Uncategorized', 'total': float(c['total'] or 0)}
-            for c in top_cat_qs
-        ]
-
-        # Anomaly detection
-        anomalies = detect_anomalies_for_user(user)
-
-        return Response({
-            'weekly': weekly,
-            'monthly': monthly,
-            'top_categories': top_categories,
-            'anomalies': anomalies
-        })
\ No newline at end of file
+        payload = insights_cache.load(user.pk, version, today)
+        if payload is None:
+            # summaries come from the per-user rollup tables (see expenses/insights.py)
+            payload = compute_insights(user, today)
+            insights_cache.store(user.pk, version, today, payload)
+        return Response(payload, headers=headers)
+
+
+class AIStatsAPIView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    @extend_schema(
+        responses={200: OpenApiResponse(response=dict, description="Categorization counters for this process")},
+        description=(
+            "Admin only. Fast-path vs zero-shot escalation rates and latencies, "
+            "prediction and insights cache hit rates and micro-batching stats "
+            "for the worker process that serves the request."
+        ),
+    )
+    def get(self, request):
+        stats = get_ai_stats()
+        stats['insights_cache'] = insights_cache.stats()
+        return Response(stats)
+
+
+class HasMetricsAccess(permissions.BasePermission):
+    """The METRICS_TOKEN bearer token when one is configured, admin users otherwise"""
+
+    def has_permission(self, request, view):
+        token = expenses_setting('METRICS_TOKEN')
+        if not token:
+            return bool(request.user and request.user.is_staff)
+        supplied = request.META.get('HTTP_AUTHORIZATION', '')
+        return hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode())
+
+
+class MetricsAPIView(APIView):
+    permission_classes = [HasMetricsAccess]
+    renderer_classes = [PrometheusTextRenderer]
+
+    def get_authenticators(self):
+        # a scrape token is not a JWT; don't let JWTAuthentication reject it
+        if expenses_setting('METRICS_TOKEN'):
+            return []
+        return super().get_authenticators()
+
+    def initial(self, request, *args, **kwargs):
+        # 404 before authentication, so a disabled endpoint looks absent to everyone
+        if not metrics.metrics_enabled():
+            raise NotFound("metrics are disabled")
+        super().initial(request, *args, **kwargs)
+
+    @extend_schema(
+        responses={200: OpenApiResponse(response=str, description="Prometheus text exposition format")},
+        description=(
+            "Request latency histograms per endpoint, database query counts and "
+            "time, model inference time and batch sizes, anomaly detection time "
+            "and cache hit rates for the worker process that serves the request. "
+            "Needs `EXPENSES['METRICS']`; 404 otherwise. Send "
+            "`Authorization: Bearer <METRICS_TOKEN>` when a token is configured, "
+            "otherwise admin credentials."
+        ),
+    )
+    def get(self, request):
+        return Response(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
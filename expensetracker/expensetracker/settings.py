@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
+from .database import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,12 +49,18 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication, timed for expenses/metrics.py
+        'expenses.authentication.TimedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # byte-identical to DRF's JSONRenderer, but uses orjson when installed
+    'DEFAULT_RENDERER_CLASSES': (
+        'expenses.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 SIMPLE_JWT = {
@@ -65,8 +74,18 @@ SPECTACULAR_SETTINGS = {
     'VERSION': '1.0.0',
 }
 
+# Expenses app options (see expenses/conf.py for the full list and defaults)
+EXPENSES = {
+    'AI_BATCHING': True,
+    'AI_BATCH_MAX_SIZE': 16,
+    'AI_BATCH_MAX_WAIT_MS': 10,
+    'PREDICTION_CACHE_ALIAS': 'predictions',
+}
+
 
 MIDDLEWARE = [
+    # outermost, so its latency covers the whole stack (see expenses/metrics.py)
+    'expenses.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -98,12 +117,34 @@ WSGI_APPLICATION = 'expensetracker.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Configured from DATABASE_URL and DB_* environment variables, see
+# expensetracker/database.py. Defaults to a WAL-mode BASE_DIR/db.sqlite3.
 
 DATABASES = {
+    'default': database_config(BASE_DIR),
+}
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Persistent tier of the AI prediction cache, shared by all worker
+    # processes: Redis when REDIS_URL is set, otherwise a table in the default
+    # database (`manage.py createcachetable`). Both store and look up an entry
+    # without scanning the others, unlike the file-based backend, which lists
+    # its whole directory on every set.
+    'predictions': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    } if os.environ.get('REDIS_URL') else {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'expenses_prediction_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
 }
 
 